@@ -5,17 +5,15 @@
 @Author  : alexanderwu
 @File    : action.py
 """
-import re
 from abc import ABC
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 from tenacity import retry, stop_after_attempt, wait_fixed
 
 from metagpt.actions.action_output import ActionOutput
 from metagpt.llm import LLM
 from metagpt.logs import logger
-from metagpt.utils.common import OutputParser
-from metagpt.utils.custom_decoder import CustomDecoder
+from metagpt.utils.incremental_parser import IncrementalOutputParser
 
 
 class Action(ABC):
@@ -49,6 +47,21 @@ class Action(ABC):
         system_msgs.append(self.prefix)
         return await self.llm.aask(prompt, system_msgs)
 
+    def _system_msgs(self, system_msgs: Optional[list[str]] = None) -> list[str]:
+        return [*(system_msgs or []), self.prefix]
+
+    async def _aask_stream(self, prompt: str, system_msgs: Optional[list[str]] = None) -> AsyncIterator[str]:
+        """Append default prefix, yield the deltas of the reply as they arrive, echoing them to the llm stream sink"""
+        system_msgs = self._system_msgs(system_msgs)
+        stream = self.llm.aask_stream(prompt, system_msgs)
+        try:
+            async for delta in stream:
+                self.llm.stream_sink.on_delta(delta)
+                yield delta
+        finally:
+            self.llm.stream_sink.on_end()
+            await stream.aclose()
+
     @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
     async def _aask_v1(
         self,
@@ -58,30 +71,26 @@ class Action(ABC):
         system_msgs: Optional[list[str]] = None,
         format="markdown",  # compatible to original format
     ) -> ActionOutput:
-        """Append default prefix"""
-        if not system_msgs:
-            system_msgs = []
-        system_msgs.append(self.prefix)
-        content = await self.llm.aask(prompt, system_msgs)
-        logger.debug(content)
-        output_class = ActionOutput.create_model_class(output_class_name, output_data_mapping)
-
-        if format == "json":
-            pattern = r"\[CONTENT\](\s*\{.*?\}\s*)\[/CONTENT\]"
-            matches = re.findall(pattern, content, re.DOTALL)
-
-            for match in matches:
-                if match:
-                    content = match
-                    break
-
-            parsed_data = CustomDecoder(strict=False).decode(content)
-
-        else:  # using markdown parser
-            parsed_data = OutputParser.parse_data_with_mapping(content, output_data_mapping)
+        """Append default prefix, parse the fields while the reply streams in and give up early on a malformed one"""
+        parser = IncrementalOutputParser(output_data_mapping, format)
+        stream = self._aask_stream(prompt, system_msgs)
+        try:
+            try:
+                async for delta in stream:
+                    for name in parser.feed(delta):
+                        logger.debug(f"{output_class_name}.{name} is ready")
+            finally:
+                await stream.aclose()  # stop generating if the reply is already known to be malformed
+            logger.debug(parser.text)
+            output_class = ActionOutput.get_model_class(output_class_name, output_data_mapping)
+            content, parsed_data = parser.close()
 
-        logger.debug(parsed_data)
-        instruct_content = output_class(**parsed_data)
+            logger.debug(parsed_data)
+            instruct_content = output_class(**parsed_data)
+        except Exception:
+            # a malformed reply must not be served from the response cache to the retry
+            self.llm.discard_reply(prompt, self._system_msgs(system_msgs))
+            raise
         return ActionOutput(content, instruct_content)
 
     async def run(self, *args, **kwargs):
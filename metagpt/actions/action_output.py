@@ -6,10 +6,14 @@
 @File    : action_output
 """
 
-from typing import Dict, Type
+from typing import Dict, Optional, Type
 
 from pydantic import BaseModel, create_model, root_validator, validator
 
+# (class name, mapping) -> the model class, and back to the mapping it was created with
+_model_classes: Dict[tuple, Type[BaseModel]] = {}
+_mappings: Dict[Type[BaseModel], Dict[str, Type]] = {}
+
 
 class ActionOutput:
     content: str
@@ -40,4 +44,19 @@ class ActionOutput:
         new_class.__validator_check_name = classmethod(check_name)
         new_class.__root_validator_check_missing_fields = classmethod(check_missing_fields)
         return new_class
-    
\ No newline at end of file
+    
+
+    @classmethod
+    def get_model_class(cls, class_name: str, mapping: Dict[str, Type]) -> Type[BaseModel]:
+        """The model class of the mapping, created once for all the outputs and messages of the same kind"""
+        key = (class_name, tuple(mapping.items()))
+        model_class = _model_classes.get(key)
+        if model_class is None:
+            model_class = _model_classes[key] = cls.create_model_class(class_name, mapping)
+            _mappings[model_class] = dict(mapping)
+        return model_class
+
+    @staticmethod
+    def mapping_of(model_class: Type[BaseModel]) -> Optional[Dict[str, Type]]:
+        """The mapping a class of get_model_class was created with, None for the other classes"""
+        return _mappings.get(model_class)
@@ -11,7 +11,6 @@ from typing import List
 
 from metagpt.actions import Action, ActionOutput
 from metagpt.config import CONFIG
-from metagpt.const import WORKSPACE_ROOT
 from metagpt.logs import logger
 from metagpt.utils.common import CodeParser
 from metagpt.utils.get_template import get_template
@@ -193,7 +192,7 @@ class WriteDesign(Action):
             ws_name = system_design.instruct_content.dict()["Python package name"]
         else:
             ws_name = CodeParser.parse_str(block="Python package name", text=system_design)
-        workspace = WORKSPACE_ROOT / ws_name
+        workspace = CONFIG.workspace_root / ws_name
         self.recreate_workspace(workspace)
         docs_path = workspace / "docs"
         resources_path = workspace / "resources"
@@ -202,7 +201,8 @@ class WriteDesign(Action):
         await self._save_prd(docs_path, resources_path, context)
         await self._save_system_design(docs_path, resources_path, system_design)
 
-    async def run(self, context, format=CONFIG.prompt_format):
+    async def run(self, context, format=None):
+        format = format or CONFIG.project_setting("prompt_format")
         prompt_template, format_example = get_template(templates, format)
         prompt = prompt_template.format(context=context, format_example=format_example)
         # system_design = await self._aask(prompt)
@@ -9,7 +9,6 @@ from typing import List
 
 from metagpt.actions.action import Action
 from metagpt.config import CONFIG
-from metagpt.const import WORKSPACE_ROOT
 from metagpt.utils.common import CodeParser
 from metagpt.utils.get_template import get_template
 from metagpt.utils.json_to_markdown import json_to_markdown
@@ -171,14 +170,15 @@ class WriteTasks(Action):
             ws_name = context[-1].instruct_content.dict()["Python package name"]
         else:
             ws_name = CodeParser.parse_str(block="Python package name", text=context[-1].content)
-        file_path = WORKSPACE_ROOT / ws_name / "docs/api_spec_and_tasks.md"
+        file_path = CONFIG.workspace_root / ws_name / "docs/api_spec_and_tasks.md"
         file_path.write_text(json_to_markdown(rsp.instruct_content.dict()))
 
         # Write requirements.txt
-        requirements_path = WORKSPACE_ROOT / ws_name / "requirements.txt"
+        requirements_path = CONFIG.workspace_root / ws_name / "requirements.txt"
         requirements_path.write_text("\n".join(rsp.instruct_content.dict().get("Required Python third-party packages")))
 
-    async def run(self, context, format=CONFIG.prompt_format):
+    async def run(self, context, format=None):
+        format = format or CONFIG.project_setting("prompt_format")
         prompt_template, format_example = get_template(templates, format)
         prompt = prompt_template.format(context=context, format_example=format_example)
         rsp = await self._aask_v1(prompt, "task", OUTPUT_MAPPING, format=format)
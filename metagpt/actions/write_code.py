@@ -5,9 +5,11 @@
 @Author  : alexanderwu
 @File    : write_code.py
 """
+import re
+
 from metagpt.actions import WriteDesign
 from metagpt.actions.action import Action
-from metagpt.const import WORKSPACE_ROOT
+from metagpt.config import CONFIG
 from metagpt.logs import logger
 from metagpt.schema import Message
 from metagpt.utils.common import CodeParser
@@ -41,6 +43,9 @@ ATTENTION: Use '##' to SPLIT SECTIONS, not '#'. Output format carefully referenc
 -----
 """
 
+# the same as CodeParser.parse_code
+CODE_BLOCK_PATTERN = re.compile(r"```.*?\s+(.*?)```", re.DOTALL)
+
 
 class WriteCode(Action):
     def __init__(self, name="WriteCode", context: list[Message] = None, llm=None):
@@ -58,7 +63,7 @@ class WriteCode(Action):
         design = [i for i in context if i.cause_by == WriteDesign][0]
 
         ws_name = CodeParser.parse_str(block="Python package name", text=design.content)
-        ws_path = WORKSPACE_ROOT / ws_name
+        ws_path = CONFIG.workspace_root / ws_name
         if f"{ws_name}/" not in filename and all(i not in filename for i in ["requirements.txt", ".md"]):
             ws_path = ws_path / ws_name
         code_path = ws_path / filename
@@ -68,8 +73,18 @@ class WriteCode(Action):
 
     @retry(stop=stop_after_attempt(2), wait=wait_fixed(1))
     async def write_code(self, prompt):
-        code_rsp = await self._aask(prompt)
-        code = CodeParser.parse_code(block="", text=code_rsp)
+        code_rsp, code = "", None
+        async for delta in self._aask_stream(prompt):
+            code_rsp += delta
+            # the first code block is parsed as soon as it is closed, the rest of the reply is still read to its end
+            # so that it is complete in the response cache and for the identical requests sharing it
+            if code is None and "`" in delta:
+                match = CODE_BLOCK_PATTERN.search(code_rsp)
+                if match:
+                    code = match.group(1)
+                    logger.debug(f"The code is complete after {len(code_rsp)} characters of the reply")
+        if code is None:
+            code = CodeParser.parse_code(block="", text=code_rsp)
         return code
 
     async def run(self, context, filename):
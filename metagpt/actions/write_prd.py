@@ -222,7 +222,8 @@ class WritePRD(Action):
     def __init__(self, name="", context=None, llm=None):
         super().__init__(name, context, llm)
 
-    async def run(self, requirements, format=CONFIG.prompt_format, *args, **kwargs) -> ActionOutput:
+    async def run(self, requirements, format=None, *args, **kwargs) -> ActionOutput:
+        format = format or CONFIG.project_setting("prompt_format")
         sas = SearchAndSummarize()
         # rsp = await sas.run(context=requirements, system_text=SEARCH_AND_SUMMARIZE_SYSTEM_EN_US)
         rsp = ""
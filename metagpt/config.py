@@ -4,13 +4,15 @@
 Provide configuration, singleton
 """
 import os
+from pathlib import Path
 
 import openai
 import yaml
 
-from metagpt.const import PROJECT_ROOT
+from metagpt.const import DATA_PATH, PROJECT_ROOT
 from metagpt.logs import logger
 from metagpt.tools import SearchEngineType, WebBrowserEngineType
+from metagpt.utils.project_context import get_project
 from metagpt.utils.singleton import Singleton
 
 
@@ -45,10 +47,13 @@ class Config(metaclass=Singleton):
         self.global_proxy = self._get("GLOBAL_PROXY")
         self.openai_api_key = self._get("OPENAI_API_KEY")
         self.anthropic_api_key = self._get("Anthropic_API_KEY")
-        if (not self.openai_api_key or "YOUR_API_KEY" == self.openai_api_key) and (
-            not self.anthropic_api_key or "YOUR_API_KEY" == self.anthropic_api_key
+        self.llm_type = self._get("LLM_TYPE") or self._default_llm_type()
+        if (
+            self.llm_type not in ("fake", "router")
+            and (not self.openai_api_key or "YOUR_API_KEY" == self.openai_api_key)
+            and (not self.anthropic_api_key or "YOUR_API_KEY" == self.anthropic_api_key)
         ):
-            raise NotConfiguredException("Set OPENAI_API_KEY or Anthropic_API_KEY first")
+            raise NotConfiguredException("Set OPENAI_API_KEY or Anthropic_API_KEY first, or LLM_TYPE to router / fake")
         self.openai_api_base = self._get("OPENAI_API_BASE")
         openai_proxy = self._get("OPENAI_PROXY") or self.global_proxy
         if openai_proxy:
@@ -57,12 +62,26 @@ class Config(metaclass=Singleton):
         self.openai_api_type = self._get("OPENAI_API_TYPE")
         self.openai_api_version = self._get("OPENAI_API_VERSION")
         self.openai_api_rpm = self._get("RPM", 3)
+        self.openai_api_tpm = self._get("TPM", 0)
+        self.llm_max_concurrency = self._get("LLM_MAX_CONCURRENCY", 0)
+        self.llm_coalesce_requests = self._get("LLM_COALESCE_REQUESTS", True)
+        self.stream_sink = self._get("STREAM_SINK", "stdout")
         self.openai_api_model = self._get("OPENAI_API_MODEL", "gpt-4")
         self.max_tokens_rsp = self._get("MAX_TOKENS", 2048)
         self.deployment_name = self._get("DEPLOYMENT_NAME")
         self.deployment_id = self._get("DEPLOYMENT_ID")
 
         self.claude_api_key = self._get("Anthropic_API_KEY")
+        self.claude_api_model = self._get("CLAUDE_API_MODEL", "claude-2")
+        self.claude_api_tpm = self._get("CLAUDE_TPM", 0)
+        self.llm_endpoints = self._get("LLM_ENDPOINTS", [])
+        self.llm_router_cooldown = float(self._get("LLM_ROUTER_COOLDOWN", 30))
+        self.fake_llm_responses = self._get("FAKE_LLM_RESPONSES")
+        self.fake_llm_ttft = float(self._get("FAKE_LLM_TTFT", 0))
+        self.fake_llm_tps = float(self._get("FAKE_LLM_TPS", 0))
+        self.fake_llm_error_rate = float(self._get("FAKE_LLM_ERROR_RATE", 0))
+        self.fake_llm_rpm = int(self._get("FAKE_LLM_RPM", 0))
+        self.fake_llm_seed = self._get("FAKE_LLM_SEED")
         self.serpapi_api_key = self._get("SERPAPI_API_KEY")
         self.serper_api_key = self._get("SERPER_API_KEY")
         self.google_api_key = self._get("GOOGLE_API_KEY")
@@ -73,10 +92,21 @@ class Config(metaclass=Singleton):
         self.selenium_browser_type = self._get("SELENIUM_BROWSER_TYPE", "chrome")
 
         self.long_term_memory = self._get("LONG_TERM_MEMORY", False)
+        self.memory_content_index = self._get("MEMORY_CONTENT_INDEX", False)
         if self.long_term_memory:
             logger.warning("LONG_TERM_MEMORY is True")
-        self.max_budget = self._get("MAX_BUDGET", 10.0)
-        self.total_cost = 0.0
+        self.memory_max_messages = int(self._get("MEMORY_MAX_MESSAGES", 0))
+        self.memory_max_tokens = int(self._get("MEMORY_MAX_TOKENS", 0))
+        self.memory_ttl = float(self._get("MEMORY_TTL", 0))
+        self.memory_summary_llm = self._get("MEMORY_SUMMARY_LLM", False)
+        self.memory_durability = self._get("MEMORY_DURABILITY", "message")
+        self.memory_flush_every = int(self._get("MEMORY_FLUSH_EVERY", 10))
+        self.memory_compact_every = int(self._get("MEMORY_COMPACT_EVERY", 100))
+        self.memory_compact_interval = float(self._get("MEMORY_COMPACT_INTERVAL", 600))
+        self.env_scheduler = self._get("ENV_SCHEDULER", "event")
+        self.checkpoint = self._get("CHECKPOINT", False)
+        self.checkpoint_path = self._get("CHECKPOINT_PATH", DATA_PATH / "checkpoints")
+        self._max_budget = self._get("MAX_BUDGET", 10.0)
 
         self.puppeteer_config = self._get("PUPPETEER_CONFIG", "")
         self.mmdc = self._get("MMDC", "mmdc")
@@ -88,6 +118,48 @@ class Config(metaclass=Singleton):
 
         self.prompt_format = self._get("PROMPT_FORMAT", "markdown")
 
+        self.llm_cache_mode = self._get("LLM_CACHE_MODE", "off")
+        self.llm_cache_path = self._get("LLM_CACHE_PATH", DATA_PATH / "llm_cache")
+        self.llm_cache_max_size = self._get("LLM_CACHE_MAX_SIZE", 512 * 1024 * 1024)
+        self.embedding_type = self._get("EMBEDDING_TYPE")  # openai when not set
+        self.hashing_embedding_dim = int(self._get("HASHING_EMBEDDING_DIM", 512))
+        self.embedding_cache = self._get("EMBEDDING_CACHE", False)
+        self.embedding_cache_path = self._get("EMBEDDING_CACHE_PATH", DATA_PATH / "embedding_cache")
+        self.embedding_cache_size = int(self._get("EMBEDDING_CACHE_SIZE", 20000))
+
+    def project_setting(self, name: str):
+        """The setting of the current project, its `config` overrides the one of the files and env"""
+        overrides = get_project().config
+        return overrides[name] if name in overrides else getattr(self, name)
+
+    @property
+    def max_budget(self) -> float:
+        """The budget of the current project, see ProjectContext"""
+        budget = get_project().max_budget
+        return self._max_budget if budget is None else budget
+
+    @max_budget.setter
+    def max_budget(self, value: float):
+        get_project().max_budget = value
+
+    @property
+    def total_cost(self) -> float:
+        return get_project().total_cost
+
+    @total_cost.setter
+    def total_cost(self, value: float):
+        get_project().total_cost = value
+
+    @property
+    def workspace_root(self) -> Path:
+        return get_project().workspace_root
+
+    def _default_llm_type(self) -> str:
+        """Use Claude only when the OpenAI key is missing"""
+        if not self.openai_api_key or "YOUR_API_KEY" == self.openai_api_key:
+            return "claude"
+        return "openai"
+
     def _init_with_config_files_and_env(self, configs: dict, yaml_file):
         """Load from config/key.yaml, config/config.yaml, and env in decreasing order of priority"""
         configs.update(os.environ)
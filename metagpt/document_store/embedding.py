@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the embeddings of the document stores and the memory, selected by EMBEDDING_TYPE
+
+import re
+import zlib
+from enum import Enum
+from typing import List, Optional
+
+import numpy as np
+from langchain.embeddings import OpenAIEmbeddings
+from langchain.embeddings.base import Embeddings
+
+from metagpt.config import CONFIG
+from metagpt.document_store.embedding_cache import CachedEmbeddings
+
+WORD_PATTERN = re.compile(r"\w+")
+# odd 64-bit constant of the multiplicative hash spreading the features over the buckets
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+WORD_FEATURE = np.uint64(1 << 62)  # keeps the words apart from the byte n-grams
+
+
+class EmbeddingType(Enum):
+    OPENAI = "openai"
+    HASHING = "hashing"
+
+
+class HashingEmbeddings(Embeddings):
+    """Local embeddings by the hashing trick, no network nor model to download.
+
+    The byte n-grams and the words of the lowercased text are hashed into `dim` buckets with a random sign,
+    the counts are damped by log(1 + tf) and the vectors L2-normalized, so that texts sharing words and
+    fragments are close. A whole batch is hashed and counted with vectorized NumPy operations.
+    """
+
+    def __init__(self, dim: int = 512, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+        self.model = f"hashing-{dim}-{ngram}"
+
+    def _features(self, text: str) -> np.ndarray:
+        text = text.lower()
+        data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+        n = len(data) - self.ngram + 1
+        grams = np.zeros(max(n, 0), dtype=np.uint64)
+        if n > 0:
+            for i in range(self.ngram):
+                grams = (grams << np.uint64(8)) | data[i : i + n]
+        words = np.fromiter(
+            (zlib.crc32(i.encode("utf-8")) for i in WORD_PATTERN.findall(text)), dtype=np.uint64
+        ) | WORD_FEATURE
+        return np.concatenate([grams, words])
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        features = [self._features(i) for i in texts]
+        rows = np.repeat(np.arange(len(texts)), [len(i) for i in features])
+        hashed = np.concatenate(features or [np.zeros(0, dtype=np.uint64)]) * HASH_MULTIPLIER
+        buckets = (hashed >> np.uint64(32)) % np.uint64(self.dim)
+        signs = np.where((hashed >> np.uint64(31)) & np.uint64(1), 1.0, -1.0)
+        counts = np.bincount(
+            rows * self.dim + buckets.astype(np.int64), weights=signs, minlength=len(texts) * self.dim
+        )
+        vectors = counts.reshape(len(texts), self.dim)
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+def get_embedding(embedding_type: Optional[str] = None) -> Embeddings:
+    """The embeddings of EMBEDDING_TYPE, the remote ones behind the embedding cache"""
+    embedding_type = EmbeddingType(embedding_type or CONFIG.embedding_type or EmbeddingType.OPENAI)
+    if embedding_type == EmbeddingType.HASHING:
+        return HashingEmbeddings(CONFIG.hashing_embedding_dim)
+    return CachedEmbeddings(OpenAIEmbeddings(openai_api_version="2020-11-07"))
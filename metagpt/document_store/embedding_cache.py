@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : a persistent cache of embeddings, so that the same text is embedded once by all the roles and the rebuilds
+
+import atexit
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from metagpt.config import CONFIG
+from metagpt.logs import logger
+
+
+class MmapEmbeddingStore:
+    """The embeddings of one model in a float32 matrix memory-mapped from `vectors.f32`, one row per text.
+
+    The key index (key -> row) is kept in memory in least recently used order, and on disk as an append-only
+    `keys.log` of "row key" lines, the last line of a row telling which key it holds. Once the `capacity` rows
+    are used, the row of the least recently used key is reused.
+    """
+
+    def __init__(self, cache_dir: Path, capacity: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.capacity = capacity
+        self.dim: Optional[int] = None
+        self._matrix: Optional[np.memmap] = None
+        self._rows: OrderedDict[str, int] = OrderedDict()  # key -> row, oldest first
+        self._free: list[int] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load()
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.cache_dir / "meta.json"
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.cache_dir / "vectors.f32"
+
+    @property
+    def _keys_path(self) -> Path:
+        return self.cache_dir / "keys.log"
+
+    def _load(self):
+        if not self._meta_path.exists():
+            return
+        meta = json.loads(self._meta_path.read_text())
+        if meta["capacity"] != self.capacity or not self._vectors_path.exists():
+            logger.info(f"the capacity of the embedding cache {self.cache_dir} changed, start over")
+            self.clear()
+            return
+        self._open(meta["dim"])
+        owners: dict[int, str] = {}
+        lines = 0
+        if self._keys_path.exists():
+            for line in self._keys_path.read_text().splitlines():
+                row, _, key = line.partition(" ")
+                if not row.isdigit() or not key or int(row) >= self.capacity:
+                    continue  # torn by a crash
+                lines += 1
+                row = int(row)
+                if row in owners and self._rows.get(owners[row]) == row:
+                    del self._rows[owners[row]]
+                self._rows.pop(key, None)
+                self._rows[key] = row
+                owners[row] = key
+        used = set(self._rows.values())
+        self._free = [i for i in reversed(range(self.capacity)) if i not in used]
+        if lines > 2 * len(self._rows):
+            self._keys_path.write_text("".join(f"{row} {key}\n" for key, row in self._rows.items()))
+
+    def _open(self, dim: int):
+        self.dim = dim
+        mode = "r+" if self._vectors_path.exists() else "w+"
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode=mode, shape=(self.capacity, dim))
+        self._meta_path.write_text(json.dumps({"dim": dim, "capacity": self.capacity}))
+        self._free = list(reversed(range(self.capacity)))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                self.misses += 1
+                return None
+            self._rows.move_to_end(key)
+            self.hits += 1
+            return np.array(self._matrix[row])
+
+    def set(self, key: str, vector: List[float]):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if self._matrix is None:
+                self._open(len(vector))
+            if len(vector) != self.dim or key in self._rows:
+                return
+            if self._free:
+                row = self._free.pop()
+            else:
+                _, row = self._rows.popitem(last=False)
+                self.evictions += 1
+            self._matrix[row] = vector
+            self._rows[key] = row
+            with open(self._keys_path, "a") as f:
+                f.write(f"{row} {key}\n")
+
+    def flush(self):
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+
+    def clear(self):
+        with self._lock:
+            self._matrix = None
+            self.dim = None
+            self._rows = OrderedDict()
+            self._free = []
+            for path in (self._meta_path, self._vectors_path, self._keys_path):
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {"size": len(self._rows), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class CachedEmbeddings(Embeddings):
+    """Serve the embeddings of the texts seen before from the store, request the others in one batch.
+    The key is the hash of (embedding model, text), the store is shared by all the users of the model.
+    """
+
+    def __init__(self, embeddings: Embeddings, store: Optional[MmapEmbeddingStore] = None):
+        self.embeddings = embeddings
+        self.model = embedding_model(embeddings)
+        self.store = get_embedding_store(self.model) if store is None else store
+
+    def __reduce__(self):
+        # the FAISS stores are pickled with their embedding function, the matrix is not part of them
+        return CachedEmbeddings, (self.embeddings,)
+
+    def make_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\n{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.store is None:
+            return self.embeddings.embed_documents(texts)
+        keys = [self.make_key(i) for i in texts]
+        vectors = [self.store.get(i) for i in keys]
+        missing = list(dict.fromkeys(keys[i] for i, vector in enumerate(vectors) if vector is None))
+        if missing:
+            texts_of = dict(zip(keys, texts))
+            embedded = dict(zip(missing, self.embeddings.embed_documents([texts_of[i] for i in missing])))
+            for key, vector in embedded.items():
+                self.store.set(key, vector)
+            vectors = [embedded[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+            logger.debug(f"embedding cache of {self.model}: {self.store.stats()}")
+        return [[float(i) for i in vector] for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.store is None:
+            return self.embeddings.embed_query(text)
+        key = self.make_key(text)
+        vector = self.store.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.store.set(key, vector)
+        return [float(i) for i in vector]
+
+    def stats(self) -> dict:
+        return self.store.stats() if self.store is not None else {}
+
+
+def embedding_model(embeddings: Embeddings) -> str:
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+_stores: dict[tuple, MmapEmbeddingStore] = {}
+
+
+def get_embedding_store(model: str) -> Optional[MmapEmbeddingStore]:
+    """Return the process-wide store of the model, None when EMBEDDING_CACHE is off"""
+    if not CONFIG.embedding_cache:
+        return None
+    key = (str(CONFIG.embedding_cache_path), model)
+    if key not in _stores:
+        cache_dir = Path(CONFIG.embedding_cache_path) / re.sub(r"[^\w.-]", "_", model)
+        _stores[key] = MmapEmbeddingStore(cache_dir, int(CONFIG.embedding_cache_size))
+        atexit.register(_stores[key].flush)
+    return _stores[key]
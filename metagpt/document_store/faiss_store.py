@@ -10,19 +10,22 @@ from pathlib import Path
 from typing import Optional
 
 import faiss
-from langchain.embeddings import OpenAIEmbeddings
+from langchain.embeddings.base import Embeddings
 from langchain.vectorstores import FAISS
 
 from metagpt.const import DATA_PATH
 from metagpt.document_store.base_store import LocalStore
 from metagpt.document_store.document import Document
+from metagpt.document_store.embedding import get_embedding
 from metagpt.logs import logger
 
 
 class FaissStore(LocalStore):
-    def __init__(self, raw_data: Path, cache_dir=None, meta_col='source', content_col='output'):
+    def __init__(self, raw_data: Path, cache_dir=None, meta_col='source', content_col='output',
+                 embedding: Optional[Embeddings] = None):
         self.meta_col = meta_col
         self.content_col = content_col
+        self.embedding = embedding
         super().__init__(raw_data, cache_dir)
 
     def _load(self) -> Optional["FaissStore"]:
@@ -36,8 +39,12 @@ class FaissStore(LocalStore):
         store.index = index
         return store
 
+    def _embedding(self) -> Embeddings:
+        """The embeddings given, or the ones of EMBEDDING_TYPE"""
+        return self.embedding or get_embedding()
+
     def _write(self, docs, metadatas):
-        store = FAISS.from_texts(docs, OpenAIEmbeddings(openai_api_version="2020-11-07"), metadatas=metadatas)
+        store = FAISS.from_texts(docs, self._embedding(), metadatas=metadatas)
         return store
 
     def persist(self):
@@ -6,15 +6,49 @@
 @File    : environment.py
 """
 import asyncio
-from typing import Iterable
+import time
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
-from metagpt.memory import Memory
+from metagpt.logs import logger
+from metagpt.memory import History, Memory, MemoryView, MessageLog
+from metagpt.provider.openai_api import usage_counter
 from metagpt.roles import Role
 from metagpt.schema import Message
 
 
+class RoundStats(BaseModel):
+    """What a round did. With run_events, the runs at the same depth"""
+
+    round: int
+    runs: int = 0  # of the roles woken
+    active_roles: list[str] = Field(default_factory=list)  # the ones that had news and reacted
+    messages: int = 0  # published
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0
+    started_at: float = 0
+    finished_at: float = 0
+
+    def add_usage(self, prompt_tokens: int, completion_tokens: int, cost: float):
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cost += cost
+
+    def __str__(self):
+        return (
+            f"round {self.round}: {self.runs} runs, active {self.active_roles}, {self.messages} messages, "
+            f"{self.prompt_tokens}+{self.completion_tokens} tokens, ${self.cost:.3f}, "
+            f"{self.finished_at - self.started_at:.1f}s"
+        )
+
+
+# the round of the role run publishing, None for the messages published from outside
+_current_round: ContextVar[Optional[RoundStats]] = ContextVar("current_round", default=None)
+
+
 class Environment(BaseModel):
     """环境，承载一批角色，角色可以向环境发布消息，可以被其他角色观察到
        Environment, hosting a batch of roles, roles can publish messages to the environment, and can be observed by other roles
@@ -22,12 +56,30 @@ class Environment(BaseModel):
     """
 
     roles: dict[str, Role] = Field(default_factory=dict)
-    memory: Memory = Field(default_factory=Memory)
-    history: str = Field(default='')
+    # the only copy of the messages published, at increasing offsets, the roles read it from where they stopped
+    log: MessageLog = Field(default_factory=MessageLog)
+    memory: Memory = Field(default=None)  # a view of the whole log
+    stats: list[RoundStats] = Field(default_factory=list)  # of the rounds run, in order
+    # role profile -> the depth it runs at next, while run_events is scheduling
+    _ready: Optional[dict[str, int]] = PrivateAttr(default=None)
+    _history: History = PrivateAttr(default=None)
 
     class Config:
         arbitrary_types_allowed = True
 
+    def __init__(self, **data):
+        super().__init__(**data)
+        if self.memory is None:
+            self.memory = MemoryView(self.log)
+        self._history = History(self.log)
+
+    @property
+    def history(self) -> History:
+        """The messages published, one per line, rendered when read. `last` and `last_tokens` for the tail"""
+        if self._history.log is not self.log:
+            self._history = History(self.log)
+        return self._history
+
     def add_role(self, role: Role):
         """增加一个在当前环境的角色
            Add a role in the current environment
@@ -47,8 +99,25 @@ class Environment(BaseModel):
           Post information to the current environment
         """
         # self.message_queue.put(message)
+        if self.log.append(message) is None:
+            return  # already published
         self.memory.add(message)
-        self.history += f"\n{message}"
+        current = _current_round.get()
+        if current is not None:
+            current.messages += 1
+        if self._ready is not None:
+            # the message waits in the log, the roles subscribed read it from their cursor
+            depth = current.round + 1 if current else 1
+            for profile, role in self.roles.items():
+                if self.subscribed(role, message):
+                    self._ready[profile] = min(self._ready.get(profile, depth), depth)
+
+    @staticmethod
+    def subscribed(role: Role, message: Message) -> bool:
+        """Whether the message may be news to the role, by the actions it watches or the recipient"""
+        return message.cause_by in role._rc.watch or (
+            bool(message.send_to) and message.send_to in (role.profile, role._setting.name)
+        )
 
     async def run(self, k=1):
         """处理一次所有信息的运行
@@ -59,13 +128,83 @@ class Environment(BaseModel):
         # rsp = await self.manager.handle(message, self)
         # self.message_queue.put(rsp)
         for _ in range(k):
+            stats = RoundStats(round=len(self.stats) + 1)
+            self.stats.append(stats)
             futures = []
             for role in self.roles.values():
-                future = role.run()
+                future = self._run_role(role, stats)
                 futures.append(future)
 
             await asyncio.gather(*futures)
 
+    async def _run_role(self, role: Role, stats: RoundStats):
+        # in the context of the task only, for the messages it publishes and the tokens it spends
+        _current_round.set(stats)
+        usage_counter.set(stats)
+        stats.runs += 1
+        stats.started_at = stats.started_at or time.time()
+        try:
+            if await role.run() is not None:
+                stats.active_roles.append(role.profile)
+        finally:
+            stats.finished_at = max(stats.finished_at, time.time())
+
+    async def run_events(
+        self,
+        n_round: int = 0,
+        before_run: Optional[Callable[[], None]] = None,
+        deadline: float = 0,
+        after_run: Optional[Callable[[Role], None]] = None,
+    ) -> bool:
+        """Run each role as soon as a message it subscribes to is published, until no role has any left.
+
+        A role runs at most once at a time, the roles with news run concurrently, without waiting for the
+        others to finish a round. `n_round` bounds the depth of the runs as `run` does the rounds: a run
+        triggered by the messages published from outside is at depth 1, by the messages of a run at depth d at
+        d + 1, 0 means no bound. `before_run` is called before starting each run, e.g. to check the budget,
+        `after_run` with the role after each run, e.g. to checkpoint it. Past `deadline` seconds, the runs in
+        flight are cancelled. Return whether it stopped idle.
+        """
+        rounds: dict[int, RoundStats] = {}
+        self._ready = {}
+        for profile, role in self.roles.items():
+            if any(self.subscribed(role, i) for i in self.log.read(role._rc.cursor, self.log.end)):
+                self._ready[profile] = 1
+        running: dict[asyncio.Task, str] = {}
+        started = time.monotonic()
+        try:
+            while self._ready or running:
+                for profile in [i for i in self._ready if i not in running.values()]:
+                    depth = self._ready.pop(profile)
+                    if n_round and depth > n_round:
+                        logger.debug(f"{profile} not run, beyond {n_round=}")
+                        continue
+                    if before_run:
+                        before_run()
+                    if depth not in rounds:
+                        rounds[depth] = RoundStats(round=depth)
+                    running[asyncio.create_task(self._run_role(self.roles[profile], rounds[depth]))] = profile
+                if not running:
+                    continue
+                timeout = deadline - (time.monotonic() - started) if deadline else None
+                if timeout is not None and timeout <= 0:
+                    logger.warning(f"stopped {list(running.values())} past the deadline of {deadline}s")
+                    return False
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    profile = running.pop(task)
+                    task.result()
+                    if after_run:
+                        after_run(self.roles[profile])
+            return True
+        finally:
+            self._ready = None
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            self.stats.extend(rounds[i] for i in sorted(rounds))
+
     def get_roles(self) -> dict[str, Role]:
         """获得环境内的所有角色
            Process all Role runs at once
@@ -6,8 +6,25 @@
 @File    : llm.py
 """
 
+from metagpt.config import CONFIG
 from metagpt.provider.anthropic_api import Claude2 as Claude
-from metagpt.provider.openai_api import OpenAIGPTAPI as LLM
+from metagpt.provider.anthropic_api import ClaudeGPTAPI
+from metagpt.provider.base_gpt_api import BaseGPTAPI
+from metagpt.provider.fake_api import FakeGPTAPI
+from metagpt.provider.openai_api import OpenAIGPTAPI
+from metagpt.provider.router_api import RouterGPTAPI
+
+
+def LLM() -> BaseGPTAPI:
+    """Initialize the LLM provider selected by `LLM_TYPE`"""
+    if CONFIG.llm_type == "claude":
+        return ClaudeGPTAPI()
+    if CONFIG.llm_type == "router":
+        return RouterGPTAPI()
+    if CONFIG.llm_type == "fake":
+        return FakeGPTAPI()
+    return OpenAIGPTAPI()
+
 
 DEFAULT_LLM = LLM()
 CLAUDE_LLM = Claude()
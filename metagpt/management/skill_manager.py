@@ -6,8 +6,10 @@
 @File    : skill_manager.py
 """
 from metagpt.actions import Action
+from metagpt.config import CONFIG
 from metagpt.const import PROMPT_PATH
 from metagpt.document_store.chromadb_store import ChromaStore
+from metagpt.document_store.embedding import get_embedding
 from metagpt.llm import LLM
 from metagpt.logs import logger
 
@@ -19,7 +21,9 @@ class SkillManager:
 
     def __init__(self):
         self._llm = LLM()
-        self._store = ChromaStore('skill_manager')
+        # the default embedding of chroma, local, unless EMBEDDING_TYPE is set
+        embedding_function = get_embedding().embed_documents if CONFIG.embedding_type else None
+        self._store = ChromaStore('skill_manager', embedding_function=embedding_function)
         self._skills: dict[str: Skill] = {}
 
     def add_skill(self, skill: Skill):
@@ -8,9 +8,17 @@
 
 from metagpt.memory.memory import Memory
 from metagpt.memory.longterm_memory import LongTermMemory
+from metagpt.memory.message_log import MessageLog
+from metagpt.memory.memory_view import MemoryView
+from metagpt.memory.memory_policy import MemoryPolicy
+from metagpt.memory.history import History
 
 
 __all__ = [
     "Memory",
     "LongTermMemory",
+    "MessageLog",
+    "MemoryView",
+    "MemoryPolicy",
+    "History",
 ]
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the transcript of the messages published to an environment, rendered lazily from its log
+
+from bisect import bisect_left
+from typing import Iterator, TextIO
+
+from metagpt.memory.message_log import MessageLog
+from metagpt.utils.token_counter import approx_string_tokens
+
+
+class History:
+    """A rope of one "\\n{message}" segment per message of the log, each rendered once when first needed.
+
+    Publishing a message costs nothing here. The whole text is only built by `str()`, and extended rather than
+    rebuilt since the last time. `write` and iterating stream the segments without joining them. The prefix sums
+    of the characters and tokens of the segments make `len` and the tails by tokens O(log n).
+    """
+
+    def __init__(self, log: MessageLog):
+        self.log = log
+        self._segments: list[str] = []
+        self._chars: list[int] = [0]  # prefix sums of the lengths of the segments
+        self._tokens: list[int] = [0]  # prefix sums of their approximate tokens
+        self._text = ""
+        self._rendered = 0  # the segments in _text
+
+    def _sync(self) -> list[str]:
+        messages = self.log.messages
+        if len(messages) < len(self._segments):
+            self.__init__(self.log)  # the log was replaced
+        for message in messages[len(self._segments) :]:
+            segment = f"\n{message}"
+            self._segments.append(segment)
+            self._chars.append(self._chars[-1] + len(segment))
+            self._tokens.append(self._tokens[-1] + approx_string_tokens(segment))
+        return self._segments
+
+    def __str__(self):
+        segments = self._sync()
+        if self._rendered < len(segments):
+            self._text += "".join(segments[self._rendered :])
+            self._rendered = len(segments)
+        return self._text
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __len__(self):
+        self._sync()
+        return self._chars[-1]
+
+    def __eq__(self, other):
+        if isinstance(other, History):
+            other = str(other)
+        return str(self) == other if isinstance(other, str) else NotImplemented
+
+    def __contains__(self, text: str):
+        return text in str(self)
+
+    def __iter__(self) -> Iterator[str]:
+        """The segments, without joining them"""
+        return iter(self._sync()[:])
+
+    def write(self, fp: TextIO):
+        """Stream the whole text to a file"""
+        fp.writelines(self._sync())
+
+    def last(self, n: int) -> str:
+        """The text of the last n messages"""
+        return "".join(self._sync()[-n:]) if n > 0 else ""
+
+    def last_tokens(self, max_tokens: int) -> str:
+        """The text of the most recent messages fitting in max_tokens, whole messages only"""
+        segments = self._sync()
+        start = bisect_left(self._tokens, self._tokens[-1] - max_tokens)
+        return "".join(segments[start:])
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : an inverted index of the words of the messages, to recall by keyword without scanning the whole memory
+
+import re
+from bisect import bisect_left, insort
+from typing import Hashable, Iterator, Optional
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class InvertedIndex:
+    """Word -> the keys of the texts containing it, in the order they were added.
+
+    `candidates` narrows a substring query down to the texts that may contain it, the caller checks the
+    substring on them only, so the results are exactly the ones of a scan. A word of the query with a
+    non-word character on both sides has to be a word of the text, its posting list answers directly. Otherwise
+    (e.g. "snake game" or "game.py") only the words at the ends of the query constrain the text, as a suffix or
+    a prefix of one of its words, looked up by bisecting the sorted vocabulary, or the reversed one for suffixes.
+    A query within a single word ("nak") scans the vocabulary, which is still far smaller than the texts.
+    """
+
+    def __init__(self):
+        self.postings: dict[str, dict[Hashable, None]] = {}  # ordered sets
+        self.seq: dict[Hashable, int] = {}  # key -> the order it was added in
+        self._next_seq = 0
+        self._words: list[str] = []  # sorted
+        self._reversed_words: list[str] = []  # each word reversed, sorted
+
+    def add(self, key: Hashable, text: str):
+        self.seq[key] = self._next_seq
+        self._next_seq += 1
+        for word in set(WORD_PATTERN.findall(text)):
+            if word not in self.postings:
+                self.postings[word] = {}
+                insort(self._words, word)
+                insort(self._reversed_words, word[::-1])
+            self.postings[word][key] = None
+
+    def delete(self, key: Hashable, text: str):
+        self.seq.pop(key, None)
+        for word in set(WORD_PATTERN.findall(text)):
+            posting = self.postings.get(word)
+            if posting is None:
+                continue
+            posting.pop(key, None)
+            if not posting:
+                del self.postings[word]
+                del self._words[bisect_left(self._words, word)]
+                del self._reversed_words[bisect_left(self._reversed_words, word[::-1])]
+
+    def clear(self):
+        self.postings = {}
+        self.seq = {}
+        self._words = []
+        self._reversed_words = []
+
+    @staticmethod
+    def _with_prefix(words: list[str], prefix: str) -> Iterator[str]:
+        for idx in range(bisect_left(words, prefix), len(words)):
+            if not words[idx].startswith(prefix):
+                break
+            yield words[idx]
+
+    def candidates(self, query: str) -> Optional[list[Hashable]]:
+        """The keys of the texts that may contain the query, in the order they were added,
+        None when the query has no word to narrow them down with"""
+        words = []
+        for match in WORD_PATTERN.finditer(query):
+            # whether the word starts / ends a word of the text as well
+            words.append((match.group(), match.start() > 0, match.end() < len(query)))
+        if not words:
+            return None
+
+        exact = sorted((self.postings.get(w, {}) for w, starts, ends in words if starts and ends), key=len)
+        if exact:
+            return [key for key in exact[0] if all(key in i for i in exact[1:])]
+
+        matches = []
+        for word, starts, ends in words:
+            if starts:
+                tokens = self._with_prefix(self._words, word)
+            elif ends:
+                tokens = (i[::-1] for i in self._with_prefix(self._reversed_words, word[::-1]))
+            else:
+                tokens = (i for i in self._words if word in i)
+            matches.append(set().union(*(self.postings[i] for i in tokens)))
+        return sorted(set.intersection(*matches), key=self.seq.__getitem__)
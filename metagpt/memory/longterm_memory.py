@@ -34,13 +34,15 @@ class LongTermMemory(Memory):
         self.add_batch(messages)
         self.msg_from_recover = False
 
-    def add(self, message: Message):
-        super(LongTermMemory, self).add(message)
+    def add(self, message: Message) -> bool:
+        if not super(LongTermMemory, self).add(message):
+            return False
         for action in self.rc.watch:
             if message.cause_by == action and not self.msg_from_recover:
                 # currently, only add role's watching messages to its memory_storage
                 # and ignore adding messages from recover repeatedly
                 self.memory_storage.add(message)
+        return True
 
     def find_news(self, observed: list[Message], k=0) -> list[Message]:
         """
@@ -53,17 +55,20 @@ class LongTermMemory(Memory):
             # memory_storage hasn't initialized, use default `find_news` to get stm_news
             return stm_news
 
-        ltm_news: list[Message] = []
-        for mem in stm_news:
-            # filter out messages similar to those seen previously in ltm, only keep fresh news
-            mem_searched = self.memory_storage.search_dissimilar(mem)
-            if len(mem_searched) > 0:
-                ltm_news.append(mem)
+        # filter out messages similar to those seen previously in ltm, only keep fresh news
+        searched = self.memory_storage.search_dissimilar_batch(stm_news)
+        ltm_news: list[Message] = [mem for mem, mem_searched in zip(stm_news, searched) if len(mem_searched) > 0]
         return ltm_news[-k:]
 
     def delete(self, message: Message):
         super(LongTermMemory, self).delete(message)
-        # TODO delete message in memory_storage
+        self.memory_storage.delete([message])
+
+    def delete_batch(self, messages: list[Message]):
+        """Delete the messages, rebuilding the index of memory_storage once for all of them"""
+        for message in messages:
+            super(LongTermMemory, self).delete(message)
+        self.memory_storage.delete(messages)
 
     def clear(self):
         super(LongTermMemory, self).clear()
@@ -6,83 +6,134 @@
 @File    : memory.py
 """
 from collections import defaultdict
-from typing import Iterable, Type
+from itertools import islice
+from typing import Any, Iterable, Optional, Type
 
 from metagpt.actions import Action
+from metagpt.config import CONFIG
+from metagpt.memory.inverted_index import InvertedIndex
 from metagpt.schema import Message
 
+# the fields of Message with a secondary index
+INDEXED_FIELDS = ("cause_by", "role", "sent_from", "send_to")
+
 
 class Memory:
     """The most basic memory: super-memory"""
 
-    def __init__(self):
-        """Initialize an empty storage list and an empty index dictionary"""
-        self.storage: list[Message] = []
-        self.index: dict[Type[Action], list[Message]] = defaultdict(list)
-
-    def add(self, message: Message):
-        """Add a new message to storage, while updating the index"""
-        if message in self.storage:
-            return
-        self.storage.append(message)
-        if message.cause_by:
-            self.index[message.cause_by].append(message)
+    def __init__(self, content_index: Optional[bool] = None):
+        """Initialize an empty storage and empty indexes, the words of the contents are indexed with
+        content_index, MEMORY_CONTENT_INDEX by default"""
+        # message id -> message, in insertion order, so add / contains / delete are O(1)
+        self.storage: dict[str, Message] = {}
+        # field -> value -> {message id: message}, in insertion order as well
+        self.indexes: dict[str, dict[Any, dict[str, Message]]] = {i: defaultdict(dict) for i in INDEXED_FIELDS}
+        if content_index is None:
+            content_index = CONFIG.memory_content_index
+        self.content_index: Optional[InvertedIndex] = InvertedIndex() if content_index else None
+
+    @property
+    def index(self) -> dict[Type[Action], dict[str, Message]]:
+        return self.indexes["cause_by"]
+
+    def add(self, message: Message) -> bool:
+        """Add a new message to storage, while updating the indexes. Return whether it was new"""
+        if message.id in self.storage:
+            return False
+        self.storage[message.id] = message
+        for field, index in self.indexes.items():
+            value = getattr(message, field)
+            if value:
+                index[value][message.id] = message
+        if self.content_index is not None:
+            self.content_index.add(message.id, message.content)
+        return True
 
     def add_batch(self, messages: Iterable[Message]):
         for message in messages:
             self.add(message)
 
+    def __contains__(self, message: Message) -> bool:
+        return message.id in self.storage
+
+    def __len__(self) -> int:
+        return len(self.storage)
+
+    def _get_by(self, field: str, value) -> list[Message]:
+        index = self.indexes[field]
+        return list(index[value].values()) if value in index else []
+
     def get_by_role(self, role: str) -> list[Message]:
         """Return all messages of a specified role"""
-        return [message for message in self.storage if message.role == role]
+        return self._get_by("role", role)
+
+    def get_by_sent_from(self, sent_from: str) -> list[Message]:
+        """Return all messages sent from a specified role"""
+        return self._get_by("sent_from", sent_from)
+
+    def get_by_send_to(self, send_to: str) -> list[Message]:
+        """Return all messages sent to a specified role"""
+        return self._get_by("send_to", send_to)
 
     def get_by_content(self, content: str) -> list[Message]:
         """Return all messages containing a specified content"""
-        return [message for message in self.storage if content in message.content]
+        if self.content_index is not None:
+            ids = self.content_index.candidates(content)
+            if ids is not None:
+                return [self.storage[i] for i in ids if content in self.storage[i].content]
+        return [message for message in self.storage.values() if content in message.content]
 
     def delete(self, message: Message):
-        """Delete the specified message from storage, while updating the index"""
-        self.storage.remove(message)
-        if message.cause_by and message in self.index[message.cause_by]:
-            self.index[message.cause_by].remove(message)
+        """Delete the specified message from storage, while updating the indexes"""
+        message = self.storage.pop(message.id)
+        for field, index in self.indexes.items():
+            value = getattr(message, field)
+            if value in index:
+                index[value].pop(message.id, None)
+                if not index[value]:
+                    del index[value]
+        if self.content_index is not None:
+            self.content_index.delete(message.id, message.content)
+
+    def delete_batch(self, messages: Iterable[Message]):
+        for message in messages:
+            self.delete(message)
 
     def clear(self):
-        """Clear storage and index"""
-        self.storage = []
-        self.index = defaultdict(list)
+        """Clear storage and indexes"""
+        self.storage = {}
+        self.indexes = {i: defaultdict(dict) for i in INDEXED_FIELDS}
+        if self.content_index is not None:
+            self.content_index.clear()
 
     def count(self) -> int:
         """Return the number of messages in storage"""
-        return len(self.storage)
+        return len(self)
 
     def try_remember(self, keyword: str) -> list[Message]:
         """Try to recall all messages containing a specified keyword"""
-        return [message for message in self.storage if keyword in message.content]
+        return self.get_by_content(keyword)
 
     def get(self, k=0) -> list[Message]:
         """Return the most recent k memories, return all when k=0"""
-        return self.storage[-k:]
+        if k == 0:
+            return list(self.storage.values())
+        return list(islice(reversed(self.storage.values()), k))[::-1]
 
     def find_news(self, observed: list[Message], k=0) -> list[Message]:
         """find news (previously unseen messages) from the the most recent k memories, from all memories when k=0"""
-        already_observed = self.get(k)
-        news: list[Message] = []
-        for i in observed:
-            if i in already_observed:
-                continue
-            news.append(i)
-        return news
+        if k == 0:
+            return [i for i in observed if i not in self]
+        already_observed = {i.id for i in self.get(k)}
+        return [i for i in observed if i.id not in already_observed]
 
     def get_by_action(self, action: Type[Action]) -> list[Message]:
         """Return all messages triggered by a specified Action"""
-        return self.index[action]
+        return self._get_by("cause_by", action)
 
     def get_by_actions(self, actions: Iterable[Type[Action]]) -> list[Message]:
         """Return all messages triggered by specified Actions"""
         rsp = []
         for action in actions:
-            if action not in self.index:
-                continue
-            rsp += self.index[action]
+            rsp += self.get_by_action(action)
         return rsp
-    
\ No newline at end of file
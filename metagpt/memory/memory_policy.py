@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : bound the memory of a role by messages, tokens and age, folding what is evicted into a summary
+
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from metagpt.config import CONFIG
+from metagpt.logs import logger
+from metagpt.memory.memory import Memory
+from metagpt.schema import Message
+from metagpt.utils.token_counter import approx_string_tokens
+
+SUMMARY_ROLE = "Summary"
+
+SUMMARY_PROMPT = """Here is the summary of a conversation so far, and the messages that followed it.
+Write a new summary of the whole conversation, keeping the decisions, requirements, file names and open issues,
+in at most {max_words} words. Answer the summary only.
+
+## Summary so far
+{summary}
+
+## Messages
+{messages}
+"""
+
+
+@dataclass
+class MemoryPolicy:
+    """How much a memory keeps, 0 means no limit.
+
+    Past a limit, the oldest messages are evicted down to 3/4 of it, so that evictions, and the summaries of
+    what is evicted, come in windows rather than one message at a time. A message older than `ttl` seconds is
+    evicted whatever the limits. The latest message of each action is never evicted, the roles look them up.
+    """
+
+    max_messages: int = 0
+    max_tokens: int = 0
+    ttl: float = 0
+    summarize_with_llm: bool = False  # one LLM call per window, a plain text digest otherwise
+    summary_max_tokens: int = 500
+
+    @classmethod
+    def from_config(cls) -> Optional["MemoryPolicy"]:
+        policy = cls(
+            max_messages=CONFIG.memory_max_messages,
+            max_tokens=CONFIG.memory_max_tokens,
+            ttl=CONFIG.memory_ttl,
+            summarize_with_llm=CONFIG.memory_summary_llm,
+        )
+        return policy if policy.bounded else None
+
+    @property
+    def bounded(self) -> bool:
+        return bool(self.max_messages or self.max_tokens or self.ttl)
+
+    def select(self, memory: Memory, now: Optional[float] = None) -> list[Message]:
+        """The messages of the memory to evict, oldest first"""
+        messages = memory.get()
+        now = time.time() if now is None else now
+        latest = {i.cause_by: i.id for i in messages if i.cause_by}
+        pinned = set(latest.values())
+        tokens = [approx_string_tokens(i.content) for i in messages]
+        count, total = len(messages), sum(tokens)
+        keep_count = self.max_messages * 3 // 4 if self.max_messages and count > self.max_messages else count
+        keep_tokens = self.max_tokens * 3 // 4 if self.max_tokens and total > self.max_tokens else total
+
+        evicted = []
+        for message, n_tokens in zip(messages, tokens):
+            if message.id in pinned:
+                continue
+            expired = self.ttl and now - message.created_at > self.ttl
+            if not (expired or count > keep_count or total > keep_tokens):
+                break
+            evicted.append(message)
+            count -= 1
+            total -= n_tokens
+        return evicted
+
+    def fold(self, summary: Optional[Message], evicted: list[Message]) -> Message:
+        """A digest of the summary and the evicted messages, the oldest lines dropped beyond summary_max_tokens"""
+        lines = summary.content.splitlines() if summary else []
+        lines += [f"{i.role}: {' '.join(i.content.split())[:200]}" for i in evicted]
+        total = sum(approx_string_tokens(i) for i in lines)
+        while len(lines) > 1 and total > self.summary_max_tokens:
+            total -= approx_string_tokens(lines.pop(0))
+        return Message(content="\n".join(lines), role=SUMMARY_ROLE)
+
+    async def afold(self, summary: Optional[Message], evicted: list[Message], llm) -> Message:
+        if not self.summarize_with_llm:
+            return self.fold(summary, evicted)
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.summary_max_tokens * 3 // 4,
+            summary=summary.content if summary else "",
+            messages="\n".join(str(i) for i in evicted),
+        )
+        try:
+            return Message(content=await llm.aask(prompt), role=SUMMARY_ROLE)
+        except Exception as e:
+            logger.warning(f"failed to summarize {len(evicted)} messages, keep a digest of them: {e}")
+            return self.fold(summary, evicted)
@@ -2,24 +2,63 @@
 # -*- coding: utf-8 -*-
 # @Desc   : the implement of memory storage
 
-from typing import List
+import atexit
+import copy
+import os
+import pickle
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, List, Optional
 
+import faiss
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
 from langchain.vectorstores.faiss import FAISS
 
+from metagpt.config import CONFIG
 from metagpt.const import DATA_PATH, MEM_TTL
+from metagpt.document_store.faiss_store import FaissStore
 from metagpt.logs import logger
 from metagpt.schema import Message
-from metagpt.utils.serialize import serialize_message, deserialize_message
-from metagpt.document_store.faiss_store import FaissStore
+from metagpt.utils.serialize import deserialize_message, serialize_message
+
+DURABILITY_MODES = ("message", "batch", "shutdown")
+
+# the storages with a writer, flushed at exit, without keeping them alive until then
+_open_storages: "weakref.WeakSet[MemoryStorage]" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_storages():
+    for storage in list(_open_storages):
+        storage.close()
 
 
 class MemoryStorage(FaissStore):
     """
     The memory storage with Faiss as ANN search engine
+
+    A new message is added to the in-memory index and appended, with its embedding, to a write-ahead log, so that
+    adding costs O(1) disk I/O instead of rewriting the whole index. The log is written by a background thread,
+    as soon as a message is added (`add` returns once it is on the disk), every `flush_every` messages or at exit
+    only, depending on `durability`.
+    Every `compact_every` messages or `compact_interval` seconds, the index and the docstore are compacted into a
+    snapshot and the log segments it covers are removed. Recovery loads the snapshot and replays the log.
     """
 
-    def __init__(self, mem_ttl: int = MEM_TTL):
+    def __init__(
+        self,
+        mem_ttl: int = MEM_TTL,
+        durability: Optional[str] = None,
+        flush_every: Optional[int] = None,
+        compact_every: Optional[int] = None,
+        compact_interval: Optional[float] = None,
+        embedding: Optional[Embeddings] = None,
+    ):
         self.role_id: str = None
         self.role_mem_path: str = None
         self.mem_ttl: int = mem_ttl  # later use
@@ -27,6 +66,22 @@ class MemoryStorage(FaissStore):
         self._initialized: bool = False
 
         self.store: FAISS = None  # Faiss engine
+        self.embedding: Optional[Embeddings] = embedding  # EMBEDDING_TYPE by default
+
+        self.durability = durability or CONFIG.memory_durability
+        if self.durability not in DURABILITY_MODES:
+            raise ValueError(f"MEMORY_DURABILITY should be one of {DURABILITY_MODES}, not {self.durability}")
+        self.flush_every = CONFIG.memory_flush_every if flush_every is None else flush_every
+        self.compact_every = CONFIG.memory_compact_every if compact_every is None else compact_every
+        self.compact_interval = CONFIG.memory_compact_interval if compact_interval is None else compact_interval
+
+        self._executor: Optional[ThreadPoolExecutor] = None  # a single thread, the writes happen in order
+        self._pending: list[Future] = []
+        self._store_lock = threading.Lock()  # the writer copies the store to compact it, the caller adds to it
+        self._buffer: list[tuple] = []  # the log records not handed to the writer yet
+        self._segment = 0  # the log segment new records go to
+        self._uncompacted = 0
+        self._compacted_at = time.monotonic()
 
     @property
     def is_initialized(self) -> bool:
@@ -36,8 +91,21 @@ class MemoryStorage(FaissStore):
         self.role_id = role_id
         self.role_mem_path = Path(DATA_PATH / f'role_mem/{self.role_id}/')
         self.role_mem_path.mkdir(parents=True, exist_ok=True)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory_storage")
+            _open_storages.add(self)
+
+        checkpoint = self._load_snapshot()
+        segments = [i for i in self._wal_segments() if i > checkpoint]
+        for segment in segments:
+            self._replay(segment)
+        self._segment = max(segments, default=checkpoint) + 1
+        self._uncompacted = 0
+        if self.store and self.embedding is None:
+            # the embeddings the index was built with
+            self.embedding = getattr(self.store.embedding_function, "__self__", None)
+        self.prune()
 
-        self.store = self._load()
         messages = []
         if not self.store:
             # TODO init `self.store` under here with raw faiss api instead under `add`
@@ -57,22 +125,215 @@ class MemoryStorage(FaissStore):
         storage_fpath = Path(self.role_mem_path / f'{self.role_id}.pkl')
         return index_fpath, storage_fpath
 
+    def _snapshot_fname(self) -> Path:
+        return Path(self.role_mem_path / f'{self.role_id}.snapshot')
+
+    def _wal_fname(self, segment: int) -> Path:
+        return Path(self.role_mem_path / f'{self.role_id}.wal.{segment}')
+
+    def _wal_segments(self) -> list[int]:
+        prefix = f'{self.role_id}.wal.'
+        return sorted(int(i.name[len(prefix):]) for i in self.role_mem_path.glob(f'{prefix}*'))
+
+    def _load_snapshot(self) -> int:
+        """Load the last snapshot, or the index written before the log existed.
+        Return the last log segment the snapshot covers"""
+        fpath = self._snapshot_fname()
+        if not fpath.exists():
+            self.store = self._load()
+            return -1
+        with open(fpath, "rb") as f:
+            snapshot = pickle.load(f)
+        self.store = pickle.loads(snapshot["store"])
+        self.store.index = faiss.deserialize_index(snapshot["index"])
+        return snapshot["segment"]
+
+    def _replay(self, segment: int):
+        with open(self._wal_fname(segment), "rb") as f:
+            while True:
+                try:
+                    record = pickle.load(f)
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, TypeError, AttributeError) as e:
+                    # torn by a crash in the middle of a write, the records after it were never acknowledged
+                    logger.warning(f"Agent {self.role_id} memory log {segment} is truncated: {e}")
+                    break
+                self._add_to_store(*record)
+
+    def _get_embedding(self) -> Embeddings:
+        if self.embedding is None:
+            self.embedding = self._embedding()
+        return self.embedding
+
+    def _add_to_store(
+        self,
+        content: str,
+        embedding: list[float],
+        message_ser: bytes,
+        created_at: float = None,
+        message_id: str = None,
+    ):
+        text_embeddings = [(content, embedding)]
+        metadatas = [{"message_ser": message_ser, "created_at": created_at or time.time(), "message_id": message_id}]
+        if not self.store:
+            # init Faiss
+            self.store = FAISS.from_embeddings(text_embeddings, self._get_embedding(), metadatas=metadatas)
+        else:
+            with self._store_lock:
+                self.store.add_embeddings(text_embeddings, metadatas=metadatas)
+
+    def _submit(self, fn, *args) -> Future:
+        pending = []
+        for future in self._pending:
+            if not future.done():
+                pending.append(future)
+            elif future.exception():
+                logger.error(f"Agent {self.role_id} failed to write its memory: {future.exception()}")
+        future = self._executor.submit(fn, *args)
+        pending.append(future)
+        self._pending = pending
+        return future
+
+    def _write_wal(self, segment: int, records: list[tuple]):
+        with open(self._wal_fname(segment), "ab") as f:
+            for record in records:
+                pickle.dump(record, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def flush(self) -> Optional[Future]:
+        """Hand the buffered log records to the writer, return the future of their write"""
+        if not self._buffer:
+            return None
+        future = self._submit(self._write_wal, self._segment, self._buffer)
+        self._buffer = []
+        return future
+
+    def _copy_store(self, store: FAISS, ntotal: int) -> tuple[FAISS, faiss.Index]:
+        """Copy the first `ntotal` vectors of the index and their documents, the ones the compaction covers.
+        The copies are flat, the messages added later do not change them"""
+        with self._store_lock:
+            index = faiss.clone_index(store.index)
+            index_to_docstore_id = {i: store.index_to_docstore_id[i] for i in range(ntotal)}
+            documents = {i: store.docstore._dict[i] for i in index_to_docstore_id.values()}
+        if index.ntotal > ntotal:
+            index.remove_ids(faiss.IDSelectorRange(ntotal, index.ntotal))
+        snapshot_store = copy.copy(store)
+        snapshot_store.index = None
+        snapshot_store.docstore = copy.copy(store.docstore)
+        snapshot_store.docstore._dict = documents
+        snapshot_store.index_to_docstore_id = index_to_docstore_id
+        return snapshot_store, index
+
+    def _write_snapshot(self, segment: int, store: FAISS, ntotal: int):
+        store, index = self._copy_store(store, ntotal)
+        snapshot = {"segment": segment, "index": faiss.serialize_index(index), "store": pickle.dumps(store)}
+        fpath = self._snapshot_fname()
+        tmp = fpath.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, fpath)
+        for i in self._wal_segments():
+            if i <= segment:
+                self._wal_fname(i).unlink(missing_ok=True)
+        logger.debug(f'Agent {self.role_id} compacted its memory up to log {segment}')
+
+    def compact(self):
+        """Hand the store and the number of messages in it to the writer, which copies, serializes and saves them,
+        then removes the log they cover. Only the messages added while it copies wait for it"""
+        if not self.store:
+            return
+        self.flush()
+        self._submit(self._write_snapshot, self._segment, self.store, self.store.index.ntotal)
+        self._segment += 1
+        self._uncompacted = 0
+        self._compacted_at = time.monotonic()
+
+    def wait(self):
+        """Wait for the writer to finish the writes handed to it"""
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
     def persist(self):
-        super(MemoryStorage, self).persist()
+        self.compact()
+        self.wait()
         logger.debug(f'Agent {self.role_id} persist memory into local')
 
+    def close(self):
+        if self._executor is None:
+            return
+        self.flush()
+        self.wait()
+
     def add(self, message: Message) -> bool:
         """ add message into memory storage"""
-        docs = [message.content]
-        metadatas = [{"message_ser": serialize_message(message)}]
-        if not self.store:
-            # init Faiss
-            self.store = self._write(docs, metadatas)
-            self._initialized = True
-        else:
-            self.store.add_texts(texts=docs, metadatas=metadatas)
-        self.persist()
+        if self._executor is None:
+            logger.error(f'You should call {self.__class__.__name__}.recover_memory fist when using LongTermMemory')
+            return False
+        embedding = self._get_embedding().embed_documents([message.content])[0]
+        record = (message.content, embedding, serialize_message(message), message.created_at, message.id)
+        self._add_to_store(*record)
+        self._initialized = True
+        self._buffer.append(record)
+        self._uncompacted += 1
+        if self.durability == "message":
+            self.flush().result()
+        elif self.durability == "batch" and len(self._buffer) >= self.flush_every:
+            self.flush()
+        if self._uncompacted >= self.compact_every or time.monotonic() - self._compacted_at >= self.compact_interval:
+            if not self.prune():  # a prune compacts as well
+                self.compact()
         logger.info(f"Agent {self.role_id}'s memory_storage add a message")
+        return True
+
+    def _remove(self, condition: Callable[[Document], bool]) -> int:
+        """Remove the messages whose document meets the condition and rebuild the index, then compact it so that
+        they are gone from the disk as well. Return how many were removed"""
+        if not self.store:
+            return 0
+        positions = sorted(self.store.index_to_docstore_id)
+        documents = [self.store.docstore.search(self.store.index_to_docstore_id[i]) for i in positions]
+        kept = [i for i, doc in enumerate(documents) if not condition(doc)]
+        removed = len(documents) - len(kept)
+        if not removed:
+            return 0
+        if not kept:
+            self.clean()
+            return removed
+        vectors = self.store.index.reconstruct_n(0, self.store.index.ntotal)
+        self.store = FAISS.from_embeddings(
+            [(documents[i].page_content, vectors[positions[i]]) for i in kept],
+            self._get_embedding(),
+            metadatas=[documents[i].metadata for i in kept],
+        )
+        self.compact()
+        return removed
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Remove the messages older than mem_ttl seconds, return how many were removed.
+        It runs on recovery and on each compaction"""
+        if not self.mem_ttl:
+            return 0
+        now = time.time() if now is None else now
+        # the messages stored before their time was, age from now on
+        removed = self._remove(lambda doc: now - doc.metadata.setdefault("created_at", now) > self.mem_ttl)
+        if removed:
+            logger.info(f"Agent {self.role_id} pruned {removed} messages older than {self.mem_ttl}s from its memory")
+        return removed
+
+    def delete(self, messages: List[Message]) -> int:
+        """Remove the messages from the index and the disk, return how many were stored"""
+        ids = {i.id for i in messages}
+        return self._remove(lambda doc: self._message_id(doc) in ids) if ids else 0
+
+    @staticmethod
+    def _message_id(document: Document) -> str:
+        # the messages stored before their id was kept with them
+        return document.metadata.get("message_id") or deserialize_message(document.metadata["message_ser"]).id
 
     def search_dissimilar(self, message: Message, k=4) -> List[Message]:
         """search for dissimilar messages"""
@@ -95,13 +356,38 @@ class MemoryStorage(FaissStore):
             filtered_resp.append(new_mem)
         return filtered_resp
 
+    def search_dissimilar_batch(self, messages: List[Message], k=4) -> List[List[Message]]:
+        """`search_dissimilar` of each message, with one embedding request and one FAISS search for all of them"""
+        if not self.store or not messages:
+            return [[] for _ in messages]
+
+        vectors = np.array(self._get_embedding().embed_documents([i.content for i in messages]), dtype=np.float32)
+        if self.store._normalize_L2:
+            faiss.normalize_L2(vectors)
+        scores, indices = self.store.index.search(vectors, k)
+        # the smaller score means more similar relation, -1 when there are less than k vectors
+        keep = (indices != -1) & (scores >= self.threshold)
+        return [[self._message_at(i) for i in row[row_keep]] for row, row_keep in zip(indices, keep)]
+
+    def _message_at(self, idx: int) -> Message:
+        document = self.store.docstore.search(self.store.index_to_docstore_id[idx])
+        return deserialize_message(document.metadata.get("message_ser"))
+
     def clean(self):
+        if self._executor is not None:
+            self._buffer = []
+            self.wait()
         index_fpath, storage_fpath = self._get_index_and_store_fname()
         if index_fpath and index_fpath.exists():
             index_fpath.unlink(missing_ok=True)
         if storage_fpath and storage_fpath.exists():
             storage_fpath.unlink(missing_ok=True)
+        if self.role_mem_path:
+            self._snapshot_fname().unlink(missing_ok=True)
+            for i in self._wal_segments():
+                self._wal_fname(i).unlink(missing_ok=True)
 
         self.store = None
         self._initialized = False
-        
\ No newline at end of file
+        self._segment = 0
+        self._uncompacted = 0
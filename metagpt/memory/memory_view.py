@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the memory of a role as a view over the message log of its environment
+
+import heapq
+from itertools import islice
+from operator import itemgetter
+from typing import Iterable, Iterator, Type
+
+from metagpt.actions import Action
+from metagpt.memory.memory import Memory
+from metagpt.memory.message_log import MessageLog
+from metagpt.schema import Message
+
+
+class MemoryView(Memory):
+    """The messages of the log a role has received, plus the ones only it knows of.
+
+    The messages of the log are the offsets in [start, end), so they are stored and indexed once in the log
+    however many roles receive them, and receiving the next message of the log is O(1). The other messages,
+    e.g. a reply not published yet, go to a small private log, each one placed after the log messages
+    received before it.
+    """
+
+    def __init__(self, log: MessageLog):
+        self.log = log
+        self.start = 0
+        self.end = 0
+        self.private = MessageLog(content_index=log.content_index is not None)
+        self.private_at: list[int] = []  # the end of the view when each private message was added
+        self.deleted: set[str] = set()
+        self._count = 0
+
+    def add(self, message: Message) -> bool:
+        offset = self.log.offsets.get(message.id)
+        if message in self:
+            if offset == self.end:
+                self.end += 1  # a private message published since, it keeps its place
+            return False
+        if message.id in self.deleted:
+            self.deleted.discard(message.id)
+        elif offset == self.end:
+            self.end += 1
+        else:
+            self.private.append(message)
+            self.private_at.append(self.end)
+        self._count += 1
+        return True
+
+    def __contains__(self, message: Message) -> bool:
+        if message.id in self.deleted:
+            return False
+        if message in self.private:
+            return True
+        return self.start <= self.log.offsets.get(message.id, -1) < self.end
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _merge(self, shared: Iterable[int], private: Iterable[int], reverse: bool = False) -> Iterator[Message]:
+        """Merge the offsets of the log and of the private log in the order the messages were added"""
+        entries = heapq.merge(
+            (((i, 1, 0), self.log.messages[i]) for i in shared),
+            (((self.private_at[i], 0, i), self.private.messages[i]) for i in private),
+            key=itemgetter(0),
+            reverse=reverse,
+        )
+        for (_, is_shared, _), message in entries:
+            if message.id in self.deleted or (is_shared and message in self.private):
+                continue
+            yield message
+
+    def _select(self, field: str, values: Iterable) -> list[Message]:
+        values = list(values)
+        shared = self.log.offsets_by(field, values, self.start, self.end)
+        return list(self._merge(shared, self.private.offsets_by(field, values)))
+
+    def _get_by(self, field: str, value) -> list[Message]:
+        return self._select(field, [value])
+
+    def get_by_actions(self, actions: Iterable[Type[Action]]) -> list[Message]:
+        """Return all messages triggered by specified Actions, in the order they were added"""
+        return self._select("cause_by", actions)
+
+    def get_by_content(self, content: str) -> list[Message]:
+        if self.log.content_index is not None:
+            shared = self.log.content_index.candidates(content)
+            private = self.private.content_index.candidates(content)
+            if shared is not None:
+                shared = (i for i in shared if self.start <= i < self.end)
+                return [i for i in self._merge(shared, private) if content in i.content]
+        return [message for message in self.get() if content in message.content]
+
+    def get(self, k=0) -> list[Message]:
+        shared, private = range(self.start, self.end), range(len(self.private))
+        if k == 0:
+            return list(self._merge(shared, private))
+        return list(islice(self._merge(reversed(shared), reversed(private), reverse=True), k))[::-1]
+
+    def delete(self, message: Message):
+        """The log is append-only, the message is hidden from the view"""
+        if message not in self:
+            raise KeyError(message.id)
+        self.deleted.add(message.id)
+        self._count -= 1
+        # skip the deleted prefix of the log for good, so that evicting the oldest messages keeps reads flat
+        messages = self.log.messages
+        while self.start < self.end and messages[self.start].id in self.deleted:
+            if messages[self.start] not in self.private:
+                self.deleted.discard(messages[self.start].id)
+            self.start += 1
+
+    def clear(self):
+        self.start = self.end
+        self.private = MessageLog(content_index=self.log.content_index is not None)
+        self.private_at = []
+        self.deleted = set()
+        self._count = 0
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the append-only log of the messages published to an environment, read by the roles from their cursors
+
+import heapq
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Iterable, Iterator, Optional, Type
+
+from metagpt.actions import Action
+from metagpt.config import CONFIG
+from metagpt.memory.inverted_index import InvertedIndex
+from metagpt.memory.memory import INDEXED_FIELDS
+from metagpt.schema import Message
+
+
+class MessageLog:
+    """Every message published gets the next offset and is never moved nor removed, so that a reader only has to
+    remember the offset it stopped at. Each of INDEXED_FIELDS has posting lists of offsets, reading the messages
+    of a few actions costs O(log n) plus the messages returned, whatever the size of the log.
+    """
+
+    def __init__(self, content_index: Optional[bool] = None):
+        self.messages: list[Message] = []
+        self.offsets: dict[str, int] = {}  # message id -> offset
+        # field -> value -> the offsets of its messages, sorted as they are appended in order
+        self.postings: dict[str, dict[Any, list[int]]] = {i: defaultdict(list) for i in INDEXED_FIELDS}
+        if content_index is None:
+            content_index = CONFIG.memory_content_index
+        # the words of the contents -> offsets
+        self.content_index: Optional[InvertedIndex] = InvertedIndex() if content_index else None
+
+    def append(self, message: Message) -> Optional[int]:
+        """Append a new message, return its offset, or None if it was already published"""
+        if message.id in self.offsets:
+            return None
+        offset = len(self.messages)
+        self.messages.append(message)
+        self.offsets[message.id] = offset
+        for field, postings in self.postings.items():
+            value = getattr(message, field)
+            if value:
+                postings[value].append(offset)
+        if self.content_index is not None:
+            self.content_index.add(offset, message.content)
+        return offset
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __contains__(self, message: Message) -> bool:
+        return message.id in self.offsets
+
+    @property
+    def end(self) -> int:
+        """The offset of the next message, where a reader that is up to date sits"""
+        return len(self.messages)
+
+    def read(self, start: int = 0, end: Optional[int] = None) -> list[Message]:
+        """Return the messages in [start, end), up to the end of the log when end is None"""
+        return self.messages[start:end]
+
+    def read_by_actions(
+        self, actions: Iterable[Type[Action]], start: int = 0, end: Optional[int] = None
+    ) -> list[Message]:
+        """Return the messages in [start, end) triggered by one of the actions, in the order they were published"""
+        return [self.messages[i] for i in self.offsets_by("cause_by", actions, start, end)]
+
+    def offsets_by(self, field: str, values: Iterable, start: int = 0, end: Optional[int] = None) -> Iterator[int]:
+        """The offsets in [start, end) of the messages whose field is one of the values, in increasing order"""
+        end = len(self.messages) if end is None else end
+        runs = []
+        for value in set(values):
+            postings = self.postings[field].get(value)
+            if postings:
+                runs.append(postings[bisect_left(postings, start) : bisect_left(postings, end)])
+        return heapq.merge(*runs)
@@ -7,6 +7,9 @@
 """
 
 from metagpt.provider.openai_api import OpenAIGPTAPI
+from metagpt.provider.anthropic_api import ClaudeGPTAPI
+from metagpt.provider.fake_api import FakeGPTAPI
+from metagpt.provider.router_api import RouterGPTAPI
 
 
-__all__ = ["OpenAIGPTAPI"]
+__all__ = ["OpenAIGPTAPI", "ClaudeGPTAPI", "FakeGPTAPI", "RouterGPTAPI"]
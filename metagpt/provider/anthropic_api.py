@@ -5,16 +5,43 @@
 @Author  : Leo Xiao
 @File    : anthropic_api.py
 """
+import asyncio
+from typing import AsyncIterator, Optional
 
 import anthropic
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
 
 from metagpt.config import CONFIG
+from metagpt.logs import logger
+from metagpt.provider.base_gpt_api import BaseGPTAPI
+from metagpt.provider.openai_api import CostManager
+from metagpt.provider.rate_limiter import get_rate_limiter, make_limiter_key
+from metagpt.provider.response_cache import make_chat_response
+from metagpt.provider.stream_sink import get_stream_sink
+from metagpt.utils.token_counter import approx_string_tokens
+
+_sync_clients: dict[str, Anthropic] = {}
+_async_clients: dict[str, tuple[asyncio.AbstractEventLoop, AsyncAnthropic]] = {}
+
+
+def get_client(api_key: str) -> Anthropic:
+    """One client per api key, so that the http connection pool is reused"""
+    if api_key not in _sync_clients:
+        _sync_clients[api_key] = Anthropic(api_key=api_key)
+    return _sync_clients[api_key]
+
+
+def get_async_client(api_key: str) -> AsyncAnthropic:
+    """One async client per api key and event loop, so that the http connection pool is reused"""
+    loop = asyncio.get_running_loop()
+    if api_key not in _async_clients or _async_clients[api_key][0] is not loop:
+        _async_clients[api_key] = (loop, AsyncAnthropic(api_key=api_key))
+    return _async_clients[api_key][1]
 
 
 class Claude2:
     def ask(self, prompt):
-        client = Anthropic(api_key=CONFIG.claude_api_key)
+        client = get_client(CONFIG.claude_api_key)
 
         res = client.completions.create(
             model="claude-2",
@@ -24,12 +51,137 @@ class Claude2:
         return res.completion
 
     async def aask(self, prompt):
-        client = Anthropic(api_key=CONFIG.claude_api_key)
+        client = get_async_client(CONFIG.claude_api_key)
 
-        res = client.completions.create(
+        res = await client.completions.create(
             model="claude-2",
             prompt=f"{anthropic.HUMAN_PROMPT} {prompt} {anthropic.AI_PROMPT}",
             max_tokens_to_sample=1000,
         )
         return res.completion
-    
\ No newline at end of file
+
+
+class ClaudeGPTAPI(BaseGPTAPI):
+    """
+    Claude provider with the standard GPTAPI interface,
+    the OpenAI messages are converted to the Human/Assistant prompt.
+    Check https://docs.anthropic.com/claude/reference/complete_post for details
+    """
+
+    def __init__(self):
+        self.api_key = CONFIG.claude_api_key
+        self._model = None  # CLAUDE_API_MODEL of the project the request is made in
+        self.rpm = int(CONFIG.get("RPM", 10))
+        self._cost_manager = CostManager()
+        self.coalesce_requests = CONFIG.llm_coalesce_requests
+        self.stream_sink = get_stream_sink(CONFIG.stream_sink)
+        self._limiter = get_rate_limiter(
+            make_limiter_key(self.api_key, "anthropic"),
+            rpm=self.rpm,
+            tpm=int(CONFIG.claude_api_tpm or 0),
+            max_concurrency=CONFIG.llm_max_concurrency,
+        )
+
+    @property
+    def model(self) -> str:
+        return self._model or CONFIG.project_setting("claude_api_model")
+
+    @model.setter
+    def model(self, value: str):
+        self._model = value
+
+    def _max_inflight(self) -> int:
+        return self._limiter.max_concurrency
+
+    def messages_to_prompt(self, messages: list[dict]) -> str:
+        """System messages go before the first human turn, as Claude has no system role"""
+        system = "\n".join(i["content"] for i in messages if i["role"] == "system")
+        prompt = ""
+        for i in messages:
+            if i["role"] == "system":
+                continue
+            if i["role"] == "assistant":
+                prompt += f"{anthropic.AI_PROMPT} {i['content']}"
+            else:
+                content = f"{system}\n\n{i['content']}" if system else i["content"]
+                system = ""
+                prompt += f"{anthropic.HUMAN_PROMPT} {content}"
+        if system:
+            prompt += f"{anthropic.HUMAN_PROMPT} {system}"
+        return f"{prompt}{anthropic.AI_PROMPT}"
+
+    def _cons_kwargs(self, messages: list[dict]) -> dict:
+        return {
+            "model": self.model,
+            "prompt": self.messages_to_prompt(messages),
+            "max_tokens_to_sample": CONFIG.max_tokens_rsp,
+            "temperature": 0.3,
+        }
+
+    @staticmethod
+    def _estimate_tokens(kwargs: dict) -> int:
+        return approx_string_tokens(kwargs["prompt"]) + kwargs["max_tokens_to_sample"]
+
+    def completion(self, messages: list[dict]) -> dict:
+        kwargs = self._cons_kwargs(messages)
+        rsp = get_client(self.api_key).completions.create(**kwargs)
+        usage = self._calc_usage(kwargs["prompt"], rsp.completion)
+        self._update_costs(usage)
+        return make_chat_response(rsp.completion, usage)
+
+    async def acompletion(self, messages: list[dict]) -> dict:
+        return await self._coalesce("completion", messages, lambda: self._acompletion(messages))
+
+    async def _acompletion(self, messages: list[dict]) -> dict:
+        kwargs = self._cons_kwargs(messages)
+        async with self._limiter.acquire(self._estimate_tokens(kwargs)):
+            rsp = await get_async_client(self.api_key).completions.create(**kwargs)
+        usage = await self._acalc_usage(kwargs["prompt"], rsp.completion)
+        self._update_costs(usage)
+        return make_chat_response(rsp.completion, usage)
+
+    async def _acompletion_stream(self, messages: list[dict]) -> str:
+        return await self._collect_stream(self.acompletion_stream(messages))
+
+    async def acompletion_stream(self, messages: list[dict]) -> AsyncIterator[str]:
+        kwargs = self._cons_kwargs(messages)
+        collected = []
+        try:
+            async with self._limiter.acquire(self._estimate_tokens(kwargs)):
+                response = await get_async_client(self.api_key).completions.create(**kwargs, stream=True)
+                async for chunk in response:
+                    if chunk.completion:
+                        collected.append(chunk.completion)
+                        yield chunk.completion
+        finally:
+            # report the usage even if the consumer stopped the stream early
+            self._update_costs(await self._acalc_usage(kwargs["prompt"], "".join(collected)))
+
+    async def acompletion_text(self, messages: list[dict], stream=False) -> str:
+        """when streaming, feed each token to the stream sink (stdout by default)."""
+        if stream:
+            return await self._acompletion_stream(messages)
+        rsp = await self._acompletion(messages)
+        return self.get_choice_text(rsp)
+
+    def _calc_usage(self, prompt: str, rsp: str) -> Optional[dict]:
+        if not CONFIG.calc_usage:
+            return None
+        try:
+            client = get_client(self.api_key)
+            return {"prompt_tokens": client.count_tokens(prompt), "completion_tokens": client.count_tokens(rsp)}
+        except Exception as e:
+            logger.error(f"usage calculation failed! {e}")
+
+    async def _acalc_usage(self, prompt: str, rsp: str) -> Optional[dict]:
+        # the tokenizer of the client is slow on long prompts, it does not hold the event loop
+        return await asyncio.to_thread(self._calc_usage, prompt, rsp)
+
+    def _update_costs(self, usage: Optional[dict]):
+        if usage:
+            try:
+                prompt_tokens = int(usage["prompt_tokens"])
+                completion_tokens = int(usage["completion_tokens"])
+                self._cost_manager.update_cost(prompt_tokens, completion_tokens, self.model)
+            except Exception as e:
+                logger.error("updating costs failed!", e)
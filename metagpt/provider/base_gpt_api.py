@@ -5,16 +5,30 @@
 @Author  : alexanderwu
 @File    : base_gpt_api.py
 """
+import asyncio
+import hashlib
+import json
 from abc import abstractmethod
-from typing import Optional
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from tenacity import AsyncRetrying, stop_after_attempt, wait_random_exponential
 
 from metagpt.logs import logger
 from metagpt.provider.base_chatbot import BaseChatbot
+from metagpt.provider.stream_sink import StdoutSink, StreamSink
+from metagpt.utils.project_context import get_project
+from metagpt.utils.single_flight import SingleFlight
 
 
 class BaseGPTAPI(BaseChatbot):
     """GPT API abstract class, requiring all inheritors to provide a series of standard capabilities"""
     system_prompt = 'You are a helpful assistant.'
+    # shared by all instances, identical requests in flight at the same time are only sent once
+    single_flight = SingleFlight()
+    coalesce_requests = True
+    # where the deltas of `acompletion_text(stream=True)` go, see `metagpt.provider.stream_sink`
+    stream_sink: StreamSink = StdoutSink()
 
     def _user_msg(self, msg: str) -> dict[str, str]:
         return {"role": "user", "content": msg}
@@ -36,16 +50,154 @@ class BaseGPTAPI(BaseChatbot):
         rsp = self.completion(message)
         return self.get_choice_text(rsp)
 
-    async def aask(self, msg: str, system_msgs: Optional[list[str]] = None) -> str:
+    def _build_messages(self, msg: str, system_msgs: Optional[list[str]] = None) -> list[dict[str, str]]:
         if system_msgs:
-            message = self._system_msgs(system_msgs) + [self._user_msg(msg)]
-        else:
-            message = [self._default_system_msg(), self._user_msg(msg)]
-        rsp = await self.acompletion_text(message, stream=True)
+            return self._system_msgs(system_msgs) + [self._user_msg(msg)]
+        return [self._default_system_msg(), self._user_msg(msg)]
+
+    async def aask(self, msg: str, system_msgs: Optional[list[str]] = None) -> str:
+        message = self._build_messages(msg, system_msgs)
+        rsp = await self._coalesce("text", message, lambda: self.acompletion_text(message, stream=True))
         logger.debug(message)
         # logger.debug(rsp)
         return rsp
 
+    async def aask_stream(self, msg: str, system_msgs: Optional[list[str]] = None) -> AsyncIterator[str]:
+        """Yield the deltas of the reply as they arrive.
+        The identical `aask` and `aask_stream` requests made meanwhile share the reply, if it is read to its end.
+        """
+        message = self._build_messages(msg, system_msgs)
+        logger.debug(message)
+        key = self._flight_key("text", message)
+        if self.coalesce_requests and self.single_flight.is_inflight(key):
+            # an identical request is already in flight, its reply comes at once
+            yield await self._coalesce("text", message, lambda: self.acompletion_text(message))
+            return
+        with self.single_flight.lead(key) if self.coalesce_requests else nullcontext() as future:
+            collected = []
+            stream = self.acompletion_stream(message)
+            try:
+                async for delta in stream:
+                    collected.append(delta)
+                    yield delta
+            finally:
+                await stream.aclose()  # stop the request if the consumer stopped early
+            if future is not None:
+                future.set_result("".join(collected))
+
+    def discard_reply(self, msg: str, system_msgs: Optional[list[str]] = None):
+        """Forget the cached reply of the question, e.g. one that could not be parsed, so that asking it again
+        requests the LLM"""
+        self._discard_cached(self._build_messages(msg, system_msgs))
+
+    def _discard_cached(self, messages: list[dict]):
+        """Providers with a response cache remove the response of the messages from it"""
+
+    async def acompletion_stream(self, messages: list[dict]) -> AsyncIterator[str]:
+        """Yield the deltas of the reply as they arrive. Usage is reported once the stream ends.
+        Providers without streaming support yield the whole reply at once.
+        """
+        yield await self.acompletion_text(messages)
+
+    async def _collect_stream(self, stream: AsyncIterator[str]) -> str:
+        """Consume a stream of deltas, feeding them to the stream sink, and return the full reply"""
+        collected = []
+        async for delta in stream:
+            collected.append(delta)
+            self.stream_sink.on_delta(delta)
+        self.stream_sink.on_end()
+        return "".join(collected)
+
+    def _max_inflight(self) -> int:
+        """How many requests of a batch are kept in flight, providers with a rate limiter use its concurrency"""
+        return 8
+
+    async def acompletion_batch_iter(
+        self,
+        batch: list[list[dict]],
+        ordered: bool = False,
+        max_inflight: Optional[int] = None,
+        retries: int = 2,
+        return_exceptions: bool = False,
+    ) -> AsyncIterator[tuple[int, Any]]:
+        """Keep `max_inflight` requests in flight, starting the next one as soon as one completes,
+        and yield (index in batch, response) as they complete, or in the order of the batch if `ordered`.
+        Each request is retried `retries` times; once they are exhausted the error is raised,
+        or yielded as the response if `return_exceptions`.
+        """
+        max_inflight = max_inflight or self._max_inflight()
+        pending = iter(enumerate(batch))
+        running: dict[asyncio.Task, int] = {}
+        finished = {}  # completed out of order, only kept if `ordered`
+        next_idx = 0
+
+        def submit():
+            while len(running) < max_inflight:
+                item = next(pending, None)
+                if item is None:
+                    return
+                idx, messages = item
+                running[asyncio.create_task(self._acompletion_with_retry(messages, retries))] = idx
+
+        try:
+            submit()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    idx = running.pop(task)
+                    error = task.exception()
+                    if error is not None and not return_exceptions:
+                        raise error
+                    finished[idx] = task.result() if error is None else error
+                submit()
+                if not ordered:
+                    for idx in sorted(finished):
+                        yield idx, finished.pop(idx)
+                while next_idx in finished:
+                    yield next_idx, finished.pop(next_idx)
+                    next_idx += 1
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def _acompletion_with_retry(self, messages: list[dict], retries: int):
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(retries + 1), wait=wait_random_exponential(max=10), reraise=True
+        ):
+            with attempt:
+                return await self.acompletion(messages)
+
+    async def acompletion_batch(self, batch: list[list[dict]]) -> list[dict]:
+        """Return full JSON, in the order of the batch"""
+        results = [None] * len(batch)
+        async for idx, rsp in self.acompletion_batch_iter(batch):
+            results[idx] = rsp
+        return results
+
+    async def acompletion_batch_text(self, batch: list[list[dict]]) -> list[str]:
+        """Only return plain text"""
+        results = [self.get_choice_text(i) for i in await self.acompletion_batch(batch)]
+        logger.debug(results)
+        return results
+
+    def _request_key(self, messages: list[dict]) -> str:
+        """Identify a request by everything that decides its response, subclasses add their sampling parameters"""
+        raw = json.dumps(
+            {"provider": type(self).__name__, "model": getattr(self, "model", None), "messages": messages}
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _flight_key(self, kind: str, messages: list[dict]) -> tuple:
+        # the requests of different projects are not shared, each one pays for its own
+        return kind, id(get_project()), self._request_key(messages)
+
+    async def _coalesce(self, kind: str, messages: list[dict], fn: Callable[[], Awaitable]):
+        """If an identical request of the same project is already in flight, await its result instead of sending
+        a new one"""
+        if not self.coalesce_requests:
+            return await fn()
+        return await self.single_flight.do(self._flight_key(kind, messages), fn)
+
     def _extract_assistant_rsp(self, context):
         return "\n".join([i["content"] for i in context if i["role"] == "assistant"])
 
@@ -65,7 +217,7 @@ class BaseGPTAPI(BaseChatbot):
         for msg in msgs:
             umsg = self._user_msg(msg)
             context.append(umsg)
-            rsp_text = await self.acompletion_text(context)
+            rsp_text = await self._coalesce("text", context, lambda: self.acompletion_text(context))
             context.append(self._assistant_msg(rsp_text))
         return self._extract_assistant_rsp(context)
 
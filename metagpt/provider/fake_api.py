@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : a local stand-in for the LLM, to run the whole company offline and benchmark the framework itself
+
+import asyncio
+import json
+import random
+import re
+import time
+from collections import deque
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import openai
+import yaml
+
+from metagpt.config import CONFIG
+from metagpt.provider.base_gpt_api import BaseGPTAPI
+from metagpt.provider.openai_api import CostManager
+from metagpt.provider.response_cache import make_chat_response
+from metagpt.provider.stream_sink import get_stream_sink
+from metagpt.utils.custom_decoder import CustomDecoder
+from metagpt.utils.token_counter import approx_string_tokens
+
+CONTENT_PATTERN = re.compile(r"\[CONTENT\](\s*\{.*?\}\s*)\[/CONTENT\]", re.DOTALL)
+TRAILING_COMMA_PATTERN = re.compile(r",(\s*[}\]])")
+# the format example runs until the next "-----" line, the leading and trailing "---" are not part of the reply
+FORMAT_EXAMPLE_PATTERN = re.compile(r"## Format example\s*(?:-{3,}\s*\n)?(.*?)(?:\n-{3,}|\Z)", re.DOTALL)
+TOKEN_PATTERN = re.compile(r"\s*\S{1,4}|\s+")
+# replies to the prompts without a format example
+BUILTIN_RESPONSES = {
+    r"Just answer a number between 0-": "0",
+    r"## Status:\s*Determine if all of the code works fine": (
+        "## instruction:\nNo errors.\n## File To Rewrite:\nNone\n## Status:\nPASS\n## Send To:\nNoOne"
+    ),
+    r"Write (?:test )?code with triple quot": "```python\n...\n```",
+}
+DEFAULT_REPLY = "OK"
+
+
+class FakeGPTAPI(BaseGPTAPI):
+    """Answer every prompt locally, with the same interface as the real providers.
+
+    The reply is the first of:
+    1. a scripted reply, the first one in `responses` whose regex matches the prompt;
+    2. the `[CONTENT]...[/CONTENT]` json example of the prompt;
+    3. the "## Format example" of the prompt, which is valid for the OUTPUT_MAPPING of the action asking;
+    4. the first one in BUILTIN_RESPONSES matching the prompt, for the prompts without a format example;
+    5. DEFAULT_REPLY.
+
+    The latency of a real endpoint is simulated by `ttft` (seconds before the first token) and `tps`
+    (tokens per second, 0 means instantly), its failures by `error_rate` and `rpm` (requests per minute
+    above which openai.error.RateLimitError is raised, 0 means unlimited).
+    """
+
+    def __init__(
+        self,
+        responses: Optional[dict[str, str]] = None,
+        ttft: Optional[float] = None,
+        tps: Optional[float] = None,
+        error_rate: Optional[float] = None,
+        rpm: Optional[int] = None,
+        seed: Optional[int] = None,
+    ):
+        self.model = "fake"
+        self.responses = self._load_responses(CONFIG.fake_llm_responses) if responses is None else responses
+        self.ttft = CONFIG.fake_llm_ttft if ttft is None else ttft
+        self.tps = CONFIG.fake_llm_tps if tps is None else tps
+        self.error_rate = CONFIG.fake_llm_error_rate if error_rate is None else error_rate
+        self.rpm = CONFIG.fake_llm_rpm if rpm is None else rpm
+        self._random = random.Random(CONFIG.fake_llm_seed if seed is None else seed)
+        self._requests = deque()  # when the requests of the last minute were received
+        self._cost_manager = CostManager()
+        self.coalesce_requests = CONFIG.llm_coalesce_requests
+        self.stream_sink = get_stream_sink(CONFIG.stream_sink)
+
+    @staticmethod
+    def _load_responses(path) -> dict[str, str]:
+        """A yaml file of `regex: reply`, matched in order"""
+        if not path:
+            return {}
+        return yaml.safe_load(Path(path).read_text(encoding="utf-8")) or {}
+
+    def reply(self, messages: list[dict]) -> str:
+        prompt = messages[-1]["content"]
+        for pattern, rsp in self.responses.items():
+            if re.search(pattern, prompt):
+                return rsp
+        match = CONTENT_PATTERN.search(prompt)
+        if match:
+            return f"[CONTENT]\n{self._fix_json(match.group(1))}\n[/CONTENT]"
+        match = FORMAT_EXAMPLE_PATTERN.search(prompt)
+        if match and match.group(1).strip():
+            return match.group(1).strip()
+        for pattern, rsp in BUILTIN_RESPONSES.items():
+            if re.search(pattern, prompt):
+                return rsp
+        return DEFAULT_REPLY
+
+    @staticmethod
+    def _fix_json(example: str) -> str:
+        """Some json examples are not strictly valid, e.g. with trailing commas, the reply has to be"""
+        try:
+            data = CustomDecoder(strict=False).decode(TRAILING_COMMA_PATTERN.sub(r"\1", example))
+        except ValueError:
+            return example.strip()
+        return json.dumps(data, indent=4, ensure_ascii=False)
+
+    def _receive(self):
+        """Fail like a real endpoint would"""
+        now = time.monotonic()
+        while self._requests and now - self._requests[0] > 60:
+            self._requests.popleft()
+        if self.rpm and len(self._requests) >= self.rpm:
+            raise openai.error.RateLimitError(f"Rate limit reached for fake: {self.rpm} / min", http_status=429)
+        self._requests.append(now)
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise openai.error.APIError("The fake server had an error while processing your request", http_status=500)
+
+    def _generation_time(self, rsp: str) -> float:
+        return self.ttft + (len(TOKEN_PATTERN.findall(rsp)) / self.tps if self.tps else 0)
+
+    def completion(self, messages: list[dict]) -> dict:
+        self._receive()
+        rsp = self.reply(messages)
+        time.sleep(self._generation_time(rsp))
+        return make_chat_response(rsp, self._update_costs(messages, rsp))
+
+    async def acompletion(self, messages: list[dict]) -> dict:
+        return await self._coalesce("completion", messages, lambda: self._acompletion(messages))
+
+    async def _acompletion(self, messages: list[dict]) -> dict:
+        self._receive()
+        rsp = self.reply(messages)
+        await asyncio.sleep(self._generation_time(rsp))
+        return make_chat_response(rsp, self._update_costs(messages, rsp))
+
+    async def acompletion_stream(self, messages: list[dict]) -> AsyncIterator[str]:
+        self._receive()
+        rsp = self.reply(messages)
+        collected = []
+        try:
+            await asyncio.sleep(self.ttft)
+            start = time.monotonic()
+            for idx, token in enumerate(TOKEN_PATTERN.findall(rsp)):
+                delay = start + idx / self.tps - time.monotonic() if self.tps else 0
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                collected.append(token)
+                yield token
+        finally:
+            self._update_costs(messages, "".join(collected))
+
+    async def acompletion_text(self, messages: list[dict], stream=False) -> str:
+        if stream:
+            return await self._collect_stream(self.acompletion_stream(messages))
+        rsp = await self._acompletion(messages)
+        return self.get_choice_text(rsp)
+
+    def _update_costs(self, messages: list[dict], rsp: str) -> dict:
+        usage = {
+            "prompt_tokens": sum(approx_string_tokens(i["content"]) for i in messages),
+            "completion_tokens": approx_string_tokens(rsp),
+        }
+        if CONFIG.calc_usage:
+            self._cost_manager.update_cost(usage["prompt_tokens"], usage["completion_tokens"], self.model)
+        return usage
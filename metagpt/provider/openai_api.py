@@ -4,9 +4,9 @@
 @Author  : alexanderwu
 @File    : openai.py
 """
-import asyncio
-import time
-from typing import NamedTuple, Union
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, NamedTuple, Optional, Union
 
 import openai
 from openai.error import APIConnectionError
@@ -21,38 +21,25 @@ from tenacity import (
 from metagpt.config import CONFIG
 from metagpt.logs import logger
 from metagpt.provider.base_gpt_api import BaseGPTAPI
+from metagpt.provider.rate_limiter import get_rate_limiter, make_limiter_key
+from metagpt.provider.response_cache import (
+    ResponseCache,
+    get_response_cache,
+    make_chat_response,
+)
+from metagpt.provider.stream_sink import get_stream_sink
+from metagpt.utils.project_context import get_project
 from metagpt.utils.singleton import Singleton
 from metagpt.utils.token_counter import (
     TOKEN_COSTS,
+    approx_string_tokens,
     count_message_tokens,
     count_string_tokens,
     get_max_completion_tokens,
 )
 
-
-class RateLimiter:
-    """Rate control class, each call goes through wait_if_needed, sleep if rate control is needed"""
-
-    def __init__(self, rpm):
-        self.last_call_time = 0
-        # Here 1.1 is used because even if the calls are made strictly according to time,
-        # they will still be QOS'd; consider switching to simple error retry later
-        self.interval = 1.1 * 60 / rpm
-        self.rpm = rpm
-
-    def split_batches(self, batch):
-        return [batch[i : i + self.rpm] for i in range(0, len(batch), self.rpm)]
-
-    async def wait_if_needed(self, num_requests):
-        current_time = time.time()
-        elapsed_time = current_time - self.last_call_time
-
-        if elapsed_time < self.interval * num_requests:
-            remaining_time = self.interval * num_requests - elapsed_time
-            logger.info(f"sleep {remaining_time}")
-            await asyncio.sleep(remaining_time)
-
-        self.last_call_time = time.time()
+# also counts the usage of the calls made in the current context, anything with an `add_usage`, e.g. a round of a run
+usage_counter: ContextVar[Optional[object]] = ContextVar("usage_counter", default=None)
 
 
 class Costs(NamedTuple):
@@ -62,13 +49,18 @@ class Costs(NamedTuple):
     total_budget: float
 
 
+def _project_total(name: str) -> property:
+    return property(lambda self: getattr(get_project(), name), lambda self, value: setattr(get_project(), name, value))
+
+
 class CostManager(metaclass=Singleton):
-    """计算使用接口的开销"""
+    """计算使用接口的开销, the totals are the ones of the current project, see ProjectContext"""
+
+    total_prompt_tokens = _project_total("total_prompt_tokens")
+    total_completion_tokens = _project_total("total_completion_tokens")
+    total_cost = _project_total("total_cost")
 
     def __init__(self):
-        self.total_prompt_tokens = 0
-        self.total_completion_tokens = 0
-        self.total_cost = 0
         self.total_budget = 0
 
     def update_cost(self, prompt_tokens, completion_tokens, model):
@@ -86,6 +78,9 @@ class CostManager(metaclass=Singleton):
             prompt_tokens * TOKEN_COSTS[model]["prompt"] + completion_tokens * TOKEN_COSTS[model]["completion"]
         ) / 1000
         self.total_cost += cost
+        counter = usage_counter.get()
+        if counter is not None:
+            counter.add_usage(prompt_tokens, completion_tokens, cost)
         logger.info(
             f"Total running cost: ${self.total_cost:.3f} | Max budget: ${CONFIG.max_budget:.3f} | "
             f"Current cost: ${cost:.3f}, prompt_tokens: {prompt_tokens}, completion_tokens: {completion_tokens}"
@@ -137,18 +132,85 @@ See FAQ 5.8
     raise retry_state.outcome.exception()
 
 
-class OpenAIGPTAPI(BaseGPTAPI, RateLimiter):
+@dataclass
+class OpenAIEndpoint:
+    """An OpenAI api key or Azure deployment, with its own quota"""
+
+    api_key: str
+    api_base: Optional[str] = None
+    api_type: Optional[str] = None
+    api_version: Optional[str] = None
+    model: Optional[str] = None  # defaults to OPENAI_API_MODEL, of the project the request is made in
+    deployment_name: Optional[str] = None
+    deployment_id: Optional[str] = None
+    rpm: int = 10
+    tpm: int = 0
+    max_concurrency: int = 0
+    name: str = ""
+
+    @classmethod
+    def from_config(cls, config) -> "OpenAIEndpoint":
+        return cls(
+            api_key=config.openai_api_key,
+            api_base=config.openai_api_base,
+            api_type=config.openai_api_type,
+            api_version=config.openai_api_version,
+            deployment_name=config.deployment_name,
+            deployment_id=config.deployment_id,
+            rpm=int(config.get("RPM", 10)),
+            tpm=int(config.openai_api_tpm or 0),
+            name="default",
+        )
+
+    def key(self) -> str:
+        """Identify the quota of the endpoint, without keeping the secrets"""
+        return make_limiter_key(self.api_key, self.api_base, self.deployment_name, self.deployment_id)
+
+    def credentials(self) -> dict:
+        credentials = {
+            "api_key": self.api_key,
+            "api_base": self.api_base,
+            "api_type": self.api_type,
+            "api_version": self.api_version,
+        }
+        return {k: v for k, v in credentials.items() if v}
+
+
+class OpenAIGPTAPI(BaseGPTAPI):
     """
     Check https://platform.openai.com/examples for examples
     """
 
-    def __init__(self):
-        self.__init_openai(CONFIG)
+    def __init__(self, endpoint: Optional[OpenAIEndpoint] = None):
+        if endpoint is None:
+            # the default endpoint is also written to the openai module, for the code using it directly
+            self.__init_openai(CONFIG)
+            endpoint = OpenAIEndpoint.from_config(CONFIG)
+        self.endpoint = endpoint
         self.llm = openai
-        self.model = CONFIG.openai_api_model
+        self._model = endpoint.model
+        self.rpm = endpoint.rpm
+        self.tpm = endpoint.tpm
         self.auto_max_tokens = False
         self._cost_manager = CostManager()
-        RateLimiter.__init__(self, rpm=self.rpm)
+        self._cache = get_response_cache(CONFIG)
+        self.coalesce_requests = CONFIG.llm_coalesce_requests
+        self.stream_sink = get_stream_sink(CONFIG.stream_sink)
+        # all instances of the same api key / deployment share one limiter, so that RPM / TPM hold process-wide
+        self._limiter = get_rate_limiter(
+            endpoint.key(),
+            rpm=self.rpm,
+            tpm=self.tpm,
+            max_concurrency=endpoint.max_concurrency or CONFIG.llm_max_concurrency,
+        )
+
+    @property
+    def model(self) -> str:
+        return self._model or CONFIG.project_setting("openai_api_model")
+
+    @model.setter
+    def model(self, value: str):
+        self._model = value
 
     def __init_openai(self, config):
         openai.api_key = config.openai_api_key
@@ -157,29 +219,52 @@ class OpenAIGPTAPI(BaseGPTAPI, RateLimiter):
         if config.openai_api_type:
             openai.api_type = config.openai_api_type
             openai.api_version = config.openai_api_version
-        self.rpm = int(config.get("RPM", 10))
 
     async def _achat_completion_stream(self, messages: list[dict]) -> str:
-        response = await openai.ChatCompletion.acreate(**self._cons_kwargs(messages), stream=True)
-
-        # create variables to collect the stream of chunks
-        collected_chunks = []
+        kwargs = self._cons_kwargs(messages)
+        cached = self._get_cached_rsp(kwargs)
+        if cached:
+            return self.get_choice_text(cached)
+        return await self._collect_stream(self._achat_completion_stream_iter(kwargs))
+
+    async def acompletion_stream(self, messages: list[dict]) -> AsyncIterator[str]:
+        kwargs = self._cons_kwargs(messages)
+        cached = self._get_cached_rsp(kwargs)
+        if cached:
+            yield self.get_choice_text(cached)
+            return
+        stream = self._achat_completion_stream_iter(kwargs)
+        try:
+            async for delta in stream:
+                yield delta
+        finally:
+            await stream.aclose()
+
+    async def _achat_completion_stream_iter(self, kwargs: dict) -> AsyncIterator[str]:
+        messages = kwargs["messages"]
+        reserved_tokens = self._estimate_tokens(kwargs)
         collected_messages = []
-        # iterate through the stream of events
-        async for chunk in response:
-            collected_chunks.append(chunk)  # save the event response
-            choices = chunk["choices"]
-            if len(choices) > 0:
-                chunk_message = chunk["choices"][0].get("delta", {})  # extract the message
-                collected_messages.append(chunk_message)  # save the message
-                if "content" in chunk_message:
-                    print(chunk_message["content"], end="")
-        print()
-
-        full_reply_content = "".join([m.get("content", "") for m in collected_messages])
-        usage = self._calc_usage(messages, full_reply_content)
-        self._update_costs(usage)
-        return full_reply_content
+        completed = False
+        try:
+            async with self._limiter.acquire(reserved_tokens):
+                response = await openai.ChatCompletion.acreate(**kwargs, stream=True)
+                # iterate through the stream of events
+                async for chunk in response:
+                    choices = chunk["choices"]
+                    if len(choices) > 0:
+                        content = choices[0].get("delta", {}).get("content")  # extract the message
+                        if content:
+                            collected_messages.append(content)  # save the message
+                            yield content
+            completed = True
+        finally:
+            # report the usage even if the consumer stopped the stream early
+            full_reply_content = "".join(collected_messages)
+            usage = self._calc_usage(messages, full_reply_content)
+            self._limiter.reconcile(reserved_tokens, self._used_tokens(usage))
+            self._update_costs(usage)
+            if completed:
+                self._save_cached_rsp(kwargs, make_chat_response(full_reply_content, usage))
 
     def _cons_kwargs(self, messages: list[dict]) -> dict:
         kwargs = {
@@ -190,29 +275,77 @@ class OpenAIGPTAPI(BaseGPTAPI, RateLimiter):
             "temperature": 0.3,
             "timeout": 3,
         }
-        if CONFIG.openai_api_type == "azure":
-            if CONFIG.deployment_name and CONFIG.deployment_id:
+        endpoint = self.endpoint
+        if endpoint.api_type == "azure":
+            if endpoint.deployment_name and endpoint.deployment_id:
                 raise ValueError("You can only use one of the `deployment_id` or `deployment_name` model")
-            elif not CONFIG.deployment_name and not CONFIG.deployment_id:
+            elif not endpoint.deployment_name and not endpoint.deployment_id:
                 raise ValueError("You must specify `DEPLOYMENT_NAME` or `DEPLOYMENT_ID` parameter")
             kwargs_mode = (
-                {"engine": CONFIG.deployment_name}
-                if CONFIG.deployment_name
-                else {"deployment_id": CONFIG.deployment_id}
+                {"engine": endpoint.deployment_name}
+                if endpoint.deployment_name
+                else {"deployment_id": endpoint.deployment_id}
             )
         else:
             kwargs_mode = {"model": self.model}
         kwargs.update(kwargs_mode)
+        # the credentials go with each request instead of the openai module, so endpoints can be mixed
+        kwargs.update(endpoint.credentials())
         return kwargs
 
     async def _achat_completion(self, messages: list[dict]) -> dict:
-        rsp = await self.llm.ChatCompletion.acreate(**self._cons_kwargs(messages))
+        kwargs = self._cons_kwargs(messages)
+        cached = self._get_cached_rsp(kwargs)
+        if cached:
+            return cached
+        reserved_tokens = self._estimate_tokens(kwargs)
+        async with self._limiter.acquire(reserved_tokens):
+            rsp = await self.llm.ChatCompletion.acreate(**kwargs)
+        self._limiter.reconcile(reserved_tokens, self._used_tokens(rsp.get("usage")))
         self._update_costs(rsp.get("usage"))
+        self._save_cached_rsp(kwargs, rsp)
+        return rsp
+
+    def _estimate_tokens(self, kwargs: dict) -> int:
+        """Tokens a request may consume against the TPM quota: the prompt plus the max completion tokens"""
+        if not self.tpm:
+            return 0
+        prompt_tokens = sum(approx_string_tokens(i["content"]) for i in kwargs["messages"])
+        return prompt_tokens + kwargs["max_tokens"]
+
+    @staticmethod
+    def _used_tokens(usage: Optional[dict]) -> Optional[int]:
+        if not usage or "prompt_tokens" not in usage:
+            return None
+        return int(usage["prompt_tokens"]) + int(usage.get("completion_tokens", 0))
+
+    def _get_cached_rsp(self, kwargs: dict) -> Optional[dict]:
+        """Serve the request from the response cache, the usage of a hit is still reported to CostManager"""
+        if not self._cache:
+            return None
+        rsp = self._cache.lookup(ResponseCache.make_key(kwargs))
+        if rsp:
+            logger.debug("LLM response cache hit")
+            if rsp.get("usage"):
+                self._update_costs(rsp["usage"])
         return rsp
 
+    def _save_cached_rsp(self, kwargs: dict, rsp: dict):
+        if self._cache:
+            self._cache.save(ResponseCache.make_key(kwargs), rsp)
+
+    def _discard_cached(self, messages: list[dict]):
+        if self._cache:
+            self._cache.discard(ResponseCache.make_key(self._cons_kwargs(messages)))
+
     def _chat_completion(self, messages: list[dict]) -> dict:
-        rsp = self.llm.ChatCompletion.create(**self._cons_kwargs(messages))
-        self._update_costs(rsp)
+        kwargs = self._cons_kwargs(messages)
+        cached = self._get_cached_rsp(kwargs)
+        if cached:
+            return cached
+        rsp = self.llm.ChatCompletion.create(**kwargs)
+        self._update_costs(rsp.get("usage"))
+        self._save_cached_rsp(kwargs, rsp)
         return rsp
 
     def completion(self, messages: list[dict]) -> dict:
@@ -223,7 +356,10 @@ class OpenAIGPTAPI(BaseGPTAPI, RateLimiter):
     async def acompletion(self, messages: list[dict]) -> dict:
         # if isinstance(messages[0], Message):
         #     messages = self.messages_to_dict(messages)
-        return await self._achat_completion(messages)
+        return await self._coalesce("completion", messages, lambda: self._achat_completion(messages))
+
+    def _request_key(self, messages: list[dict]) -> str:
+        return ResponseCache.make_key(self._cons_kwargs(messages))
 
     @retry(
         stop=stop_after_attempt(3),
@@ -233,7 +369,7 @@ class OpenAIGPTAPI(BaseGPTAPI, RateLimiter):
         retry_error_callback=log_and_reraise,
     )
     async def acompletion_text(self, messages: list[dict], stream=False) -> str:
-        """when streaming, print each token in place."""
+        """when streaming, feed each token to the stream sink (stdout by default)."""
         if stream:
             return await self._achat_completion_stream(messages)
         rsp = await self._achat_completion(messages)
@@ -253,31 +389,8 @@ class OpenAIGPTAPI(BaseGPTAPI, RateLimiter):
         else:
             return usage
 
-    async def acompletion_batch(self, batch: list[list[dict]]) -> list[dict]:
-        """Return full JSON"""
-        split_batches = self.split_batches(batch)
-        all_results = []
-
-        for small_batch in split_batches:
-            logger.info(small_batch)
-            await self.wait_if_needed(len(small_batch))
-
-            future = [self.acompletion(prompt) for prompt in small_batch]
-            results = await asyncio.gather(*future)
-            logger.info(results)
-            all_results.extend(results)
-
-        return all_results
-
-    async def acompletion_batch_text(self, batch: list[list[dict]]) -> list[str]:
-        """Only return plain text"""
-        raw_results = await self.acompletion_batch(batch)
-        results = []
-        for idx, raw_result in enumerate(raw_results, start=1):
-            result = self.get_choice_text(raw_result)
-            results.append(result)
-            logger.info(f"Result of task {idx}: {result}")
-        return results
+    def _max_inflight(self) -> int:
+        return self._limiter.max_concurrency
 
     def _update_costs(self, usage: dict):
         if CONFIG.calc_usage:
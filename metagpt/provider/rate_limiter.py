@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : process-wide token-bucket rate limiter, shared by every LLM instance of the same api key / deployment
+
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from metagpt.logs import logger
+
+
+class TokenBucket:
+    """A bucket refilled continuously at `rate` per second, holding at most `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.level = self.capacity
+        self.last_time = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.last_time) * self.rate)
+        self.last_time = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds to wait before `amount` can be consumed"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class TokenBucketLimiter:
+    """Budget both requests per minute and tokens per minute.
+    Callers are admitted in FIFO order, and at most `max_concurrency` requests are in flight at the same time.
+    The buckets only hold `burst` seconds worth of quota, so the requests are spread out instead of bursting.
+    """
+
+    def __init__(self, rpm: int, tpm: int = 0, max_concurrency: int = 0, burst: float = 6.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency or rpm
+        self._request_bucket = TokenBucket(rpm / 60, rpm / 60 * burst)
+        self._token_bucket = TokenBucket(tpm / 60, tpm / 60 * burst) if tpm else None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.inflight = 0
+
+    def _ensure_primitives(self):
+        # asyncio primitives are bound to the event loop they are first used in
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def _admit(self, tokens: int):
+        self._ensure_primitives()
+        async with self._lock:  # asyncio.Lock wakes up waiters in FIFO order
+            await self._semaphore.acquire()
+            try:
+                while True:
+                    wait_time = self._request_bucket.wait_time(1)
+                    if self._token_bucket:
+                        wait_time = max(wait_time, self._token_bucket.wait_time(tokens))
+                    if wait_time <= 0:
+                        break
+                    logger.debug(f"rate limited, sleep {wait_time:.2f}s")
+                    await asyncio.sleep(wait_time)
+                self._request_bucket.consume(1)
+                if self._token_bucket:
+                    self._token_bucket.consume(tokens)
+            except BaseException:
+                # cancelled while waiting for the quota, the permit is not kept
+                self._semaphore.release()
+                raise
+            self.inflight += 1
+
+    @asynccontextmanager
+    async def acquire(self, tokens: int = 0):
+        """Wait for a slot to send a request consuming about `tokens` tokens (prompt + max completion)"""
+        await self._admit(tokens)
+        try:
+            yield self
+        finally:
+            self.inflight -= 1
+            self._semaphore.release()
+
+    def headroom(self) -> float:
+        """Share of the quota available right now, from 0 (exhausted) to 1 (full)"""
+        buckets = [i for i in (self._request_bucket, self._token_bucket) if i]
+        for bucket in buckets:
+            bucket._refill()
+        return max(0.0, min(i.level / i.capacity for i in buckets))
+
+    def reconcile(self, reserved: int, used: Optional[int]):
+        """Give back the tokens reserved but not used by the finished request"""
+        if self._token_bucket and used is not None and used < reserved:
+            self._token_bucket.refund(reserved - used)
+
+
+_limiters: dict[str, TokenBucketLimiter] = {}
+
+
+def get_rate_limiter(key: str, rpm: int, tpm: int = 0, max_concurrency: int = 0) -> TokenBucketLimiter:
+    """Return the limiter shared by all LLM instances using the same api key / deployment"""
+    if key not in _limiters:
+        _limiters[key] = TokenBucketLimiter(rpm, tpm, max_concurrency)
+    return _limiters[key]
+
+
+def make_limiter_key(*parts) -> str:
+    """Hash the endpoint identity (e.g. api key, api base, deployment), so that secrets are not kept as keys"""
+    raw = "|".join(str(i) for i in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
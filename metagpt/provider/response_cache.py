@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : content-addressed cache of LLM responses, supporting record / replay / read-through modes
+
+import hashlib
+import json
+import os
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from enum import Enum
+from pathlib import Path
+from typing import Optional
+
+from metagpt.logs import logger
+
+# the request fields which decide the response of a chat completion
+KEY_FIELDS = ("model", "engine", "deployment_id", "messages", "temperature", "max_tokens")
+
+
+class CacheMode(Enum):
+    OFF = "off"
+    RECORD = "record"  # always request the LLM, and save every response
+    REPLAY = "replay"  # only serve from the cache, raise `LLMCacheMiss` on miss
+    READ_THROUGH = "read_through"  # serve from the cache, request the LLM and save the response on miss
+
+    @classmethod
+    def _missing_(cls, value):
+        """Accept the spelling of `replay-only` / `read-through` in config.yaml"""
+        if isinstance(value, str):
+            value = value.strip().lower().replace("-", "_")
+            if value == "replay_only":
+                value = "replay"
+            for member in cls:
+                if member.value == value:
+                    return member
+        return None
+
+
+class LLMCacheMiss(Exception):
+    """Raised in replay mode when the request has never been recorded"""
+
+    def __init__(self, key: str, message="LLM response not found in cache"):
+        self.key = key
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self):
+        return f"{self.message} -> key: {self.key}"
+
+
+class BaseCacheBackend(ABC):
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached response, None if missing"""
+
+    @abstractmethod
+    def set(self, key: str, value: dict):
+        """Save the response"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove the response, if cached"""
+
+    @abstractmethod
+    def clear(self):
+        """Remove all cached responses"""
+
+
+class DiskCacheBackend(BaseCacheBackend):
+    """One json file per response, evicted by least recently used once the total size exceeds `max_size` bytes.
+    The LRU order is kept in the file mtime, so it survives restarts without an extra index file.
+    """
+
+    def __init__(self, cache_dir: Path, max_size: int = 512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.total_size = 0
+        self._entries: OrderedDict[str, int] = OrderedDict()  # key -> file size, oldest first
+        self._load_entries()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _load_entries(self):
+        files = sorted(self.cache_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for file in files:
+            size = file.stat().st_size
+            self._entries[file.stem] = size
+            self.total_size += size
+
+    def get(self, key: str) -> Optional[dict]:
+        if key not in self._entries:
+            return None
+        path = self._path(key)
+        try:
+            value = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"drop broken llm cache file {path}: {e}")
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        os.utime(path)
+        return value
+
+    def set(self, key: str, value: dict):
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp")
+        data = json.dumps(value, ensure_ascii=False)
+        tmp_path.write_text(data, encoding="utf-8")
+        os.replace(tmp_path, path)
+
+        self.total_size -= self._entries.pop(key, 0)
+        size = path.stat().st_size
+        self._entries[key] = size
+        self.total_size += size
+        self._evict()
+
+    def _evict(self):
+        while self.total_size > self.max_size and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._remove(key)
+
+    def _remove(self, key: str):
+        self.total_size -= self._entries.pop(key, 0)
+        self._path(key).unlink(missing_ok=True)
+
+    def delete(self, key: str):
+        self._remove(key)
+
+    def clear(self):
+        for key in list(self._entries):
+            self._remove(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResponseCache:
+    """Cache chat completion responses keyed by the hash of (model, messages, temperature, max_tokens).
+    The cached value keeps the OpenAI response format, including `usage` so that cost can be accounted on hit.
+    """
+
+    def __init__(self, backend: BaseCacheBackend, mode: CacheMode = CacheMode.READ_THROUGH):
+        self.backend = backend
+        self.mode = CacheMode(mode)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(kwargs: dict) -> str:
+        """Hash the fields of the completion kwargs which decide the response"""
+        fields = {k: kwargs.get(k) for k in KEY_FIELDS if kwargs.get(k) is not None}
+        raw = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """Return the cached response, or None if the LLM should be requested"""
+        if self.mode == CacheMode.RECORD:
+            return None
+        rsp = self.backend.get(key)
+        if rsp is None:
+            self.misses += 1
+            if self.mode == CacheMode.REPLAY:
+                raise LLMCacheMiss(key)
+            return None
+        self.hits += 1
+        return rsp
+
+    def save(self, key: str, rsp: dict):
+        if self.mode == CacheMode.REPLAY:
+            return
+        self.backend.set(key, rsp)
+
+    def discard(self, key: str):
+        """Forget a response found unusable, the recording replayed is left as it is"""
+        if self.mode == CacheMode.REPLAY:
+            return
+        self.backend.delete(key)
+
+
+_caches: dict[tuple, ResponseCache] = {}
+
+
+def get_response_cache(config) -> Optional[ResponseCache]:
+    """Return the process-wide response cache described by config, None when the cache is off"""
+    mode = CacheMode(config.llm_cache_mode or CacheMode.OFF)
+    if mode == CacheMode.OFF:
+        return None
+    cache_key = (str(config.llm_cache_path), mode)
+    if cache_key not in _caches:
+        backend = DiskCacheBackend(Path(config.llm_cache_path), int(config.llm_cache_max_size))
+        _caches[cache_key] = ResponseCache(backend, mode)
+        logger.info(f"LLM response cache enabled: mode={mode.value}, path={config.llm_cache_path}")
+    return _caches[cache_key]
+
+
+def make_chat_response(content: str, usage: Optional[dict] = None) -> dict:
+    """Build a minimal chat completion response, used to cache streamed replies"""
+    return {
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": dict(usage or {}),
+    }
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : spread the requests over a pool of OpenAI / Azure endpoints, each one with its own quota
+
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+import openai
+
+from metagpt.config import CONFIG
+from metagpt.logs import logger
+from metagpt.provider.base_gpt_api import BaseGPTAPI
+from metagpt.provider.openai_api import Costs, OpenAIEndpoint, OpenAIGPTAPI
+from metagpt.provider.stream_sink import get_stream_sink
+
+T = TypeVar("T")
+
+# errors of the endpoint rather than of the request, another endpoint may well succeed
+ENDPOINT_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.ServiceUnavailableError,
+    openai.error.APIError,
+    openai.error.TryAgain,
+    openai.error.AuthenticationError,
+    openai.error.PermissionError,
+)
+
+
+class EndpointHealth:
+    """What the router observed of one endpoint"""
+
+    def __init__(self, alpha: float = 0.3):
+        # moving average of the seconds per request (to the first token when streaming), None until the first one
+        self.latency: Optional[float] = None
+        self.alpha = alpha
+        self.failures = 0  # consecutive ones
+        self.available_at = 0.0
+
+    @property
+    def cooling_down(self) -> bool:
+        return time.monotonic() < self.available_at
+
+    def succeed(self, latency: float):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.alpha * (latency - self.latency)
+        self.failures = 0
+
+    def fail(self, cooldown: float):
+        """Take the endpoint out of rotation, the cooldown doubles with each consecutive failure up to 8 times"""
+        self.failures += 1
+        self.available_at = time.monotonic() + cooldown * 2 ** min(self.failures - 1, 3)
+
+
+_health: dict[str, EndpointHealth] = {}
+
+
+def get_endpoint_health(key: str) -> EndpointHealth:
+    """Like the rate limiters, the health of an endpoint is shared by all the routers using it"""
+    if key not in _health:
+        _health[key] = EndpointHealth()
+    return _health[key]
+
+
+class RouterGPTAPI(BaseGPTAPI):
+    """Send each request to the endpoint with the most quota left relative to its latency and load.
+    An endpoint failing or answering 429 is skipped until its cooldown ends, and the request goes to the next one.
+    Configure the pool with LLM_ENDPOINTS in config.yaml, each item is an `OpenAIEndpoint`.
+    """
+
+    def __init__(self, endpoints: Optional[list[OpenAIEndpoint]] = None, cooldown: Optional[float] = None):
+        if endpoints is None:
+            endpoints = [OpenAIEndpoint(**i) for i in CONFIG.llm_endpoints]
+        if not endpoints:
+            raise ValueError("Set LLM_ENDPOINTS first")
+        self.members = [OpenAIGPTAPI(endpoint) for endpoint in endpoints]
+        self.health = [get_endpoint_health(endpoint.key()) for endpoint in endpoints]
+        self.cooldown = CONFIG.llm_router_cooldown if cooldown is None else cooldown
+        self.coalesce_requests = CONFIG.llm_coalesce_requests
+        self.stream_sink = get_stream_sink(CONFIG.stream_sink)
+        for member in self.members:
+            member.stream_sink = self.stream_sink
+
+    @property
+    def model(self) -> str:
+        return self.members[0].model
+
+    def _score(self, idx: int) -> float:
+        limiter = self.members[idx]._limiter
+        latency = self.health[idx].latency
+        if latency is None:
+            # optimistic about the endpoints not tried yet, so that they get their share
+            latency = min((i.latency for i in self.health if i.latency is not None), default=1.0)
+        return limiter.headroom() / (max(latency, 1e-3) * (1 + limiter.inflight))
+
+    def _pick(self, tried: set[int]) -> int:
+        candidates = [i for i in range(len(self.members)) if i not in tried]
+        available = [i for i in candidates if not self.health[i].cooling_down]
+        if available:
+            return max(available, key=self._score)
+        # every endpoint left is cooling down, the one back the soonest is the best bet
+        return min(candidates, key=lambda i: self.health[i].available_at)
+
+    def _fail(self, idx: int, error: Exception):
+        logger.warning(f"endpoint {self._name(idx)} failed, cooldown: {error}")
+        self.health[idx].fail(self.cooldown)
+
+    def _name(self, idx: int) -> str:
+        return self.members[idx].endpoint.name or str(idx)
+
+    async def _route(self, fn: Callable[[OpenAIGPTAPI], Awaitable[T]]) -> T:
+        tried = set()
+        while True:
+            idx = self._pick(tried)
+            start = time.monotonic()
+            try:
+                result = await fn(self.members[idx])
+            except ENDPOINT_ERRORS as e:
+                self._fail(idx, e)
+                tried.add(idx)
+                if len(tried) == len(self.members):
+                    raise
+                continue
+            self.health[idx].succeed(time.monotonic() - start)
+            return result
+
+    def completion(self, messages: list[dict]) -> dict:
+        idx = self._pick(set())
+        return self.members[idx].completion(messages)
+
+    async def acompletion(self, messages: list[dict]) -> dict:
+        return await self._coalesce(
+            "completion", messages, lambda: self._route(lambda m: m._achat_completion(messages))
+        )
+
+    async def acompletion_text(self, messages: list[dict], stream=False) -> str:
+        if stream:
+            return await self._collect_stream(self.acompletion_stream(messages))
+        rsp = await self._route(lambda m: m._achat_completion(messages))
+        return self.get_choice_text(rsp)
+
+    async def acompletion_stream(self, messages: list[dict]) -> AsyncIterator[str]:
+        """Only fail over before the first delta, the deltas already yielded can not be taken back"""
+        tried = set()
+        while True:
+            idx = self._pick(tried)
+            start = time.monotonic()
+            stream = self.members[idx].acompletion_stream(messages)
+            try:
+                try:
+                    first = await stream.__anext__()
+                except StopAsyncIteration:
+                    self.health[idx].succeed(time.monotonic() - start)
+                    return
+                except ENDPOINT_ERRORS as e:
+                    self._fail(idx, e)
+                    tried.add(idx)
+                    if len(tried) == len(self.members):
+                        raise
+                    continue
+                self.health[idx].succeed(time.monotonic() - start)
+                yield first
+                async for delta in stream:
+                    yield delta
+                return
+            finally:
+                await stream.aclose()
+
+    def _max_inflight(self) -> int:
+        return sum(i._max_inflight() for i in self.members)
+
+    def _discard_cached(self, messages: list[dict]):
+        for member in self.members:
+            member._discard_cached(messages)
+
+    def _request_key(self, messages: list[dict]) -> str:
+        return self.members[0]._request_key(messages)
+
+    def get_costs(self) -> Costs:
+        return self.members[0].get_costs()
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "name": self._name(idx),
+                "latency": health.latency,
+                "failures": health.failures,
+                "cooling_down": health.cooling_down,
+                "headroom": member._limiter.headroom(),
+                "inflight": member._limiter.inflight,
+            }
+            for idx, (member, health) in enumerate(zip(self.members, self.health))
+        ]
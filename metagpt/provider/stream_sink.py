@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : where the deltas of a streamed LLM reply go while they arrive
+
+from abc import ABC, abstractmethod
+from typing import Callable, Optional, Union
+
+from metagpt.logs import logger
+
+
+class StreamSink(ABC):
+    @abstractmethod
+    def on_delta(self, delta: str):
+        """Called with each delta of the reply"""
+
+    def on_end(self):
+        """Called once the reply is complete"""
+
+
+class NullSink(StreamSink):
+    def on_delta(self, delta: str):
+        pass
+
+
+class StdoutSink(StreamSink):
+    def on_delta(self, delta: str):
+        print(delta, end="")
+
+    def on_end(self):
+        print()
+
+
+class LogSink(StreamSink):
+    """Log the reply line by line, instead of a log record per delta"""
+
+    def __init__(self, level: str = "INFO"):
+        self.level = level
+        self._buffer = ""
+
+    def on_delta(self, delta: str):
+        self._buffer += delta
+        if "\n" in delta:
+            *lines, self._buffer = self._buffer.split("\n")
+            for line in lines:
+                logger.log(self.level, line)
+
+    def on_end(self):
+        if self._buffer:
+            logger.log(self.level, self._buffer)
+        self._buffer = ""
+
+
+class CallbackSink(StreamSink):
+    def __init__(self, callback: Callable[[str], None], on_end: Optional[Callable[[], None]] = None):
+        self.callback = callback
+        self._on_end = on_end
+
+    def on_delta(self, delta: str):
+        self.callback(delta)
+
+    def on_end(self):
+        if self._on_end:
+            self._on_end()
+
+
+SINKS = {
+    "none": NullSink,
+    "stdout": StdoutSink,
+    "log": LogSink,
+}
+
+
+def get_stream_sink(sink: Union[str, StreamSink, Callable[[str], None], None]) -> StreamSink:
+    """Build a sink from its name in config.yaml (none/stdout/log), a callback, or return the given sink"""
+    if isinstance(sink, StreamSink):
+        return sink
+    if sink is None:
+        return NullSink()
+    if callable(sink):
+        return CallbackSink(sink)
+    if sink not in SINKS:
+        raise ValueError(f"Unsupported stream sink: {sink}, choose one of {list(SINKS)}")
+    return SINKS[sink]()
@@ -11,7 +11,7 @@ from collections import OrderedDict
 from pathlib import Path
 
 from metagpt.actions import WriteCode, WriteCodeReview, WriteDesign, WriteTasks
-from metagpt.const import WORKSPACE_ROOT
+from metagpt.config import CONFIG
 from metagpt.logs import logger
 from metagpt.roles import Role
 from metagpt.schema import Message
@@ -98,10 +98,10 @@ class Engineer(Role):
     def get_workspace(self) -> Path:
         msg = self._rc.memory.get_by_action(WriteDesign)[-1]
         if not msg:
-            return WORKSPACE_ROOT / "src"
+            return CONFIG.workspace_root / "src"
         workspace = self.parse_workspace(msg)
         # Codes are written in workspace/{package_name}/{package_name}
-        return WORKSPACE_ROOT / workspace / workspace
+        return CONFIG.workspace_root / workspace / workspace
 
     def recreate_workspace(self):
         workspace = self.get_workspace()
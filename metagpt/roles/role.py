@@ -16,7 +16,7 @@ from metagpt.config import CONFIG
 from metagpt.actions import Action, ActionOutput
 from metagpt.llm import LLM
 from metagpt.logs import logger
-from metagpt.memory import Memory, LongTermMemory
+from metagpt.memory import Memory, LongTermMemory, MemoryPolicy, MemoryView
 from metagpt.schema import Message
 
 PREFIX_TEMPLATE = """You are a {profile}, named {name}, your goal is {goal}, and the constraint is {constraints}. """
@@ -71,6 +71,9 @@ class RoleContext(BaseModel):
     todo: Action = Field(default=None)
     watch: set[Type[Action]] = Field(default_factory=set)
     news: list[Type[Message]] = Field(default=[])
+    cursor: int = Field(default=0)  # the offset of the next message to read in the log of env
+    policy: MemoryPolicy = Field(default_factory=MemoryPolicy.from_config)  # None keeps the memory unbounded
+    summary: Message = Field(default=None)  # of the messages evicted by the policy
 
     class Config:
         arbitrary_types_allowed = True
@@ -87,7 +90,19 @@ class RoleContext(BaseModel):
 
     @property
     def history(self) -> list[Message]:
-        return self.memory.get()
+        history = self.memory.get()
+        return [self.summary] + history if self.summary else history
+
+    async def enforce_policy(self, llm) -> list[Message]:
+        """Evict the messages beyond the policy from memory and fold them into the summary"""
+        if not self.policy:
+            return []
+        evicted = self.policy.select(self.memory)
+        self.memory.delete_batch(evicted)
+        if evicted:
+            self.summary = await self.policy.afold(self.summary, evicted, llm)
+            logger.debug(f"{len(evicted)} messages folded into the summary, {len(self.memory)} left")
+        return evicted
 
 
 class Role:
@@ -131,6 +146,12 @@ class Role:
     def set_env(self, env: 'Environment'):
         """Set the environment in which the role works. The role can talk to the environment and can also receive messages by observing."""
         self._rc.env = env
+        self._rc.cursor = 0  # the messages of the new environment are all news
+        if not isinstance(self._rc.memory, LongTermMemory):
+            # share the messages of the environment rather than copying them, the long-term memory keeps its own
+            view = MemoryView(env.log)
+            view.add_batch(self._rc.memory.get())
+            self._rc.memory = view
 
     @property
     def profile(self):
@@ -181,10 +202,13 @@ class Role:
         """Observe from the environment, obtain important information, and add it to memory"""
         if not self._rc.env:
             return 0
-        env_msgs = self._rc.env.memory.get()
+        # only read the messages published since the last observation
+        log = self._rc.env.log
+        start, self._rc.cursor = self._rc.cursor, log.end
+        env_msgs = log.read(start, self._rc.cursor)
+
+        observed = log.read_by_actions(self._rc.watch, start, self._rc.cursor)
 
-        observed = self._rc.env.memory.get_by_actions(self._rc.watch)
-        
         self._rc.news = self._rc.memory.find_news(observed)  # find news (previously unseen messages) from observed messages
 
         for i in env_msgs:
@@ -212,9 +236,7 @@ class Role:
         """add message to history."""
         # self._history += f"\n{message}"
         # self._context = self._history
-        if message in self._rc.memory.get():
-            return
-        self._rc.memory.add(message)
+        self._rc.memory.add(message)  # duplicates are ignored
 
     async def handle(self, message: Message) -> Message:
         """Receive information and reply with actions"""
@@ -237,6 +259,7 @@ class Role:
             logger.debug(f"{self._setting}: no news. waiting.")
             return
 
+        await self._rc.enforce_policy(self._llm)
         rsp = await self._react()
         # Publish the reply to the environment, waiting for the next subscriber to process
         self._publish_message(rsp)
@@ -7,6 +7,8 @@
 """
 from __future__ import annotations
 
+import hashlib
+import time
 from dataclasses import dataclass, field
 from typing import Type, TypedDict
 
@@ -30,6 +32,30 @@ class Message:
     sent_from: str = field(default="")
     send_to: str = field(default="")
     restricted_to: str = field(default="")
+    # hash of the fields above except instruct_content (parsed from content), assigned at creation
+    id: str = field(default="", compare=False, repr=False)
+    created_at: float = field(default_factory=time.time, compare=False, repr=False)  # for the ttl of the memory
+
+    def __post_init__(self):
+        if not self.id:
+            self.id = self.make_id()
+
+    def __setstate__(self, state):
+        # messages pickled before `id` / `created_at` existed
+        self.__dict__.update(state)
+        if "created_at" not in state:
+            self.created_at = time.time()
+        if not self.id:
+            self.id = self.make_id()
+
+    def make_id(self) -> str:
+        cause_by = self.cause_by
+        if isinstance(cause_by, type):
+            cause_by = f"{cause_by.__module__}.{cause_by.__qualname__}"
+        raw = "\0".join(
+            str(i) for i in (self.role, self.content, cause_by, self.sent_from, self.send_to, self.restricted_to)
+        )
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
 
     def __str__(self):
         # prefix = '-'.join([self.role, str(self.cause_by)])
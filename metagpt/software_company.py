@@ -5,6 +5,12 @@
 @Author  : alexanderwu
 @File    : software_company.py
 """
+import asyncio
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Iterable, Optional
+
 from pydantic import BaseModel, Field
 
 from metagpt.actions import BossRequirement
@@ -13,7 +19,9 @@ from metagpt.environment import Environment
 from metagpt.logs import logger
 from metagpt.roles import Role
 from metagpt.schema import Message
+from metagpt.utils.checkpoint import Checkpointer
 from metagpt.utils.common import NoMoneyException
+from metagpt.utils.project_context import ProjectContext
 
 
 class SoftwareCompany(BaseModel):
@@ -24,6 +32,9 @@ class SoftwareCompany(BaseModel):
     environment: Environment = Field(default_factory=Environment)
     investment: float = Field(default=10.0)
     idea: str = Field(default="")
+    checkpointer: Checkpointer = Field(default=None)  # None for no checkpoint
+    # its own budget, costs, workspace and configuration, the ones of the current context when None
+    project: ProjectContext = Field(default=None)
 
     class Config:
         arbitrary_types_allowed = True
@@ -32,10 +43,14 @@ class SoftwareCompany(BaseModel):
         """Hire roles to cooperate"""
         self.environment.add_roles(roles)
 
+    def _scope(self):
+        return self.project.activate() if self.project else nullcontext()
+
     def invest(self, investment: float):
         """Invest company. raise NoMoneyException when exceed max_budget."""
         self.investment = investment
-        CONFIG.max_budget = investment
+        with self._scope():
+            CONFIG.max_budget = investment
         logger.info(f'Investment: ${investment}.')
 
     def _check_balance(self):
@@ -47,16 +62,89 @@ class SoftwareCompany(BaseModel):
         self.idea = idea
         self.environment.publish_message(Message(role="BOSS", content=idea, cause_by=BossRequirement))
 
-    def _save(self):
-        logger.info(self.json())
+    def enable_checkpoint(self, path: Path, meta: Optional[dict] = None):
+        """Checkpoint the runs in the directory, `meta` tells how to hire the team again to resume"""
+        with self._scope():
+            self.checkpointer = Checkpointer(path, meta)
+        logger.info(f"checkpoint in {path}")
+
+    def restore(self, path: Path) -> list[str]:
+        """Resume from a checkpoint, with the same team hired, and go on checkpointing in it.
+        Return the files of the workspace missing or changed since the checkpoint"""
+        with self._scope():
+            state = Checkpointer.load(path)
+            self.checkpointer = Checkpointer(path, state["meta"])
+            changed = self.checkpointer.restore(self, state)
+            logger.info(f"resumed from {path}: {len(self.environment.log)} messages, ${CONFIG.total_cost:.3f} spent")
+        return changed
+
+    def _save(self, roles: Optional[Iterable[Role]] = None):
+        """Checkpoint the roles given (all by default) as they are now, the others as they were last time"""
+        if self.checkpointer is not None:
+            self.checkpointer.save(self, roles)
+
+    def _save_role(self, role: Role):
+        self._save([role])
+
+    def _finish(self, first: int):
+        # the stats of the rounds, the roles saved after their runs only, a role stopped in the middle runs again
+        # when resumed
+        self._save([])
+        if self.checkpointer is not None:
+            self.checkpointer.wait()
+        for stats in self.environment.stats[first:]:
+            logger.info(stats)
 
     async def run(self, n_round=3):
         """Run company until target round or no money"""
-        while n_round > 0:
-            # self._save()
-            n_round -= 1
-            logger.debug(f"{n_round=}")
-            self._check_balance()
-            await self.environment.run()
-        return self.environment.history
-    
\ No newline at end of file
+        with self._scope():
+            return await self._run(n_round)
+
+    async def _run(self, n_round: int):
+        first = len(self.environment.stats)
+        self._save()
+        try:
+            if CONFIG.env_scheduler == "event":
+                # the roles run as soon as they have news, n_round bounds the hops of the pipeline
+                await self.environment.run_events(n_round, before_run=self._check_balance, after_run=self._save_role)
+                return self.environment.history
+            while n_round > 0:
+                n_round -= 1
+                logger.debug(f"{n_round=}")
+                self._check_balance()
+                await self.environment.run()
+                self._save()
+            return self.environment.history
+        finally:
+            self._finish(first)
+
+    async def run_until_idle(self, deadline: float = 0):
+        """Run company until no role has news left, `deadline` seconds passed (0 for none) or no money"""
+        with self._scope():
+            first = len(self.environment.stats)
+            self._save()
+            try:
+                await self._run_until_idle(deadline)
+            finally:
+                self._finish(first)
+            return self.environment.history
+
+    async def _run_until_idle(self, deadline: float):
+        if CONFIG.env_scheduler == "event":
+            await self.environment.run_events(
+                before_run=self._check_balance, deadline=deadline, after_run=self._save_role
+            )
+        else:
+            started = time.monotonic()
+            while True:
+                self._check_balance()
+                timeout = deadline - (time.monotonic() - started) if deadline else None
+                try:
+                    await asyncio.wait_for(self.environment.run(), timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"stopped past the deadline of {deadline}s")
+                    break
+                self._save()
+                # nothing published in a round that no role reacted in, the next ones would be the same
+                if not self.environment.stats[-1].active_roles:
+                    break
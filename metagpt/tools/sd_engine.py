@@ -14,7 +14,6 @@ from aiohttp import ClientSession
 from PIL import Image, PngImagePlugin
 
 from metagpt.config import Config
-from metagpt.const import WORKSPACE_ROOT
 from metagpt.logs import logger
 
 config = Config()
@@ -81,7 +80,7 @@ class SDEngine:
         return self.payload
 
     def _save(self, imgs, save_name=""):
-        save_dir = WORKSPACE_ROOT / "resources" / "SD_Output"
+        save_dir = config.workspace_root / "resources" / "SD_Output"
         if not os.path.exists(save_dir):
             os.makedirs(save_dir, exist_ok=True)
         batch_decode_base64_to_image(imgs, save_dir, save_name=save_name)
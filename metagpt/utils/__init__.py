@@ -10,8 +10,10 @@ from metagpt.utils.read_document import read_docx
 from metagpt.utils.singleton import Singleton
 from metagpt.utils.token_counter import (
     TOKEN_COSTS,
+    TOKEN_COUNTER,
     count_message_tokens,
     count_string_tokens,
+    count_string_tokens_many,
 )
 
 
@@ -19,6 +21,8 @@ __all__ = [
     "read_docx",
     "Singleton",
     "TOKEN_COSTS",
+    "TOKEN_COUNTER",
     "count_message_tokens",
     "count_string_tokens",
+    "count_string_tokens_many",
 ]
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : checkpoint a company while it runs and resume it, without paying again for the LLM calls already made
+
+import atexit
+import base64
+import hashlib
+import json
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from metagpt.config import CONFIG
+from metagpt.logs import logger
+from metagpt.memory import LongTermMemory, MemoryView, MessageLog
+from metagpt.provider.openai_api import CostManager
+from metagpt.roles import Role
+from metagpt.schema import Message
+from metagpt.utils.serialize import deserialize_message, serialize_message
+
+if TYPE_CHECKING:
+    from metagpt.software_company import SoftwareCompany
+
+CHECKPOINT_VERSION = 1
+
+
+def _dump_message(message: Message, log: Optional[MessageLog] = None) -> dict:
+    """A message of the log by its offset, the others in full"""
+    if log is not None and message.id in log.offsets:
+        return {"offset": log.offsets[message.id]}
+    message_ser = serialize_message(message)
+    if message_ser[:1] == b"{":
+        return {"message": json.loads(message_ser)}
+    return {"pickle": base64.b64encode(message_ser).decode("ascii")}
+
+
+def _load_message(record: dict, log: Optional[MessageLog] = None) -> Message:
+    if "offset" in record:
+        return log.messages[record["offset"]]
+    if "message" in record:
+        return deserialize_message(json.dumps(record["message"]).encode("utf-8"))
+    return deserialize_message(base64.b64decode(record["pickle"]))
+
+
+def _dump_memory(memory, log: MessageLog) -> dict:
+    if isinstance(memory, MemoryView):
+        return {
+            "start": memory.start,
+            "end": memory.end,
+            "private": [_dump_message(i) for i in memory.private.messages],
+            "private_at": list(memory.private_at),
+            "deleted": sorted(memory.deleted),
+            "count": len(memory),
+        }
+    return {"messages": [_dump_message(i, log) for i in memory.get()]}
+
+
+def _load_memory(role: Role, data: dict, log: MessageLog):
+    rc = role._rc
+    if "messages" not in data:
+        view = MemoryView(log)
+        view.start, view.end = data["start"], data["end"]
+        for record in data["private"]:
+            view.private.append(_load_message(record))
+        view.private_at = data["private_at"]
+        view.deleted = set(data["deleted"])
+        view._count = data["count"]
+        rc.memory = view
+        return
+    messages = [_load_message(i, log) for i in data["messages"]]
+    if isinstance(rc.memory, LongTermMemory):
+        # the storage already has the messages it watches
+        rc.memory.msg_from_recover = True
+        rc.memory.add_batch(messages)
+        rc.memory.msg_from_recover = False
+    else:
+        rc.memory.clear()
+        rc.memory.add_batch(messages)
+
+
+def dump_role(role: Role, log: MessageLog) -> dict:
+    """The RoleContext of the role, the messages of the log by offset"""
+    rc = role._rc
+    return {
+        "state": rc.state,
+        "todo": type(rc.todo).__name__ if rc.todo else None,
+        "cursor": rc.cursor,
+        "news": [_dump_message(i, log) for i in rc.news],
+        "summary": _dump_message(rc.summary) if rc.summary else None,
+        "memory": _dump_memory(rc.memory, log),
+    }
+
+
+def load_role(role: Role, data: dict, log: MessageLog):
+    rc = role._rc
+    rc.state = data["state"]
+    rc.todo = next((i for i in role._actions if type(i).__name__ == data["todo"]), None)
+    rc.cursor = data["cursor"]
+    rc.news = [_load_message(i, log) for i in data["news"]]
+    rc.summary = _load_message(data["summary"]) if data["summary"] else None
+    _load_memory(role, data["memory"], log)
+
+
+class Checkpointer:
+    """Checkpoint a company in a directory, as it runs.
+
+    `messages.jsonl` is the log of the environment, the messages published since the last checkpoint are appended
+    to it. `state.json` is replaced as a whole, it is small: the RoleContext of each role, the costs, the stats of
+    the rounds, the manifest of the workspace and how many lines of `messages.jsonl` it covers, so that a line
+    torn by a crash is ignored. A role is saved when its own run is over, the roles still running are kept as
+    they were at their last checkpoint, so that they run again from the news they were handling when resumed.
+    The files are written by a thread, in order, the run does not wait for the disk.
+    """
+
+    def __init__(self, path: Path, meta: Optional[dict] = None, workspace: Optional[Path] = None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.meta = meta or {}  # how to hire the team again, e.g. the options of startup
+        self.workspace = Path(workspace or CONFIG.workspace_root)
+        self._messages = 0  # the messages of the log written
+        self._roles: dict[str, dict] = {}
+        self._manifest: dict[str, list] = {}  # relative path -> [size, mtime_ns, sha1]
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._pending: list[Future] = []
+        atexit.register(self.close)
+
+    @property
+    def _messages_path(self) -> Path:
+        return self.path / "messages.jsonl"
+
+    @property
+    def _state_path(self) -> Path:
+        return self.path / "state.json"
+
+    def save(self, company: "SoftwareCompany", roles: Optional[Iterable[Role]] = None):
+        """Checkpoint the company, the roles given (all by default) as they are now"""
+        env = company.environment
+        for role in env.roles.values() if roles is None else roles:
+            self._roles[role.profile] = dump_role(role, env.log)
+        records = [_dump_message(i) for i in env.log.read(self._messages, env.log.end)]
+        self._messages = env.log.end
+        costs = CostManager()
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "idea": company.idea,
+            "investment": company.investment,
+            "meta": self.meta,
+            "messages": self._messages,
+            "roles": dict(self._roles),
+            "costs": {
+                "total_prompt_tokens": costs.total_prompt_tokens,
+                "total_completion_tokens": costs.total_completion_tokens,
+                "total_cost": costs.total_cost,
+            },
+            "stats": [i.dict() for i in env.stats],
+        }
+        pending = [i for i in self._pending if not i.done()]
+        for future in self._pending:
+            if future.done() and future.exception():
+                logger.error(f"failed to write the checkpoint {self.path}: {future.exception()}")
+        pending.append(self._executor.submit(self._write, records, state))
+        self._pending = pending
+
+    def _write(self, records: list[dict], state: dict):
+        if records:
+            with open(self._messages_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(i, ensure_ascii=False) + "\n" for i in records)
+        state["workspace"] = self._scan_workspace()
+        tmp = self._state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self._state_path)
+
+    def _scan_workspace(self) -> dict[str, list]:
+        """The files of the workspace, only the ones changed since the last checkpoint are hashed again"""
+        manifest = {}
+        if self.workspace.exists():
+            for path in self.workspace.rglob("*"):
+                if not path.is_file():
+                    continue
+                name = path.relative_to(self.workspace).as_posix()
+                stat = path.stat()
+                known = self._manifest.get(name)
+                if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+                    manifest[name] = known
+                else:
+                    manifest[name] = [stat.st_size, stat.st_mtime_ns, hashlib.sha1(path.read_bytes()).hexdigest()]
+        self._manifest = manifest
+        return manifest
+
+    def wait(self):
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self.wait()
+
+    @staticmethod
+    def load_meta(path: Path) -> dict:
+        return json.loads((Path(path) / "state.json").read_text(encoding="utf-8"))["meta"]
+
+    @staticmethod
+    def load(path: Path) -> dict:
+        """The state of the checkpoint, with the messages of the log it covers"""
+        path = Path(path)
+        state = json.loads((path / "state.json").read_text(encoding="utf-8"))
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"unknown checkpoint version: {state.get('version')}")
+        lines = (path / "messages.jsonl").read_text(encoding="utf-8").splitlines() if state["messages"] else []
+        state["messages"] = [_load_message(json.loads(i)) for i in lines[: state["messages"]]]
+        return state
+
+    def restore(self, company: "SoftwareCompany", state: dict) -> list[str]:
+        """Restore the checkpoint into a company with the same team hired, and go on checkpointing from it.
+        Return the files of the workspace missing or changed since"""
+        from metagpt.environment import RoundStats
+
+        env = company.environment
+        for message in state["messages"]:
+            env.publish_message(message)
+        for profile, data in state["roles"].items():
+            role = env.roles.get(profile)
+            if role is None:
+                logger.warning(f"{profile} of the checkpoint is not in the team, skipped")
+                continue
+            load_role(role, data, env.log)
+        env.stats = [RoundStats(**i) for i in state["stats"]]
+        company.idea = state["idea"]
+        company.invest(state["investment"])
+        costs = CostManager()
+        for name, value in state["costs"].items():
+            setattr(costs, name, value)
+        CONFIG.total_cost = costs.total_cost
+        self._roles = dict(state["roles"])
+        return self._check_workspace(state["workspace"], env.log.end)
+
+    def _check_workspace(self, manifest: dict[str, list], n_messages: int) -> list[str]:
+        self._manifest = self._scan_workspace()
+        changed = sorted(i for i, entry in manifest.items() if self._manifest.get(i, [None] * 3)[2] != entry[2])
+        if changed:
+            logger.warning(f"files of the workspace missing or changed since the checkpoint: {changed}")
+        # the lines past the checkpoint were torn or never covered, they are written again
+        lines = []
+        if self._messages_path.exists():
+            lines = self._messages_path.read_text(encoding="utf-8").splitlines(True)
+        self._messages_path.write_text("".join(lines[:n_messages]), encoding="utf-8")
+        self._messages = n_messages
+        return changed
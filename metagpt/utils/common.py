@@ -42,15 +42,20 @@ class OutputParser:
         for block in blocks:
             # 如果block不为空，则继续处理
             if block.strip() != "":
-                # 将block的标题和内容分开，并分别去掉前后的空白字符
-                block_title, block_content = block.split("\n", 1)
-                # LLM可能出错，在这里做一下修正
-                if block_title[-1] == ":":
-                    block_title = block_title[:-1]
-                block_dict[block_title.strip()] = block_content.strip()
+                block_title, block_content = cls.parse_block(block)
+                block_dict[block_title] = block_content
 
         return block_dict
 
+    @classmethod
+    def parse_block(cls, block: str) -> Tuple[str, str]:
+        # 将block的标题和内容分开，并分别去掉前后的空白字符
+        block_title, block_content = block.split("\n", 1)
+        # LLM可能出错，在这里做一下修正
+        if block_title[-1] == ":":
+            block_title = block_title[:-1]
+        return block_title.strip(), block_content.strip()
+
     @classmethod
     def parse_code(cls, text: str, lang: str = "") -> str:
         pattern = rf"```{lang}.*?\s+(.*?)```"
@@ -124,31 +129,35 @@ class OutputParser:
         block_dict = cls.parse_blocks(data)
         parsed_data = {}
         for block, content in block_dict.items():
-            # 尝试去除code标记
+            parsed_data[block] = cls.parse_block_with_mapping(block, content, mapping)
+        return parsed_data
+
+    @classmethod
+    def parse_block_with_mapping(cls, block, content, mapping):
+        # 尝试去除code标记
+        try:
+            content = cls.parse_code(text=content)
+        except Exception:
+            pass
+        typing_define = mapping.get(block, None)
+        if isinstance(typing_define, tuple):
+            typing = typing_define[0]
+        else:
+            typing = typing_define
+        if typing == List[str] or typing == List[Tuple[str, str]] or typing == List[List[str]]:
+            # 尝试解析list
             try:
-                content = cls.parse_code(text=content)
+                content = cls.parse_file_list(text=content)
             except Exception:
                 pass
-            typing_define = mapping.get(block, None)
-            if isinstance(typing_define, tuple):
-                typing = typing_define[0]
-            else:
-                typing = typing_define
-            if typing == List[str] or typing == List[Tuple[str, str]] or typing == List[List[str]]:
-                # 尝试解析list
-                try:
-                    content = cls.parse_file_list(text=content)
-                except Exception:
-                    pass
-            # TODO: 多余的引号去除有风险，后期再解决
-            # elif typing == str:
-            #     # 尝试去除多余的引号
-            #     try:
-            #         content = cls.parse_str(text=content)
-            #     except Exception:
-            #         pass
-            parsed_data[block] = content
-        return parsed_data
+        # TODO: 多余的引号去除有风险，后期再解决
+        # elif typing == str:
+        #     # 尝试去除多余的引号
+        #     try:
+        #         content = cls.parse_str(text=content)
+        #     except Exception:
+        #         pass
+        return content
 
     @classmethod
     def extract_struct(cls, text: str, data_type: Union[type(list), type(dict)]) -> Union[list, dict]:
@@ -8,7 +8,8 @@
 from metagpt.config import CONFIG
 
 
-def get_template(templates, format=CONFIG.prompt_format):
+def get_template(templates, format=None):
+    format = format or CONFIG.project_setting("prompt_format")
     selected_templates = templates.get(format)
     if selected_templates is None:
         raise ValueError(f"Can't find {format} in passed in templates")
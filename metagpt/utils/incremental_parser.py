@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : parse the OUTPUT_MAPPING fields of a streamed reply, each one as soon as it is complete
+
+import re
+from json import JSONDecodeError
+from typing import Any, Tuple
+
+from pydantic import ValidationError, parse_obj_as
+
+from metagpt.utils.common import OutputParser
+from metagpt.utils.custom_decoder import CustomDecoder
+
+CONTENT_TAG = "[CONTENT]"
+CONTENT_PATTERN = re.compile(r"\[CONTENT\](\s*\{.*?\}\s*)\[/CONTENT\]", re.DOTALL)
+
+
+class StreamParseError(ValueError):
+    """The streamed reply can not become a valid output anymore"""
+
+
+def parse_output(content: str, mapping: dict, format: str = "markdown") -> Tuple[str, dict]:
+    """Parse a whole reply, return the content the fields come from and the fields"""
+    if format == "json":
+        for match in CONTENT_PATTERN.findall(content):
+            if match:
+                content = match
+                break
+        return content, CustomDecoder(strict=False).decode(content)
+    # using markdown parser
+    return content, OutputParser.parse_data_with_mapping(content, mapping)
+
+
+class IncrementalOutputParser:
+    """Feed the deltas of a reply as they arrive and get back the fields completed by each of them.
+
+    A field that can not be decoded or does not match its type in the mapping raises StreamParseError
+    right away, so that the request can be cancelled and retried before the generation ends.
+    `close` parses the whole reply, the same as `parse_output`.
+    """
+
+    def __init__(self, mapping: dict, format: str = "markdown"):
+        self.mapping = mapping
+        self.format = format
+        self.text = ""
+        self.fields: dict[str, Any] = {}
+        self._pos = 0  # where the scan resumes with the next delta
+        self._done = False
+        # markdown: where the current "##" block starts
+        self._block_start = 0
+        # json: the state of the top-level object
+        self._depth = 0
+        self._quote = ""  # delimiter of the string being scanned
+        self._escape = False
+        self._key = None
+        self._item_start = -1
+
+    def feed(self, delta: str) -> dict[str, Any]:
+        self.text += delta
+        if self._done:
+            return {}
+        if self.format == "json":
+            return self._feed_json()
+        return self._feed_markdown()
+
+    def close(self) -> Tuple[str, dict]:
+        self._done = True
+        return parse_output(self.text, self.mapping, self.format)
+
+    def _emit(self, name: str, value: Any, completed: dict):
+        typing_define = self.mapping.get(name)
+        if typing_define is None:
+            return  # unknown fields are ignored by the output class as well
+        typing = typing_define[0] if isinstance(typing_define, tuple) else typing_define
+        try:
+            parse_obj_as(typing, value)
+        except ValidationError as e:
+            raise StreamParseError(f"Invalid field {name}: {e}") from e
+        self.fields[name] = completed[name] = value
+
+    def _feed_markdown(self) -> dict[str, Any]:
+        completed = {}
+        while (idx := self.text.find("##", self._pos)) >= 0:
+            block = self.text[self._block_start : idx]
+            self._block_start = self._pos = idx + 2
+            if block.strip() == "":
+                continue
+            try:
+                title, content = OutputParser.parse_block(block)
+            except (ValueError, IndexError) as e:
+                raise StreamParseError(f"Invalid block: {block}") from e
+            self._emit(title, OutputParser.parse_block_with_mapping(title, content, self.mapping), completed)
+        # a trailing "#" may be the start of the next "##"
+        self._pos = max(self._block_start, len(self.text) - 1)
+        return completed
+
+    def _feed_json(self) -> dict[str, Any]:
+        text = self.text
+        if self._item_start < 0:
+            tag = text.find(CONTENT_TAG)
+            if tag < 0:
+                return {}
+            start = tag + len(CONTENT_TAG)
+            stripped = text[start:].lstrip()
+            if not stripped:
+                return {}
+            if stripped[0] != "{":
+                # not the object `parse_output` looks for, leave the reply to it
+                self._done = True
+                return {}
+            self._pos = len(text) - len(stripped)
+            self._item_start = self._pos + 1
+
+        completed = {}
+        i, n = self._pos, len(text)
+        while i < n and not self._done:
+            c = text[i]
+            if self._quote:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif text.startswith(self._quote, i):
+                    i += len(self._quote)
+                    self._quote = ""
+                    continue
+                elif len(self._quote) == 3 and n - i < 3 and self._quote.startswith(text[i:]):
+                    break  # the closing triple quote may be cut in half
+                i += 1
+                continue
+
+            if c in "\"'":
+                if n - i < 3:
+                    break  # can not tell a triple quote from an empty string yet
+                self._quote = c * 3 if text.startswith(c * 3, i) else c
+                i += len(self._quote)
+                continue
+            if c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._end_item(i, completed)
+                    self._done = True
+            elif self._depth == 1 and c == ",":
+                self._end_item(i, completed)
+                self._item_start = i + 1
+            elif self._depth == 1 and c == ":" and self._key is None:
+                self._key = self._decode(text[self._item_start : i])
+                if not isinstance(self._key, str):
+                    raise StreamParseError(f"Invalid key: {self._key}")
+                self._item_start = i + 1
+            i += 1
+        self._pos = i
+        return completed
+
+    def _end_item(self, end: int, completed: dict):
+        item = self.text[self._item_start : end]
+        if self._key is None:
+            if item.strip():
+                raise StreamParseError(f"Expecting a key before {item}")
+            return
+        key, self._key = self._key, None
+        self._emit(key, self._decode(item), completed)
+
+    @staticmethod
+    def _decode(text: str) -> Any:
+        try:
+            return CustomDecoder(strict=False).decode(text.strip())
+        except (JSONDecodeError, StopIteration) as e:
+            raise StreamParseError(f"Invalid value: {text}") from e
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the configuration, the costs and the workspace of a project, scoped by a context variable
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional
+
+from metagpt.const import WORKSPACE_ROOT
+
+
+@dataclass
+class ProjectContext:
+    """What each project has of its own, so that the projects of one process do not share a budget or a workspace.
+
+    `CONFIG.project_setting` reads the `config` overrides of the project active in the current context, e.g. the
+    model of the LLM and the prompt format when a request is made, CONFIG the budget and the workspace root, and
+    CostManager adds the usage to its totals. The tasks started in a context inherit its project, so each company
+    running in its own task is isolated, and identical requests are only coalesced within a project, while the LLM
+    clients, connection pools and rate limiters stay shared by the whole process. Outside any project, the default
+    one holds the process-wide totals.
+    """
+
+    name: str = "default"
+    workspace_root: Path = WORKSPACE_ROOT
+    max_budget: Optional[float] = None  # MAX_BUDGET when None
+    config: dict = field(default_factory=dict)  # setting of CONFIG -> its value in the project
+    total_prompt_tokens: int = 0
+    total_completion_tokens: int = 0
+    total_cost: float = 0.0
+
+    @contextmanager
+    def activate(self) -> Iterator["ProjectContext"]:
+        """Make it the project of the current context, and of the tasks started in it"""
+        token = _current_project.set(self)
+        try:
+            yield self
+        finally:
+            _current_project.reset(token)
+
+
+DEFAULT_PROJECT = ProjectContext()
+_current_project: ContextVar[ProjectContext] = ContextVar("current_project", default=DEFAULT_PROJECT)
+
+
+def get_project() -> ProjectContext:
+    return _current_project.get()
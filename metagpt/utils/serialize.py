@@ -3,12 +3,26 @@
 # @Desc   : the implement of serialization and deserialization
 
 import copy
+import importlib
+import json
 import pickle
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
 from metagpt.actions.action_output import ActionOutput
 from metagpt.schema import Message
 
+MESSAGE_FORMAT_VERSION = 1
+# the types of the fields of the action outputs, by the name they are serialized with
+FIELD_TYPES = {
+    "str": str,
+    "int": int,
+    "List[str]": List[str],
+    "List[List[str]]": List[List[str]],
+    "List[Tuple[str, str]]": List[Tuple[str, str]],
+}
+FIELD_TYPE_NAMES = {v: k for k, v in FIELD_TYPES.items()}
+
 
 def actionoutout_schema_to_mapping(schema: Dict) -> Dict:
     """
@@ -36,14 +50,73 @@ def actionoutout_schema_to_mapping(schema: Dict) -> Dict:
             mapping[field] = (str, ...)
         elif property["type"] == "array" and property["items"]["type"] == "string":
             mapping[field] = (List[str], ...)
+        elif property["type"] == "array" and isinstance(property["items"].get("items"), list):
+            # a fixed-length array is a tuple, like `List[Tuple[str, str]]`
+            mapping[field] = (List[Tuple[tuple(str for _ in property["items"]["items"])]], ...)
         elif property["type"] == "array" and property["items"]["type"] == "array":
             # here only consider the `List[List[str]]` situation
             mapping[field] = (List[List[str]], ...)
     return mapping
 
 
-def serialize_message(message: Message):
-    message_cp = copy.deepcopy(message)  # avoid `instruct_content` value update by reference
+def _encode_mapping(mapping: Dict) -> Optional[List]:
+    fields = []
+    for name, value in mapping.items():
+        if not isinstance(value, tuple) or len(value) != 2 or value[1] is not ...:
+            return None
+        type_name = FIELD_TYPE_NAMES.get(value[0])
+        if type_name is None:
+            return None
+        fields.append([name, type_name])
+    return fields
+
+
+def _action_path(cause_by) -> Optional[str]:
+    path = f"{cause_by.__module__}:{cause_by.__qualname__}"
+    return None if "<locals>" in path else path
+
+
+@lru_cache(maxsize=None)
+def _action_class(path: str) -> type:
+    module, _, qualname = path.partition(":")
+    obj = importlib.import_module(module)
+    for name in qualname.split("."):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _encode_message(message: Message) -> Optional[dict]:
+    """The message as a JSON object, None when it holds something JSON can't tell back"""
+    record = {"v": MESSAGE_FORMAT_VERSION, "content": message.content}
+    for name in ("role", "sent_from", "send_to", "restricted_to", "id", "created_at"):
+        value = getattr(message, name)
+        if value:
+            record[name] = value
+    cause_by = message.cause_by
+    if isinstance(cause_by, type):
+        path = _action_path(cause_by)
+        if path is None:
+            return None
+        record["action"] = path
+    elif cause_by:
+        record["cause_by"] = cause_by
+    ic = message.instruct_content
+    if ic:
+        mapping = ActionOutput.mapping_of(type(ic))
+        schema = None
+        if mapping is None:
+            schema = ic.schema()
+            mapping = actionoutout_schema_to_mapping(schema)
+        fields = _encode_mapping(mapping)
+        if fields is None:
+            return None
+        class_name = schema["title"] if schema else type(ic).__name__
+        record["ic"] = {"class": class_name, "mapping": fields, "value": ic.dict()}
+    return record
+
+
+def _pickle_message(message: Message) -> bytes:
+    message_cp = copy.copy(message)  # only `instruct_content` is replaced, the original keeps its own
     ic = message_cp.instruct_content
     if ic:
         # model create by pydantic create_model like `pydantic.main.prd`, can't pickle.dump directly
@@ -51,16 +124,48 @@ def serialize_message(message: Message):
         mapping = actionoutout_schema_to_mapping(schema)
 
         message_cp.instruct_content = {"class": schema["title"], "mapping": mapping, "value": ic.dict()}
-    msg_ser = pickle.dumps(message_cp)
+    return pickle.dumps(message_cp)
+
 
-    return msg_ser
+def serialize_message(message: Message) -> bytes:
+    """One line of JSON, versioned, the action and the output class stored by name. A message JSON can't hold
+    (an action defined in a function, an output field of another type) is pickled as before."""
+    record = _encode_message(message)
+    if record is not None:
+        try:
+            return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        except (TypeError, ValueError):
+            pass
+    return _pickle_message(message)
+
+
+def _decode_message(record: dict) -> Message:
+    if record.get("v") != MESSAGE_FORMAT_VERSION:
+        raise ValueError(f"unknown message format version: {record.get('v')}")
+    ic = record.get("ic")
+    if ic:
+        mapping = {name: (FIELD_TYPES[type_name], ...) for name, type_name in ic["mapping"]}
+        ic = ActionOutput.get_model_class(ic["class"], mapping)(**ic["value"])
+    return Message(
+        content=record["content"],
+        instruct_content=ic,
+        role=record.get("role", ""),
+        cause_by=_action_class(record["action"]) if "action" in record else record.get("cause_by", ""),
+        sent_from=record.get("sent_from", ""),
+        send_to=record.get("send_to", ""),
+        restricted_to=record.get("restricted_to", ""),
+        id=record.get("id", ""),
+        created_at=record.get("created_at", 0.0),
+    )
 
 
-def deserialize_message(message_ser: str) -> Message:
+def deserialize_message(message_ser: bytes) -> Message:
+    if message_ser[:1] == b"{":
+        return _decode_message(json.loads(message_ser))
     message = pickle.loads(message_ser)
     if message.instruct_content:
         ic = message.instruct_content
-        ic_obj = ActionOutput.create_model_class(class_name=ic["class"], mapping=ic["mapping"])
+        ic_obj = ActionOutput.get_model_class(class_name=ic["class"], mapping=ic["mapping"])
         ic_new = ic_obj(**ic["value"])
         message.instruct_content = ic_new
 
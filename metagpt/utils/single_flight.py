@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : coalesce identical concurrent calls, so that only the first one is executed and the others share its result
+
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Hashable, Iterator, Optional
+
+
+class SingleFlight:
+    """While a call of `key` is in flight, later calls of the same key await its result instead of running again"""
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.calls = 0  # calls actually executed
+        self.saved = 0  # calls served by an identical in-flight call
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None and future.get_loop() is asyncio.get_running_loop():
+            self.saved += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # the leading call was cancelled but this one was not, run it again
+                return await self.do(key, fn)
+
+        future = asyncio.get_running_loop().create_future()
+        # avoid `Future exception was never retrieved` when nobody else waits for it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        self.calls += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def is_inflight(self, key: Hashable) -> bool:
+        future = self._inflight.get(key)
+        return future is not None and future.get_loop() is asyncio.get_running_loop()
+
+    @contextmanager
+    def lead(self, key: Hashable) -> Iterator[Optional[asyncio.Future]]:
+        """Run a call of `key` whose result is not returned by a coroutine, e.g. a stream, in the block.
+        The block sets the result of the future given, the later calls of the same key await it meanwhile.
+        If the block exits without setting it, they run again, as when the leading call is cancelled.
+        """
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        self.calls += 1
+        try:
+            yield future
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "saved": self.saved, "inflight": self.inflight}
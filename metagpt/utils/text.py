@@ -1,6 +1,10 @@
 from typing import Generator, Sequence
 
-from metagpt.utils.token_counter import TOKEN_MAX, count_string_tokens
+from metagpt.utils.token_counter import (
+    TOKEN_MAX,
+    count_string_tokens,
+    count_string_tokens_many,
+)
 
 
 def reduce_message_length(msgs: Generator[str, None, None], model_name: str, system_text: str, reserved: int = 0,) -> str:
@@ -46,6 +50,7 @@ def generate_prompt_chunk(
         The chunk of text.
     """
     paragraphs = text.splitlines(keepends=True)
+    paragraph_tokens = count_string_tokens_many(paragraphs, model_name)
     current_token = 0
     current_lines = []
 
@@ -55,12 +60,14 @@ def generate_prompt_chunk(
 
     while paragraphs:
         paragraph = paragraphs.pop(0)
-        token = count_string_tokens(paragraph, model_name)
+        token = paragraph_tokens.pop(0)
         if current_token + token <= max_token:
             current_lines.append(paragraph)
             current_token += token
         elif token > max_token:
-            paragraphs = split_paragraph(paragraph) + paragraphs
+            split_paragraphs = split_paragraph(paragraph)
+            paragraphs = split_paragraphs + paragraphs
+            paragraph_tokens = count_string_tokens_many(split_paragraphs, model_name) + paragraph_tokens
             continue
         else:
             yield prompt_template.format("".join(current_lines))
@@ -8,6 +8,11 @@ ref1: https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_
 ref2: https://github.com/Significant-Gravitas/Auto-GPT/blob/master/autogpt/llm/token_counter.py
 ref3: https://github.com/hwchase17/langchain/blob/master/langchain/chat_models/openai.py
 """
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable
+
 import tiktoken
 
 TOKEN_COSTS = {
@@ -22,6 +27,9 @@ TOKEN_COSTS = {
     "gpt-4-32k-0314": {"prompt": 0.06, "completion": 0.12},
     "gpt-4-0613": {"prompt": 0.06, "completion": 0.12},
     "text-embedding-ada-002": {"prompt": 0.0004, "completion": 0.0},
+    "claude-instant-1": {"prompt": 0.00163, "completion": 0.00551},
+    "claude-2": {"prompt": 0.01102, "completion": 0.03268},
+    "fake": {"prompt": 0.0, "completion": 0.0},
 }
 
 
@@ -37,16 +45,92 @@ TOKEN_MAX = {
     "gpt-4-32k-0314": 32768,
     "gpt-4-0613": 8192,
     "text-embedding-ada-002": 8192,
+    "claude-instant-1": 100000,
+    "claude-2": 100000,
+    "fake": 100000,
 }
 
 
-def count_message_tokens(messages, model="gpt-3.5-turbo-0613"):
-    """Return the number of tokens used by a list of messages."""
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """Return the encoding of the model, created once per model. Unknown models fall back to cl100k_base."""
     try:
-        encoding = tiktoken.encoding_for_model(model)
+        return tiktoken.encoding_for_model(model)
     except KeyError:
-        print("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
+        print(f"Warning: model {model} not found. Using cl100k_base encoding.")
+        return tiktoken.get_encoding("cl100k_base")
+
+
+class TokenCounter:
+    """Count tokens with one encoder per model and an LRU memo of the counts of recently seen strings.
+    The memo is keyed by a digest of the strings, so that it does not keep the long prompts alive.
+    """
+
+    def __init__(self, maxsize: int = 8192):
+        self.maxsize = maxsize
+        self._memo: OrderedDict[tuple[str, bytes], int] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(encoding: tiktoken.Encoding, text: str) -> tuple[str, bytes]:
+        return encoding.name, hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def _get(self, key: tuple[str, bytes]):
+        count = self._memo.get(key)
+        if count is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._memo.move_to_end(key)
+        return count
+
+    def _set(self, key: tuple[str, bytes], count: int):
+        self._memo[key] = count
+        if len(self._memo) > self.maxsize:
+            self._memo.popitem(last=False)
+
+    def count(self, text: str, model: str) -> int:
+        """Return the exact number of tokens in the text"""
+        encoding = get_encoding(model)
+        key = self._key(encoding, text)
+        count = self._get(key)
+        if count is None:
+            count = len(encoding.encode(text))
+            self._set(key, count)
+        return count
+
+    def count_many(self, texts: Iterable[str], model: str) -> list[int]:
+        """Return the exact number of tokens of each text, the unseen texts are encoded in one batch"""
+        encoding = get_encoding(model)
+        texts = list(texts)
+        keys = [self._key(encoding, text) for text in texts]
+        counts = [self._get(key) for key in keys]
+        missed = [idx for idx, count in enumerate(counts) if count is None]
+        if missed:
+            tokens = encoding.encode_batch([texts[idx] for idx in missed])
+            for idx, encoded in zip(missed, tokens):
+                counts[idx] = len(encoded)
+                self._set(keys[idx], counts[idx])
+        return counts
+
+    @staticmethod
+    def approx_count(text: str) -> int:
+        """Estimate the number of tokens without encoding, for budget checks which do not need exact counts.
+        About 4 ascii characters per token, and about 1 token per non-ascii character.
+        """
+        n_ascii = len(text.encode("ascii", "ignore"))
+        return (n_ascii + 3) // 4 + len(text) - n_ascii
+
+    def clear(self):
+        self._memo.clear()
+
+
+TOKEN_COUNTER = TokenCounter()
+
+
+def count_message_tokens(messages, model="gpt-3.5-turbo-0613"):
+    """Return the number of tokens used by a list of messages."""
     if model in {
         "gpt-3.5-turbo-0613",
         "gpt-3.5-turbo-16k-0613",
@@ -74,7 +158,7 @@ def count_message_tokens(messages, model="gpt-3.5-turbo-0613"):
     for message in messages:
         num_tokens += tokens_per_message
         for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
+            num_tokens += TOKEN_COUNTER.count(value, model)
             if key == "name":
                 num_tokens += tokens_per_name
     num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
@@ -92,12 +176,36 @@ def count_string_tokens(string: str, model_name: str) -> int:
     Returns:
         int: The number of tokens in the text string.
     """
-    encoding = tiktoken.encoding_for_model(model_name)
-    return len(encoding.encode(string))
+    return TOKEN_COUNTER.count(string, model_name)
+
+
+def count_string_tokens_many(strings: Iterable[str], model_name: str) -> list[int]:
+    """
+    Returns the number of tokens of each text string, encoding the unseen ones in one batch.
+
+    Args:
+        strings (Iterable[str]): The text strings.
+        model_name (str): The name of the encoding to use. (e.g., "gpt-3.5-turbo")
+
+    Returns:
+        list[int]: The number of tokens of each text string.
+    """
+    return TOKEN_COUNTER.count_many(strings, model_name)
+
+
+def approx_string_tokens(string: str) -> int:
+    """Returns a fast estimate of the number of tokens in a text string, see `TokenCounter.approx_count`"""
+    return TokenCounter.approx_count(string)
+
+
+def approx_message_tokens(messages: list[dict]) -> int:
+    """Returns a fast estimate of the number of tokens used by a list of messages, see `TokenCounter.approx_count`"""
+    return sum(3 + sum(approx_string_tokens(value) for value in message.values()) for message in messages) + 3
 
 
 def get_max_completion_tokens(messages: list[dict], model: str, default: int) -> int:
     """Calculate the maximum number of completion tokens for a given model and list of messages.
+    The tokens of the models other than OpenAI's, which have no tiktoken encoding, are estimated.
 
     Args:
         messages: A list of messages.
@@ -108,4 +216,8 @@ def get_max_completion_tokens(messages: list[dict], model: str, default: int) ->
     """
     if model not in TOKEN_MAX:
         return default
-    return TOKEN_MAX[model] - count_message_tokens(messages) - 1
+    try:
+        prompt_tokens = count_message_tokens(messages, model)
+    except NotImplementedError:
+        prompt_tokens = approx_message_tokens(messages)
+    return TOKEN_MAX[model] - prompt_tokens - 1
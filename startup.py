@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import asyncio
+import time
+from pathlib import Path
 
 import fire
 
+from metagpt.config import CONFIG
+from metagpt.logs import logger
 from metagpt.roles import (
     Architect,
     Engineer,
@@ -12,18 +16,10 @@ from metagpt.roles import (
     QaEngineer,
 )
 from metagpt.software_company import SoftwareCompany
+from metagpt.utils.checkpoint import Checkpointer
 
 
-async def startup(
-    idea: str,
-    investment: float = 3.0,
-    n_round: int = 5,
-    code_review: bool = False,
-    run_tests: bool = False,
-    implement: bool = True,
-):
-    """Run a startup. Be a boss."""
-    company = SoftwareCompany()
+def hire_team(company: SoftwareCompany, code_review: bool = False, run_tests: bool = False, implement: bool = True):
     company.hire(
         [
             ProductManager(),
@@ -42,18 +38,67 @@ async def startup(
         # (bug fixing capability comes soon!)
         company.hire([QaEngineer()])
 
+
+async def run_company(company: SoftwareCompany, n_round: int = 5, until_idle: bool = False, deadline: float = 0):
+    if until_idle:
+        await company.run_until_idle(deadline=deadline)
+    else:
+        await company.run(n_round=n_round)
+
+
+async def startup(
+    idea: str,
+    investment: float = 3.0,
+    n_round: int = 5,
+    code_review: bool = False,
+    run_tests: bool = False,
+    implement: bool = True,
+    until_idle: bool = False,
+    deadline: float = 0,
+    checkpoint: bool = False,
+):
+    """Run a startup. Be a boss."""
+    company = SoftwareCompany()
+    team = dict(code_review=code_review, run_tests=run_tests, implement=implement)
+    hire_team(company, **team)
+    if checkpoint or CONFIG.checkpoint:
+        path = Path(CONFIG.checkpoint_path) / time.strftime("%Y%m%d-%H%M%S")
+        run = dict(n_round=n_round, until_idle=until_idle, deadline=deadline)
+        company.enable_checkpoint(path, meta={"team": team, "run": run})
+        logger.info(f"resume it with: python startup.py --resume_from {path}")
+
     company.invest(investment)
     company.start_project(idea)
-    await company.run(n_round=n_round)
+    await run_company(company, n_round, until_idle, deadline)
+
+
+async def resume(checkpoint: str):
+    """Resume a startup from its checkpoint, the LLM calls made before it are not made again"""
+    meta = Checkpointer.load_meta(checkpoint)
+    company = SoftwareCompany()
+    hire_team(company, **meta["team"])
+    company.restore(checkpoint)
+    run = meta["run"]
+    if not run["until_idle"]:
+        # the rounds left, n_round=0 would mean no bound to the event scheduler
+        run["n_round"] -= len(company.environment.stats)
+        if run["n_round"] <= 0:
+            logger.info(f"{checkpoint} has no round left to run")
+            return
+    await run_company(company, **run)
 
 
 def main(
-    idea: str,
+    idea: str = "",
     investment: float = 3.0,
     n_round: int = 5,
     code_review: bool = True,
     run_tests: bool = False,
     implement: bool = True,
+    until_idle: bool = False,
+    deadline: float = 0,
+    resume_from: str = "",
+    checkpoint: bool = False,
 ):
     """
     We are a software startup comprised of AI. By investing in us,
@@ -63,9 +108,18 @@ def main(
     a certain dollar amount to this AI company.
     :param n_round:
     :param code_review: Whether to use code review.
+    :param until_idle: Run until no role has anything left to do instead of n_round rounds.
+    :param deadline: With until_idle, stop after this many seconds, 0 for no deadline.
+    :param resume_from: The checkpoint directory of a startup to resume, instead of starting one from the idea.
+    :param checkpoint: Checkpoint the startup to resume it later, also on with CHECKPOINT in config.yaml.
     :return:
     """
-    asyncio.run(startup(idea, investment, n_round, code_review, run_tests, implement))
+    if resume_from:
+        asyncio.run(resume(resume_from))
+        return
+    asyncio.run(
+        startup(idea, investment, n_round, code_review, run_tests, implement, until_idle, deadline, checkpoint)
+    )
 
 
 if __name__ == "__main__":
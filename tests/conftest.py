@@ -10,6 +10,7 @@ from unittest.mock import Mock
 
 import pytest
 
+from metagpt.config import CONFIG
 from metagpt.logs import logger
 from metagpt.provider.openai_api import OpenAIGPTAPI as GPTAPI
 import asyncio
@@ -36,6 +37,12 @@ def llm_api():
     logger.info("Tearing down the test")
 
 
+@pytest.fixture(autouse=True)
+def embedding_cache_path(mocker, tmp_path_factory):
+    # the embeddings cached by the tests do not go to the data directory of the repo
+    mocker.patch.object(CONFIG, "embedding_cache_path", tmp_path_factory.getbasetemp() / "embedding_cache")
+
+
 @pytest.fixture(scope="function")
 def mock_llm():
     # Create a mock LLM for testing
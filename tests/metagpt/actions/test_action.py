@@ -5,9 +5,77 @@
 @Author  : alexanderwu
 @File    : test_action.py
 """
+import pytest
+from tenacity import RetryError, wait_none
+
 from metagpt.actions import Action, WritePRD, WriteTest
+from metagpt.actions.design_api import OUTPUT_MAPPING, templates
+from metagpt.provider.openai_api import OpenAIGPTAPI
+from metagpt.provider.response_cache import CacheMode, DiskCacheBackend, ResponseCache
+from metagpt.provider.stream_sink import NullSink
 
 
 def test_action_repr():
     actions = [Action(), WriteTest(), WritePRD()]
     assert "WriteTest" in str(actions)
+
+
+def _mock_stream(reply: str, sent: list):
+    async def aask_stream(msg, system_msgs=None):
+        for pos in range(0, len(reply), 8):
+            sent.append(pos)
+            yield reply[pos : pos + 8]
+
+    return aask_stream
+
+
+@pytest.mark.asyncio
+async def test_aask_v1_stream(mocker):
+    action = Action()
+    action.llm.stream_sink = NullSink()
+    reply = templates["json"]["FORMAT_EXAMPLE"]
+    mocker.patch.object(action.llm, "aask_stream", _mock_stream(reply, []))
+    output = await action._aask_v1("prompt", "system_design", OUTPUT_MAPPING, format="json")
+    assert output.instruct_content.dict()["File list"] == ["main.py"]
+
+
+@pytest.mark.asyncio
+async def test_aask_v1_cancel_malformed(mocker):
+    action = Action()
+    action.llm.stream_sink = NullSink()
+    reply = '[CONTENT]\n{"File list": "main.py",' + " " * 1000 + "}\n[/CONTENT]"
+    sent = []
+    mocker.patch.object(action.llm, "aask_stream", _mock_stream(reply, sent))
+    with pytest.raises(RetryError):
+        await Action._aask_v1.retry_with(wait=wait_none())(
+            action, "prompt", "system_design", OUTPUT_MAPPING, format="json"
+        )
+    # every attempt is given up once "File list" turns out not to be a list
+    assert len(sent) == 3 * 5  # the comma after "main.py" arrives in the 5th delta
+
+
+@pytest.mark.asyncio
+async def test_aask_v1_retry_skips_cached_malformed(mocker, tmp_path):
+    replies = ["[CONTENT]\n{}\n[/CONTENT]", templates["json"]["FORMAT_EXAMPLE"]]
+
+    async def acreate(**kwargs):
+        reply = replies.pop(0)
+
+        async def chunks():
+            for pos in range(0, len(reply), 8):
+                yield {"choices": [{"delta": {"content": reply[pos : pos + 8]}}]}
+
+        return chunks()
+
+    acreate = mocker.patch("openai.ChatCompletion.acreate", side_effect=acreate)
+    llm = OpenAIGPTAPI()
+    llm.stream_sink = NullSink()
+    llm._cache = ResponseCache(DiskCacheBackend(tmp_path), CacheMode.READ_THROUGH)
+    action = Action(llm=llm)
+    output = await Action._aask_v1.retry_with(wait=wait_none())(
+        action, "prompt", "system_design", OUTPUT_MAPPING, format="json"
+    )
+    assert output.instruct_content.dict()["File list"] == ["main.py"]
+    # the malformed reply was evicted, the retry requested the LLM again and only the good reply stays cached
+    assert acreate.call_count == 2
+    assert len(llm._cache.backend) == 1
@@ -10,6 +10,9 @@ import pytest
 from metagpt.actions.write_code import WriteCode
 from metagpt.llm import LLM
 from metagpt.logs import logger
+from metagpt.provider.openai_api import OpenAIGPTAPI
+from metagpt.provider.response_cache import CacheMode, DiskCacheBackend, ResponseCache
+from metagpt.provider.stream_sink import NullSink
 from tests.metagpt.actions.mock import TASKS_2, WRITE_CODE_PROMPT_SAMPLE
 
 
@@ -32,3 +35,49 @@ async def test_write_code_directly():
     llm = LLM()
     rsp = await llm.aask(prompt)
     logger.info(rsp)
+
+
+@pytest.mark.asyncio
+async def test_write_code_record_and_replay(mocker, tmp_path):
+    reply = "## Code: add.py\n```python\ndef add(a, b):\n    return a + b\n```\nThe code adds two numbers."
+
+    async def acreate(**kwargs):
+        async def chunks():
+            for pos in range(0, len(reply), 8):
+                yield {"choices": [{"delta": {"content": reply[pos : pos + 8]}}]}
+
+        return chunks()
+
+    acreate = mocker.patch("openai.ChatCompletion.acreate", side_effect=acreate)
+
+    async def write_code(mode: CacheMode) -> str:
+        llm = OpenAIGPTAPI()
+        llm.stream_sink = NullSink()
+        llm._cache = ResponseCache(DiskCacheBackend(tmp_path), mode)
+        return await WriteCode(llm=llm).run(context="", filename="add.py")
+
+    code = await write_code(CacheMode.RECORD)
+    assert "return a + b" in code
+    # the reply was read to its end, and recorded as a whole
+    assert await write_code(CacheMode.REPLAY) == code
+    assert acreate.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_write_code_parse_as_it_arrives(mocker):
+    logger = mocker.patch("metagpt.actions.write_code.logger")
+    drained = []
+
+    async def aask_stream(prompt, system_msgs=None):
+        yield "## Code: add.py\n```python\ndef add(a, b):\n"
+        yield "    return a + b\n``"
+        yield "`\n"
+        # the code block is parsed before the rest of the reply arrives
+        assert logger.debug.called
+        yield "Or:\n```python\nadd = int.__add__\n```"
+        drained.append(True)
+
+    write_code = WriteCode()
+    mocker.patch.object(write_code, "_aask_stream", aask_stream)
+    assert await write_code.write_code("prompt") == "def add(a, b):\n    return a + b\n"
+    assert drained
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/document_store/embedding.py
+
+import json
+
+import numpy as np
+
+from metagpt.document_store import FaissStore
+from metagpt.document_store.embedding import HashingEmbeddings, get_embedding
+
+
+def test_hashing_embeddings():
+    embedding = HashingEmbeddings(dim=64)
+    texts = ["Write a cli snake game", "Write a game of cli snake", "设计一个高效的搜索引擎", ""]
+    vectors = np.array(embedding.embed_documents(texts))
+    assert vectors.shape == (4, 64)
+    assert np.allclose(np.linalg.norm(vectors[:3], axis=1), 1)
+    assert not vectors[3].any()
+    # batched or not, the same vectors
+    assert np.allclose(vectors[1], embedding.embed_query(texts[1]))
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+    assert get_embedding("hashing").embed_query("snake") == get_embedding("hashing").embed_query("snake")
+
+
+def test_faiss_store_offline(tmp_path):
+    raw_data = tmp_path / "faq.json"
+    faq = [
+        {"question": "How to refund an order?", "answer": "Call refund(phone)"},
+        {"question": "How to open the box?", "answer": "Call open_box(phone)"},
+    ]
+    raw_data.write_text(json.dumps(faq))
+    store = FaissStore(raw_data, meta_col="answer", content_col="question", embedding=HashingEmbeddings())
+    assert store.search("refund my order", k=1) == "How to refund an order?"
+    assert (tmp_path / "faq.index").exists()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/document_store/embedding_cache.py
+
+import pickle
+from typing import List
+
+from langchain.embeddings.base import Embeddings
+
+from metagpt.config import CONFIG
+from metagpt.document_store.embedding_cache import CachedEmbeddings, MmapEmbeddingStore
+
+
+class _Embeddings(Embeddings):
+    model = "fake-embedding"
+
+    def __init__(self):
+        self.requested = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.requested.append(texts)
+        return [self.embed_query(i) for i in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [float(len(text)), 0.5, -1.0]
+
+
+def test_hits_and_misses(tmp_path):
+    embeddings = _Embeddings()
+    cached = CachedEmbeddings(embeddings, MmapEmbeddingStore(tmp_path, capacity=10))
+    assert cached.embed_documents(["a", "bb", "a"]) == [[1.0, 0.5, -1.0], [2.0, 0.5, -1.0], [1.0, 0.5, -1.0]]
+    assert embeddings.requested == [["a", "bb"]]
+    assert cached.embed_documents(["bb", "ccc"]) == [[2.0, 0.5, -1.0], [3.0, 0.5, -1.0]]
+    assert embeddings.requested[-1] == ["ccc"]
+    assert cached.embed_query("a") == [1.0, 0.5, -1.0]
+    assert cached.stats() == {"size": 3, "hits": 2, "misses": 4, "evictions": 0}
+
+
+def test_persistent_and_lru(tmp_path):
+    embeddings = _Embeddings()
+    store = MmapEmbeddingStore(tmp_path, capacity=2)
+    cached = CachedEmbeddings(embeddings, store)
+    cached.embed_documents(["a", "bb"])
+    cached.embed_query("a")  # "bb" is the least recently used now
+    cached.embed_query("ccc")
+    assert store.evictions == 1
+    store.flush()
+
+    reopened = MmapEmbeddingStore(tmp_path, capacity=2)
+    assert len(reopened) == 2
+    assert reopened.get(cached.make_key("bb")) is None
+    assert list(reopened.get(cached.make_key("ccc"))) == [3.0, 0.5, -1.0]
+    assert list(reopened.get(cached.make_key("a"))) == [1.0, 0.5, -1.0]
+
+    # another capacity starts over
+    assert len(MmapEmbeddingStore(tmp_path, capacity=4)) == 0
+
+
+def test_pickle(mocker, tmp_path):
+    # the restored one goes to the store of EMBEDDING_CACHE_PATH
+    mocker.patch.object(CONFIG, "embedding_cache", True)
+    mocker.patch.object(CONFIG, "embedding_cache_path", tmp_path)
+    cached = CachedEmbeddings(_Embeddings(), MmapEmbeddingStore(tmp_path, capacity=2))
+    restored = pickle.loads(pickle.dumps(cached.embed_query))
+    assert restored("a") == [1.0, 0.5, -1.0]
+    assert (tmp_path / "fake-embedding").exists()
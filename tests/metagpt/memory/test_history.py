@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/memory/history.py
+
+import io
+
+from metagpt.actions import WriteCode
+from metagpt.memory import History, MessageLog
+from metagpt.schema import Message
+from metagpt.utils.token_counter import approx_string_tokens
+
+
+def _code(i: int) -> Message:
+    return Message(role="Engineer", content=f"## game_{i}.py\n" + "snake.move()\n" * 80, cause_by=WriteCode)
+
+
+def test_history():
+    log = MessageLog()
+    history = History(log)
+    assert history == "" and len(history) == 0 and history.last(3) == ""
+    messages = [_code(i) for i in range(5)]
+    for idx, message in enumerate(messages):
+        log.append(message)
+        expected = "".join(f"\n{i}" for i in messages[: idx + 1])
+        assert history == expected
+        assert len(history) == len(expected)
+    assert "game_4.py" in history
+    assert list(history) == [f"\n{i}" for i in messages]
+    assert history.last(2) == f"\n{messages[3]}\n{messages[4]}"
+    assert history.last(10) == str(history)
+
+    n_tokens = approx_string_tokens(f"\n{messages[0]}")
+    assert history.last_tokens(n_tokens * 2) == history.last(2)
+    assert history.last_tokens(n_tokens * 2 - 1) == history.last(1)
+    assert history.last_tokens(0) == ""
+
+    fp = io.StringIO()
+    history.write(fp)
+    assert fp.getvalue() == str(history)
+
+
+def test_history_renders_once(mocker):
+    n = 300
+    log = MessageLog()
+    history = History(log)
+    tokens = mocker.patch("metagpt.memory.history.approx_string_tokens", side_effect=approx_string_tokens)
+    for i in range(n):
+        log.append(_code(i))
+        if i % 10:
+            continue
+        # what the callers of the whole history string needing the tail did
+        tail = "".join(f"\n{m}" for m in log.messages)[-5000:]
+        assert history.last_tokens(2000).endswith(tail[-1000:])
+        assert str(history).endswith(tail)
+    # each message is rendered and counted once, however often the history is read
+    assert tokens.call_count == n - 9
+    assert len(history) == len("".join(f"\n{m}" for m in log.messages))
+    assert tokens.call_count == n
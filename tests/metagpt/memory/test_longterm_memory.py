@@ -7,6 +7,7 @@ from metagpt.schema import Message
 from metagpt.actions import BossRequirement
 from metagpt.roles.role import RoleContext
 from metagpt.memory import LongTermMemory
+from tests.metagpt.memory.test_memory_storage import _ideas, _storage
 
 
 def test_ltm_search():
@@ -53,3 +54,19 @@ def test_ltm_search():
     assert len(news) == 1
 
     ltm_new.clear()
+
+
+def test_ltm_delete(mocker, tmp_path):
+    role_id = 'UTUserLtm(Architect)'
+    ltm = LongTermMemory()
+    ltm.memory_storage = _storage(mocker, tmp_path, role_id)
+    ltm.recover_memory(role_id, RoleContext(watch=[BossRequirement]))
+    messages = _ideas(3)
+    ltm.add_batch(messages)
+    ltm.delete(messages[0])
+    ltm.delete_batch(messages[1:2])
+    assert ltm.get() == messages[2:]
+    ltm.memory_storage.close()
+    # the deleted messages are not recovered
+    assert _storage(mocker, tmp_path, role_id).recover_memory(role_id) == messages[2:]
+    ltm.clear()
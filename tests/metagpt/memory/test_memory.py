@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/memory/memory.py
+
+import os
+import time
+
+import pytest
+
+from metagpt.actions import BossRequirement, WriteDesign, WritePRD
+from metagpt.logs import logger
+from metagpt.memory import Memory
+from metagpt.schema import Message
+
+
+def _messages() -> list[Message]:
+    return [
+        Message(role="BOSS", content="Write a cli snake game", cause_by=BossRequirement),
+        Message(role="Product Manager", content="PRD", cause_by=WritePRD, sent_from="Alice", send_to="Bob"),
+        Message(role="Architect", content="Design", cause_by=WriteDesign, sent_from="Bob"),
+    ]
+
+
+def test_add_and_dedup():
+    memory = Memory()
+    idea, prd, design = _messages()
+    assert memory.add(idea)
+    # a message with the same fields is the same message
+    assert not memory.add(Message(role="BOSS", content="Write a cli snake game", cause_by=BossRequirement))
+    memory.add_batch([prd, design, prd])
+    assert memory.count() == len(memory) == 3
+    assert prd in memory
+    assert Message(role="BOSS", content="Write a cli game") not in memory
+
+
+def test_indexes():
+    memory = Memory()
+    idea, prd, design = _messages()
+    memory.add_batch([idea, prd, design])
+    assert memory.get_by_action(WritePRD) == [prd]
+    assert memory.get_by_actions([WriteDesign, BossRequirement]) == [design, idea]
+    assert memory.get_by_role("Architect") == [design]
+    assert memory.get_by_sent_from("Bob") == [design]
+    assert memory.get_by_send_to("Bob") == [prd]
+
+    memory.delete(prd)
+    assert prd not in memory
+    assert memory.get_by_action(WritePRD) == []
+    assert memory.get_by_send_to("Bob") == []
+    assert WritePRD not in memory.index
+    assert memory.get() == [idea, design]
+
+
+def test_get_and_find_news():
+    memory = Memory()
+    idea, prd, design = _messages()
+    memory.add_batch([idea, prd])
+    assert memory.get(k=1) == [prd]
+    assert memory.get(k=5) == [idea, prd]
+    assert memory.find_news([idea, prd, design]) == [design]
+    assert memory.find_news([idea, prd, design], k=1) == [idea, design]
+
+    memory.clear()
+    assert memory.get() == [] and memory.get_by_role("BOSS") == []
+
+
+QUERIES = ["snake", "nak", "game.py", "def move(self", " 42", "score = ", ".", "", "Design 7", "8\n", "蛇"]
+
+
+def _content(i: int) -> str:
+    if i % 50 == 0:
+        return f"## Design {i}\nThe snake game, file game.py:\ndef move(self, d):\n    score = {i % 97}\n"
+    if i % 7 == 0:
+        return f"message {i}: nothing about it, token{i % 1000} and 贪吃蛇"
+    return f"message {i}: nothing about it, token{i % 1000}\n"
+
+
+def _contents(n: int) -> list[str]:
+    return [_content(i) for i in range(n)]
+
+
+def test_content_index_matches_scan():
+    scan, indexed = Memory(content_index=False), Memory(content_index=True)
+    for i, content in enumerate(_contents(500)):
+        message = Message(role="Engineer", content=content, cause_by=WriteDesign)
+        scan.add(message)
+        indexed.add(message)
+    victims = scan.get_by_content("Design 1")
+    for i in victims:
+        scan.delete(i)
+        indexed.delete(i)
+    for query in QUERIES + ["Design 1", "token42 ", "token42", "nothing about"]:
+        assert indexed.get_by_content(query) == scan.get_by_content(query), query
+        assert indexed.try_remember(query) == scan.try_remember(query), query
+
+
+def test_content_index_narrows_the_scan(mocker):
+    n = 10000
+    scan, indexed = Memory(content_index=False), Memory(content_index=True)
+    for content in _contents(n):
+        message = Message(role="Engineer", content=content, cause_by=WriteDesign)
+        scan.add(message)
+        indexed.add(message)
+
+    candidates = mocker.spy(indexed.content_index, "candidates")
+    scanned, found = [], []
+    for query in ("snake game", "score = 42", "token7\n"):
+        results = indexed.get_by_content(query)
+        assert results == scan.get_by_content(query)
+        scanned.append(len(candidates.spy_return))
+        found.append(len(results))
+    # only the messages sharing the words of the query are scanned
+    assert found == [n // 50, 2, 8]
+    assert scanned == [n // 50, 4, 10]
+
+
+@pytest.mark.skipif(not os.getenv("METAGPT_BENCHMARK"), reason="a benchmark, set METAGPT_BENCHMARK=1 to run it")
+def test_content_index_benchmark():
+    n = 10000
+    scan, indexed = Memory(content_index=False), Memory(content_index=True)
+    for content in _contents(n):
+        message = Message(role="Engineer", content=content, cause_by=WriteDesign)
+        scan.add(message)
+        indexed.add(message)
+
+    elapsed = {}
+    for name, memory in (("scan", scan), ("indexed", indexed)):
+        start = time.perf_counter()
+        for _ in range(10):
+            for query in ("snake game", "score = 42", "token7\n"):
+                memory.get_by_content(query)
+        elapsed[name] = time.perf_counter() - start
+    # timings depend on the machine, they are reported rather than asserted
+    logger.info(f"get_by_content over {n} messages: {elapsed}")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/memory/memory_policy.py
+
+import pytest
+
+from metagpt.actions import BossRequirement, WriteCode, WriteDesign
+from metagpt.environment import Environment
+from metagpt.memory import Memory, MemoryPolicy
+from metagpt.memory.memory_policy import SUMMARY_ROLE
+from metagpt.provider.fake_api import FakeGPTAPI
+from metagpt.roles import Role
+from metagpt.schema import Message
+
+
+def _memory(n: int, created_at: float = 0) -> Memory:
+    memory = Memory()
+    memory.add(Message(role="BOSS", content="Write a cli snake game", cause_by=BossRequirement, created_at=created_at))
+    for i in range(n):
+        memory.add(Message(role="Engineer", content=f"code {i}", cause_by=WriteCode, created_at=created_at + i))
+    return memory
+
+
+def test_select_by_messages():
+    memory = _memory(11)
+    evicted = MemoryPolicy(max_messages=8).select(memory)
+    # down to 3/4 of the limit, the latest message of each action is kept
+    assert [i.content for i in evicted] == [f"code {i}" for i in range(6)]
+    assert MemoryPolicy(max_messages=12).select(memory) == []
+
+
+def test_select_by_tokens_and_ttl():
+    memory = _memory(10)
+    assert len(MemoryPolicy(max_tokens=20).select(memory)) == 10 - 4
+    evicted = MemoryPolicy(ttl=5).select(memory, now=10)
+    assert [i.content for i in evicted] == [f"code {i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_fold():
+    evicted = _memory(3).get()
+    summary = MemoryPolicy(summary_max_tokens=8).fold(None, evicted)
+    assert summary.role == SUMMARY_ROLE
+    assert summary.content.splitlines() == ["Engineer: code 1", "Engineer: code 2"]
+
+    llm = FakeGPTAPI(responses={"Write a new summary": "a snake game is being written"}, ttft=0, tps=0)
+    policy = MemoryPolicy(summarize_with_llm=True)
+    assert (await policy.afold(summary, evicted, llm)).content == "a snake game is being written"
+    llm.error_rate = 1
+    assert (await policy.afold(summary, evicted, llm)).content.startswith("Engineer: code 1")
+
+
+@pytest.mark.asyncio
+async def test_role_memory_stays_flat():
+    env = Environment()
+    role = Role("Bob", "Engineer")
+    env.add_role(role)
+    role._rc.policy = MemoryPolicy(max_messages=8)
+    for i in range(100):
+        env.publish_message(Message(role="Architect", content=f"design {i}", cause_by=WriteDesign if i % 2 else ""))
+        await role._observe()
+        await role._rc.enforce_policy(role._llm)
+        assert len(role._rc.memory) <= 8
+    history = role._rc.history
+    assert history[0].role == SUMMARY_ROLE and "design 9" in history[0].content
+    assert history[-1].content == "design 99"
+    assert role._rc.memory.get_by_action(WriteDesign)[-1].content == "design 99"
+    # the evicted prefix of the log is not scanned anymore
+    assert role._rc.memory.start > 80
@@ -2,8 +2,17 @@
 # -*- coding: utf-8 -*-
 # @Desc   : the unittests of metagpt/memory/memory_storage.py
 
+import os
+import threading
+import time
 from typing import List
 
+import faiss
+import pytest
+from langchain.embeddings.base import Embeddings
+
+from metagpt.config import CONFIG
+from metagpt.logs import logger
 from metagpt.memory.memory_storage import MemoryStorage
 from metagpt.schema import Message
 from metagpt.actions import BossRequirement
@@ -80,3 +89,221 @@ def test_actionout_message():
 
     memory_storage.clean()
     assert memory_storage.is_initialized is False
+
+
+class _Embeddings(Embeddings):
+    """Deterministic and offline"""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(i) for i in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0]
+
+
+def _storage(mocker, tmp_path, role_id: str, **kwargs) -> MemoryStorage:
+    mocker.patch("metagpt.memory.memory_storage.DATA_PATH", tmp_path)
+    kwargs = {"durability": "message", "compact_every": 100, "compact_interval": 600, **kwargs}
+    memory_storage = MemoryStorage(**kwargs)
+    memory_storage.embedding = _Embeddings()
+    memory_storage.recover_memory(role_id)
+    return memory_storage
+
+
+def _ideas(n: int) -> List[Message]:
+    return [Message(role='BOSS', content=f'Write a cli snake game {i}', cause_by=BossRequirement) for i in range(n)]
+
+
+def test_wal_and_compaction(mocker, tmp_path):
+    role_id = 'UTUser3(Product Manager)'
+    memory_storage = _storage(mocker, tmp_path, role_id, compact_every=2)
+    for message in _ideas(3):
+        memory_storage.add(message)
+    memory_storage.close()
+    # the first two messages are compacted into the snapshot, the third one is in the log only
+    assert memory_storage._snapshot_fname().exists()
+    assert memory_storage._wal_segments() == [1]
+
+    recovered = _storage(mocker, tmp_path, role_id)
+    assert [i.content for i in recovered.recover_memory(role_id)] == [i.content for i in _ideas(3)]
+    assert recovered.store.index.ntotal == 3
+    recovered.clean()
+    assert list((tmp_path / f'role_mem/{role_id}').iterdir()) == []
+
+
+def test_compact_off_the_caller(mocker, tmp_path):
+    role_id = 'UTUser9(Product Manager)'
+    memory_storage = _storage(mocker, tmp_path, role_id, durability="batch", compact_every=2)
+    threads = []
+    for name in ("clone_index", "serialize_index"):
+        fn = getattr(faiss, name)
+        mocker.patch(
+            f"metagpt.memory.memory_storage.faiss.{name}",
+            side_effect=lambda index, fn=fn: threads.append(threading.current_thread()) or fn(index),
+        )
+    writing = threading.Event()
+    memory_storage._submit(writing.wait)  # hold the writer until the next message is added
+    for message in _ideas(3):
+        memory_storage.add(message)
+    writing.set()
+    memory_storage.close()
+    # the index is copied and serialized by the writer
+    assert len(threads) == 2 and threading.current_thread() not in threads
+    # the snapshot is the index as it was compacted, the message added later is in the log only
+    recovered = _storage(mocker, tmp_path, role_id)
+    assert recovered._load_snapshot() == 0 and recovered.store.index.ntotal == 2
+    assert [i.content for i in recovered.recover_memory(role_id)] == [i.content for i in _ideas(3)]
+
+
+def test_durability_message(mocker, tmp_path):
+    role_id = 'UTUser11(Product Manager)'
+    memory_storage = _storage(mocker, tmp_path, role_id)
+    memory_storage.add(_ideas(1)[0])
+    # the message is on the disk once added, before the storage is closed
+    assert len(_storage(mocker, tmp_path, role_id).recover_memory(role_id)) == 1
+    memory_storage.close()
+
+
+def test_durability_shutdown(mocker, tmp_path):
+    role_id = 'UTUser4(Product Manager)'
+    memory_storage = _storage(mocker, tmp_path, role_id, durability="shutdown")
+    for message in _ideas(2):
+        memory_storage.add(message)
+    assert memory_storage._wal_segments() == []
+    memory_storage.close()
+    assert len(_storage(mocker, tmp_path, role_id).recover_memory(role_id)) == 2
+
+
+def test_torn_wal(mocker, tmp_path):
+    role_id = 'UTUser5(Product Manager)'
+    memory_storage = _storage(mocker, tmp_path, role_id)
+    for message in _ideas(2):
+        memory_storage.add(message)
+    memory_storage.close()
+    with open(memory_storage._wal_fname(0), "ab") as f:
+        f.write(b"\x80\x04\x95garbage")
+    assert len(_storage(mocker, tmp_path, role_id).recover_memory(role_id)) == 2
+
+
+def test_search_dissimilar_batch(mocker, tmp_path):
+    role_id = 'UTUser6(Product Manager)'
+    memory_storage = _storage(mocker, tmp_path, role_id)
+    assert memory_storage.search_dissimilar_batch(_ideas(2)) == [[], []]
+    for message in _ideas(6):
+        memory_storage.add(message)
+    queries = _ideas(3) + [Message(role='BOSS', content='Write a 2048 web game', cause_by=BossRequirement)]
+    embed_documents = mocker.spy(memory_storage.embedding, "embed_documents")
+    batched = memory_storage.search_dissimilar_batch(queries)
+    assert embed_documents.call_count == 1
+    for query, messages in zip(queries, batched):
+        assert [i.content for i in messages] == [i.content for i in memory_storage.search_dissimilar(query)]
+    assert len(batched[3]) == 4
+    # the idea itself is too similar to be returned
+    assert _ideas(1)[0].content not in [i.content for i in batched[0]]
+    memory_storage.clean()
+
+
+def test_hashing_embedding(mocker, tmp_path):
+    mocker.patch.object(CONFIG, "embedding_type", "hashing")
+    mocker.patch("metagpt.memory.memory_storage.DATA_PATH", tmp_path)
+    role_id = 'UTUser7(Product Manager)'
+    memory_storage = MemoryStorage()
+    memory_storage.recover_memory(role_id)
+    memory_storage.add(_ideas(1)[0])
+    new_message = Message(role='BOSS', content='Write a 2048 web game', cause_by=BossRequirement)
+    assert memory_storage.search_dissimilar(new_message)[0].content == _ideas(1)[0].content
+    assert memory_storage.search_dissimilar(_ideas(1)[0]) == []
+    memory_storage.clean()
+
+
+def test_prune_by_ttl(mocker, tmp_path):
+    role_id = 'UTUser8(Product Manager)'
+    memory_storage = _storage(mocker, tmp_path, role_id, mem_ttl=100)
+    now = time.time()
+    messages = _ideas(4)
+    for idx, message in enumerate(messages):
+        message.created_at = now - 300 + idx * 100
+        memory_storage.add(message)
+    assert memory_storage.prune(now=now - 50) == 2
+    assert memory_storage.store.index.ntotal == 2
+    assert memory_storage.search_dissimilar_batch(messages[3:])[0][0].content == messages[2].content
+    memory_storage.close()
+
+    # the pruned messages are gone from the disk as well, the recovery prunes the expired ones
+    recovered = _storage(mocker, tmp_path, role_id, mem_ttl=0)
+    assert [i.content for i in recovered.recover_memory(role_id)] == [i.content for i in messages[2:]]
+    recovered.close()
+    recovered = _storage(mocker, tmp_path, role_id, mem_ttl=100)
+    assert [i.content for i in recovered.recover_memory(role_id)] == [messages[3].content]
+    assert recovered.prune(now=now + 10 ** 4) == 1 and recovered.store is None
+
+
+def test_prune_on_compaction(mocker, tmp_path):
+    role_id = 'UTUser12(Product Manager)'
+    memory_storage = _storage(mocker, tmp_path, role_id, mem_ttl=100, compact_every=3)
+    now = time.time()
+    messages = _ideas(3)
+    messages[0].created_at = now - 300
+    for message in messages:
+        memory_storage.add(message)
+    # the third message is due for compaction, the expired one is pruned with it
+    assert memory_storage.store.index.ntotal == 2
+    memory_storage.close()
+    recovered = _storage(mocker, tmp_path, role_id, mem_ttl=0)
+    assert [i.content for i in recovered.recover_memory(role_id)] == [i.content for i in messages[1:]]
+
+
+def test_delete(mocker, tmp_path):
+    role_id = 'UTUser13(Product Manager)'
+    memory_storage = _storage(mocker, tmp_path, role_id)
+    messages = _ideas(4)
+    for message in messages:
+        memory_storage.add(message)
+    assert memory_storage.delete([messages[1], messages[3], Message(content="never stored")]) == 2
+    assert memory_storage.delete([messages[1]]) == 0
+    assert memory_storage.store.index.ntotal == 2
+    memory_storage.close()
+
+    recovered = _storage(mocker, tmp_path, role_id)
+    assert [i.content for i in recovered.recover_memory(role_id)] == [messages[0].content, messages[2].content]
+    assert recovered.delete(recovered.recover_memory(role_id)) == 2 and recovered.store is None
+
+
+def test_recovery_time(mocker, tmp_path):
+    role_id = 'UTUser9(Architect)'
+    n = 2000
+    ic_obj = ActionOutput.get_model_class('prd', {'field1': (str, ...), 'field2': (List[str], ...)})
+    memory_storage = _storage(mocker, tmp_path, role_id, durability="shutdown", compact_every=n)
+    for i in range(n):
+        memory_storage.add(Message(content=f'prd {i}', instruct_content=ic_obj(field1=str(i), field2=[]),
+                                   role='user', cause_by=WritePRD))
+    memory_storage.close()
+
+    start = time.perf_counter()
+    messages = _storage(mocker, tmp_path, role_id).recover_memory(role_id)
+    logger.info(f"recovered {n} messages in {time.perf_counter() - start:.3f}s")
+    assert len(messages) == n
+    # the output class is shared instead of created for each message
+    assert {type(i.instruct_content) for i in messages} == {ic_obj}
+
+
+@pytest.mark.skipif(not os.getenv("METAGPT_BENCHMARK"), reason="a benchmark, set METAGPT_BENCHMARK=1 to run it")
+def test_recovery_benchmark(mocker, tmp_path):
+    n = 10000
+    ic_obj = ActionOutput.get_model_class("prd", {"field1": (str, ...), "field2": (List[str], ...)})
+    elapsed = {}
+    # all the messages in the log, or all of them compacted into the snapshot
+    for source, compact_every in (("wal", n + 1), ("snapshot", n)):
+        role_id = f"UTUser10({source})"
+        memory_storage = _storage(mocker, tmp_path, role_id, durability="shutdown", compact_every=compact_every)
+        for i in range(n):
+            memory_storage.add(
+                Message(content=f"prd {i}", instruct_content=ic_obj(field1=str(i), field2=[]), cause_by=WritePRD)
+            )
+        memory_storage.close()
+
+        start = time.perf_counter()
+        assert len(_storage(mocker, tmp_path, role_id).recover_memory(role_id)) == n
+        elapsed[source] = time.perf_counter() - start
+    # timings depend on the machine, they are reported rather than asserted
+    logger.info(f"recover_memory of {n} messages: {elapsed}")
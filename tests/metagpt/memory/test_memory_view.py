@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/memory/memory_view.py
+
+import pytest
+
+from metagpt.actions import BossRequirement, WriteCode, WriteDesign, WritePRD
+from metagpt.memory import MemoryView, MessageLog
+from metagpt.schema import Message
+
+
+def _messages() -> list[Message]:
+    return [
+        Message(role="BOSS", content="Write a cli snake game", cause_by=BossRequirement),
+        Message(role="Product Manager", content="PRD", cause_by=WritePRD),
+        Message(role="Architect", content="Design", cause_by=WriteDesign, sent_from="Bob"),
+    ]
+
+
+def test_shared_and_private():
+    log = MessageLog()
+    idea, prd, design = _messages()
+    log.append(idea)
+    log.append(prd)
+    alice, bob = MemoryView(log), MemoryView(log)
+    for view in (alice, bob):
+        assert view.add(idea) and view.add(prd)
+    # bob's reply is private until it is published
+    assert bob.add(design)
+    assert design in bob and design not in alice
+    assert bob.private.messages == [design]
+
+    code = Message(role="Engineer", content="Code", cause_by=WriteCode)
+    log.append(design)
+    log.append(code)
+    assert not bob.add(design)
+    assert bob.add(code)
+    assert bob.end == log.end and len(bob.private) == 1
+    assert bob.get() == [idea, prd, design, code]
+    assert bob.get(k=2) == [design, code]
+    assert bob.count() == 4
+    assert bob.get_by_actions([WriteCode, WriteDesign, BossRequirement]) == [idea, design, code]
+    assert bob.get_by_sent_from("Bob") == [design]
+    assert bob.get_by_content("Co") == [code]
+    assert bob.find_news([design, Message(role="QA", content="Test")])[0].role == "QA"
+
+    # nothing of the log is copied into the views
+    assert alice.get() == [idea, prd] and alice.private.messages == []
+
+
+def test_private_order_and_delete():
+    log = MessageLog()
+    idea, prd, design = _messages()
+    log.append(idea)
+    view = MemoryView(log)
+    view.add(prd)  # before the view receives the log
+    view.add(idea)
+    assert view.get() == [prd, idea]
+    assert view.get(k=1) == [idea]
+
+    view.delete(prd)
+    assert prd not in view and view.get() == [idea] and len(view) == 1
+    with pytest.raises(KeyError):
+        view.delete(prd)
+    view.clear()
+    assert view.get() == [] and idea not in view
+    log.append(design)
+    assert view.add(design) and view.get() == [design]
+
+
+def test_content_index():
+    log = MessageLog(content_index=True)
+    idea, prd, design = _messages()
+    view = MemoryView(log)
+    view.add(Message(role="Engineer", content="Design of mine", cause_by=WriteCode))
+    for i in (idea, prd, design):
+        log.append(i)
+        view.add(i)
+    assert [i.role for i in view.get_by_content("Design")] == ["Engineer", "Architect"]
+    assert view.get_by_content("snake") == [idea]
+    assert view.try_remember("esig") == view.get_by_content("esig")
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/memory/message_log.py
+
+from metagpt.actions import BossRequirement, WriteDesign, WritePRD
+from metagpt.memory import MessageLog
+from metagpt.schema import Message
+
+
+def test_append_and_read():
+    log = MessageLog()
+    idea = Message(role="BOSS", content="Write a cli snake game", cause_by=BossRequirement)
+    prd = Message(role="Product Manager", content="PRD", cause_by=WritePRD)
+    design = Message(role="Architect", content="Design", cause_by=WriteDesign)
+    assert [log.append(i) for i in (idea, prd, design)] == [0, 1, 2]
+    assert log.append(Message(role="BOSS", content="Write a cli snake game", cause_by=BossRequirement)) is None
+    assert len(log) == log.end == 3
+    assert prd in log
+
+    assert log.read(1) == [prd, design]
+    assert log.read(0, 1) == [idea]
+    assert log.read_by_actions([WriteDesign, BossRequirement]) == [idea, design]
+    assert log.read_by_actions([WriteDesign, BossRequirement], start=1) == [design]
+    assert log.read_by_actions([WritePRD], start=0, end=1) == []
+    assert log.read_by_actions([WritePRD], start=log.end) == []
+
+
+def test_read_by_actions_scales_with_news():
+    log = MessageLog()
+    for i in range(10000):
+        log.append(Message(role="Architect", content=f"design {i}", cause_by=WriteDesign))
+    prd = Message(role="Product Manager", content="PRD", cause_by=WritePRD)
+    cursor = log.end
+    log.append(prd)
+    assert log.read_by_actions([WritePRD, BossRequirement], start=cursor) == [prd]
+    assert log.read(cursor) == [prd]
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/provider/anthropic_api.py
+
+import asyncio
+import threading
+
+import anthropic
+import pytest
+
+from metagpt.config import CONFIG
+from metagpt.provider import anthropic_api
+from metagpt.provider.anthropic_api import ClaudeGPTAPI
+from metagpt.provider.rate_limiter import TokenBucketLimiter
+from metagpt.provider.stream_sink import get_stream_sink
+
+
+class MockCompletion:
+    def __init__(self, completion):
+        self.completion = completion
+
+
+class MockCompletions:
+    running = 0
+    max_running = 0
+
+    async def create(self, stream=False, **kwargs):
+        MockCompletions.running += 1
+        MockCompletions.max_running = max(MockCompletions.max_running, MockCompletions.running)
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            MockCompletions.running -= 1
+        if stream:
+            return self._stream()
+        return MockCompletion("hello")
+
+    async def _stream(self):
+        for i in ["he", "llo"]:
+            yield MockCompletion(i)
+
+
+class MockAsyncClient:
+    completions = MockCompletions()
+
+
+def test_messages_to_prompt():
+    llm = ClaudeGPTAPI()
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+        {"role": "user", "content": "who are you"},
+    ]
+    prompt = llm.messages_to_prompt(messages)
+    assert prompt == (
+        f"{anthropic.HUMAN_PROMPT} You are a helpful assistant.\n\nhi{anthropic.AI_PROMPT} hello"
+        f"{anthropic.HUMAN_PROMPT} who are you{anthropic.AI_PROMPT}"
+    )
+
+
+@pytest.mark.asyncio
+async def test_acompletion_concurrently(mocker):
+    mocker.patch.object(anthropic_api, "get_async_client", return_value=MockAsyncClient())
+    mocker.patch.object(ClaudeGPTAPI, "_calc_usage", return_value=None)
+    llm = ClaudeGPTAPI()
+    llm._limiter = TokenBucketLimiter(rpm=6000)
+
+    MockCompletions.max_running = 0
+    rsps = await asyncio.gather(*[llm.aask(f"hi {i}", system_msgs=["You are a helpful assistant."]) for i in range(5)])
+    assert rsps == ["hello"] * 5
+    # the requests do not block the event loop, so they run concurrently
+    assert MockCompletions.max_running == 5
+
+    # identical requests in flight are only sent once
+    saved = llm.single_flight.saved
+    rsps = await asyncio.gather(*[llm.aask("hi") for _ in range(3)])
+    assert rsps == ["hello"] * 3
+    assert llm.single_flight.saved == saved + 2
+
+    rsp = await llm.acompletion([{"role": "user", "content": "hi"}])
+    assert llm.get_choice_text(rsp) == "hello"
+
+
+@pytest.mark.asyncio
+async def test_aask_stream(mocker):
+    mocker.patch.object(anthropic_api, "get_async_client", return_value=MockAsyncClient())
+    mocker.patch.object(ClaudeGPTAPI, "_calc_usage", return_value=None)
+    llm = ClaudeGPTAPI()
+    llm._limiter = TokenBucketLimiter(rpm=6000)
+    deltas = [i async for i in llm.aask_stream("hi")]
+    assert deltas == ["he", "llo"]
+
+    llm.stream_sink = get_stream_sink("none")
+    assert await llm.acompletion_text([{"role": "user", "content": "hi"}], stream=True) == "hello"
+
+
+@pytest.mark.asyncio
+async def test_usage_off_the_loop(mocker):
+    mocker.patch.object(CONFIG, "claude_api_tpm", 40000)
+    mocker.patch.object(CONFIG, "calc_usage", True)
+    mocker.patch.object(anthropic_api, "get_async_client", return_value=MockAsyncClient())
+    threads = []
+    client = mocker.Mock()
+    client.count_tokens.side_effect = lambda text: threads.append(threading.current_thread()) or len(text)
+    mocker.patch.object(anthropic_api, "get_client", return_value=client)
+    get_rate_limiter = mocker.spy(anthropic_api, "get_rate_limiter")
+    llm = ClaudeGPTAPI()
+    assert get_rate_limiter.call_args.kwargs["tpm"] == 40000
+    llm._limiter = TokenBucketLimiter(rpm=6000)
+
+    rsp = await llm.acompletion([{"role": "user", "content": "hi there"}])
+    assert rsp["usage"]["completion_tokens"] == len("hello")
+    assert threads and threading.current_thread() not in threads
+
+
+@pytest.mark.asyncio
+async def test_update_costs_failure(mocker):
+    mocker.patch.object(anthropic_api, "get_async_client", return_value=MockAsyncClient())
+    mocker.patch.object(ClaudeGPTAPI, "_calc_usage", return_value={"prompt_tokens": 2, "completion_tokens": 1})
+    llm = ClaudeGPTAPI()
+    llm._limiter = TokenBucketLimiter(rpm=6000)
+    mocker.patch.object(llm._cost_manager, "update_cost", side_effect=KeyError("claude-x"))
+    # the reply is returned as in OpenAIGPTAPI, the failure is only logged
+    assert await llm.aask("hi") == "hello"
@@ -5,11 +5,118 @@
 @Author  : alexanderwu
 @File    : test_base_gpt_api.py
 """
+import asyncio
 
+import pytest
+from tenacity import wait_none
+
+from metagpt.provider.base_gpt_api import BaseGPTAPI
+from metagpt.provider.response_cache import make_chat_response
 from metagpt.schema import Message
+from metagpt.utils.single_flight import SingleFlight
 
 
 def test_message():
     message = Message(role='user', content='wtf')
     assert 'role' in message.to_dict()
     assert 'user' in str(message)
+
+
+class MockGPTAPI(BaseGPTAPI):
+    """Each message is "<delay> <failures>", the request sleeps `delay` seconds and fails `failures` times"""
+
+    def __init__(self):
+        self.inflight = 0
+        self.max_inflight = 0
+        self.attempts = {}
+
+    def completion(self, messages):
+        raise NotImplementedError
+
+    async def acompletion(self, messages):
+        content = messages[-1]["content"]
+        delay, failures = content.split()
+        self.attempts[content] = self.attempts.get(content, 0) + 1
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            await asyncio.sleep(float(delay))
+        finally:
+            self.inflight -= 1
+        if self.attempts[content] <= int(failures):
+            raise ValueError(content)
+        return make_chat_response(content)
+
+    async def acompletion_text(self, messages, stream=False):
+        return self.get_choice_text(await self.acompletion(messages))
+
+
+def _batch(*contents):
+    return [[{"role": "user", "content": i}] for i in contents]
+
+
+@pytest.mark.asyncio
+async def test_batch_iter_sliding_window():
+    llm = MockGPTAPI()
+    # the slow first request does not hold back the others
+    batch = _batch("0.2 0", "0.01 0", "0.02 0", "0.01 0", "0.03 0")
+    completed = [idx async for idx, _ in llm.acompletion_batch_iter(batch, max_inflight=2)]
+    assert completed == [1, 2, 3, 4, 0]
+    assert llm.max_inflight == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_iter_ordered():
+    llm = MockGPTAPI()
+    batch = _batch("0.05 0", "0.01 0", "0.02 0")
+    results = [(idx, llm.get_choice_text(rsp)) async for idx, rsp in llm.acompletion_batch_iter(batch, ordered=True)]
+    assert results == [(0, "0.05 0"), (1, "0.01 0"), (2, "0.02 0")]
+    assert await llm.acompletion_batch_text(batch) == ["0.05 0", "0.01 0", "0.02 0"]
+
+
+@pytest.mark.asyncio
+async def test_batch_iter_retry(mocker):
+    mocker.patch("metagpt.provider.base_gpt_api.wait_random_exponential", return_value=wait_none())
+    llm = MockGPTAPI()
+    batch = _batch("0 1", "0 5")
+    results = dict([i async for i in llm.acompletion_batch_iter(batch, retries=2, return_exceptions=True)])
+    assert llm.get_choice_text(results[0]) == "0 1"
+    assert isinstance(results[1], ValueError)
+    assert llm.attempts == {"0 1": 2, "0 5": 3}
+
+    with pytest.raises(ValueError):
+        await MockGPTAPI().acompletion_batch(batch)
+
+
+class MockStreamGPTAPI(MockGPTAPI):
+    """Stream the reply word by word"""
+
+    async def acompletion_stream(self, messages):
+        for word in (await self.acompletion_text(messages)).split(" "):
+            await asyncio.sleep(0.01)
+            yield word + " "
+
+
+@pytest.mark.asyncio
+async def test_aask_stream_coalesced():
+    llm = MockStreamGPTAPI()
+    llm.single_flight = SingleFlight()
+
+    async def read(n=None):
+        deltas = []
+        async for delta in llm.aask_stream("0.05 0"):
+            deltas.append(delta)
+            if len(deltas) == n:
+                break
+        return "".join(deltas)
+
+    # the identical streams and texts requested meanwhile share the reply of the first stream
+    rsps = await asyncio.gather(read(), read(), llm.aask("0.05 0"))
+    assert [i.strip() for i in rsps] == ["0.05 0"] * 3
+    assert llm.attempts == {"0.05 0": 1}
+    assert llm.single_flight.saved == 2
+
+    # the first stream stopped early, the others request it again
+    rsps = await asyncio.gather(read(n=1), read())
+    assert [i.strip() for i in rsps] == ["0.05", "0.05 0"]
+    assert llm.attempts == {"0.05 0": 3}
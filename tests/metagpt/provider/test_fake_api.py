@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/provider/fake_api.py
+
+import time
+
+import openai
+import pytest
+
+from metagpt.actions import Action, design_api, project_management, write_prd
+from metagpt.provider.fake_api import FakeGPTAPI
+from metagpt.provider.stream_sink import NullSink
+
+
+class _Context(dict):
+    def __missing__(self, key):
+        return ""
+
+
+def _prompt(templates: dict, format: str) -> str:
+    template = templates[format]
+    return template["PROMPT_TEMPLATE"].format_map(_Context(format_example=template["FORMAT_EXAMPLE"]))
+
+
+def _llm(**kwargs) -> FakeGPTAPI:
+    llm = FakeGPTAPI(**{"responses": {}, "ttft": 0, "tps": 0, "error_rate": 0, "rpm": 0, **kwargs})
+    llm.stream_sink = NullSink()
+    return llm
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("format", ["json", "markdown"])
+@pytest.mark.parametrize("module", [write_prd, design_api, project_management])
+async def test_valid_for_output_mapping(module, format):
+    action = Action(llm=_llm())
+    output = await action._aask_v1(_prompt(module.templates, format), "output", module.OUTPUT_MAPPING, format=format)
+    assert set(output.instruct_content.dict()) == set(module.OUTPUT_MAPPING)
+
+
+@pytest.mark.asyncio
+async def test_scripted_responses():
+    llm = _llm(responses={r"snake": "ssss"})
+    assert await llm.aask("write a snake game") == "ssss"
+    assert await llm.aask("Just answer a number between 0-2") == "0"
+    assert await llm.aask("hello") == "OK"
+
+
+@pytest.mark.asyncio
+async def test_latency():
+    llm = _llm(ttft=0.1, tps=100, responses={"": "a b c d e f g h i j"})
+    start = time.monotonic()
+    deltas = [i async for i in llm.aask_stream("hello")]
+    assert "".join(deltas) == "a b c d e f g h i j"
+    assert time.monotonic() - start == pytest.approx(0.1 + 9 / 100, abs=0.05)
+
+
+@pytest.mark.asyncio
+async def test_errors():
+    with pytest.raises(openai.error.APIError):
+        await _llm(error_rate=1).aask("hello")
+
+    llm = _llm(rpm=1)
+    await llm.aask("hello")
+    with pytest.raises(openai.error.RateLimitError):
+        await llm.aask("world")
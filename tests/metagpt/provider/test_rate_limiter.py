@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/provider/rate_limiter.py
+
+import asyncio
+import time
+
+import pytest
+
+from metagpt.provider.rate_limiter import (
+    TokenBucket,
+    TokenBucketLimiter,
+    get_rate_limiter,
+    make_limiter_key,
+)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=10)
+    assert bucket.wait_time(10) == 0
+    bucket.consume(10)
+    assert bucket.wait_time(5) == pytest.approx(0.5, abs=0.05)
+    # requests larger than the capacity only wait for a full bucket
+    assert bucket.wait_time(100) == pytest.approx(1, abs=0.05)
+
+
+def test_shared_limiter():
+    key = make_limiter_key("sk-xxx", "https://api.openai.com/v1", None, None)
+    assert "sk-xxx" not in key
+    assert get_rate_limiter(key, rpm=10) is get_rate_limiter(key, rpm=10)
+
+
+@pytest.mark.asyncio
+async def test_fifo_and_bounded_concurrency():
+    limiter = TokenBucketLimiter(rpm=6000, max_concurrency=2)
+    admitted = []
+    max_inflight = 0
+
+    async def request(idx):
+        nonlocal max_inflight
+        async with limiter.acquire():
+            admitted.append(idx)
+            max_inflight = max(max_inflight, limiter.inflight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*[request(i) for i in range(6)])
+    assert admitted == list(range(6))
+    assert max_inflight == 2
+
+
+@pytest.mark.asyncio
+async def test_tpm_budget():
+    # 6000 tokens per minute -> 100 tokens per second, holding 600 tokens at most
+    limiter = TokenBucketLimiter(rpm=6000, tpm=6000)
+    start = time.monotonic()
+    async with limiter.acquire(600):
+        pass
+    async with limiter.acquire(50):
+        pass
+    assert time.monotonic() - start == pytest.approx(0.5, abs=0.15)
+
+    # unused tokens are given back
+    limiter.reconcile(reserved=600, used=100)
+    assert limiter._token_bucket.level >= 499
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_releases_its_slot():
+    # 60 requests per minute -> one per second after the first 2
+    limiter = TokenBucketLimiter(rpm=60, max_concurrency=2, burst=2)
+    async with limiter.acquire():
+        pass
+    async with limiter.acquire():
+        pass
+    for _ in range(3):
+        waiter = asyncio.create_task(limiter.acquire().__aenter__())
+        await asyncio.sleep(0.01)  # sleeping for the quota, with a permit
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+    assert limiter.inflight == 0
+    async with limiter.acquire():
+        assert limiter.inflight == 1
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/provider/response_cache.py
+
+import pytest
+
+from metagpt.provider.openai_api import OpenAIGPTAPI
+from metagpt.provider.response_cache import (
+    CacheMode,
+    DiskCacheBackend,
+    LLMCacheMiss,
+    ResponseCache,
+    make_chat_response,
+)
+
+
+def _kwargs(content: str, temperature=0.3) -> dict:
+    return {
+        "model": "gpt-4",
+        "messages": [{"role": "user", "content": content}],
+        "temperature": temperature,
+        "max_tokens": 1500,
+        "timeout": 3,
+    }
+
+
+def test_make_key():
+    assert ResponseCache.make_key(_kwargs("hello")) == ResponseCache.make_key(_kwargs("hello"))
+    assert ResponseCache.make_key(_kwargs("hello")) != ResponseCache.make_key(_kwargs("hello", temperature=0))
+    # timeout does not change the response
+    assert ResponseCache.make_key(_kwargs("hello")) == ResponseCache.make_key({**_kwargs("hello"), "timeout": 60})
+
+
+def test_cache_mode_alias():
+    assert CacheMode("replay-only") == CacheMode.REPLAY
+    assert CacheMode("read-through") == CacheMode.READ_THROUGH
+
+
+def test_read_through(tmp_path):
+    cache = ResponseCache(DiskCacheBackend(tmp_path), CacheMode.READ_THROUGH)
+    key = ResponseCache.make_key(_kwargs("hello"))
+    assert cache.lookup(key) is None
+    rsp = make_chat_response("world", {"prompt_tokens": 8, "completion_tokens": 1})
+    cache.save(key, rsp)
+
+    # a new backend on the same directory recovers the recorded responses
+    cache = ResponseCache(DiskCacheBackend(tmp_path), CacheMode.READ_THROUGH)
+    assert cache.lookup(key) == rsp
+    assert cache.hits == 1
+
+
+def test_record_and_replay(tmp_path):
+    key = ResponseCache.make_key(_kwargs("hello"))
+    recorder = ResponseCache(DiskCacheBackend(tmp_path), CacheMode.RECORD)
+    recorder.save(key, make_chat_response("world"))
+    assert recorder.lookup(key) is None  # record mode always requests the LLM
+
+    replayer = ResponseCache(DiskCacheBackend(tmp_path), CacheMode.REPLAY)
+    assert replayer.lookup(key)["choices"][0]["message"]["content"] == "world"
+    with pytest.raises(LLMCacheMiss):
+        replayer.lookup(ResponseCache.make_key(_kwargs("unknown")))
+
+
+def test_lru_eviction(tmp_path):
+    backend = DiskCacheBackend(tmp_path, max_size=1)
+    backend.set("a", make_chat_response("a"))
+    size = backend.total_size
+    backend.max_size = size * 2
+    backend.set("b", make_chat_response("b"))
+    backend.get("a")  # a becomes the most recently used one
+    backend.set("c", make_chat_response("c"))
+    assert backend.get("b") is None
+    assert backend.get("a") is not None
+    assert backend.get("c") is not None
+    assert len(backend) == 2
+
+
+def test_sync_completion_record_and_replay(mocker, tmp_path):
+    rsp = make_chat_response("world", {"prompt_tokens": 8, "completion_tokens": 1})
+    create = mocker.patch("openai.ChatCompletion.create", return_value=rsp)
+
+    def ask(mode: CacheMode) -> str:
+        llm = OpenAIGPTAPI()
+        llm._cache = ResponseCache(DiskCacheBackend(tmp_path), mode)
+        return llm.ask("hello")
+
+    assert ask(CacheMode.RECORD) == "world"
+    assert ask(CacheMode.REPLAY) == "world"
+    assert create.call_count == 1
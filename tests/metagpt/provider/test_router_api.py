@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/provider/router_api.py
+
+import re
+import uuid
+
+import openai
+import pytest
+
+from metagpt.provider.openai_api import OpenAIEndpoint
+from metagpt.provider.response_cache import make_chat_response
+from metagpt.provider.router_api import RouterGPTAPI
+from metagpt.provider.stream_sink import NullSink
+
+
+class MockStream:
+    def __init__(self, content: str):
+        self.chunks = [{"choices": [{"delta": {"content": i}}]} for i in re.findall(r"\S+\s*", content)]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.chunks:
+            raise StopAsyncIteration
+        return self.chunks.pop(0)
+
+
+class MockServer:
+    def __init__(self, failing: set):
+        self.failing = failing
+        self.received = []
+
+    async def acreate(self, stream=False, **kwargs):
+        self.received.append(kwargs["api_key"])
+        if kwargs["api_key"] in self.failing:
+            raise openai.error.RateLimitError("Rate limit reached", http_status=429)
+        content = f"hello from {kwargs['api_key']}"
+        if stream:
+            return MockStream(content)
+        return make_chat_response(content, {"prompt_tokens": 1, "completion_tokens": 3})
+
+
+def _router(mocker, failing: set, n: int = 2) -> tuple[RouterGPTAPI, MockServer, list[str]]:
+    server = MockServer(failing)
+    mocker.patch("openai.ChatCompletion.acreate", server.acreate)
+    # unique keys, so that the rate limiters and the health of other tests are not shared
+    keys = [f"sk-{uuid.uuid4().hex}" for _ in range(n)]
+    server.failing = {keys[i] for i in failing}
+    router = RouterGPTAPI([OpenAIEndpoint(api_key=i, rpm=600) for i in keys], cooldown=60)
+    router.stream_sink = NullSink()
+    return router, server, keys
+
+
+@pytest.mark.asyncio
+async def test_per_request_credentials(mocker):
+    router, server, keys = _router(mocker, failing=set())
+    rsp = await router.acompletion([{"role": "user", "content": "hi"}])
+    assert router.get_choice_text(rsp) in {f"hello from {i}" for i in keys}
+    assert server.received[0] in keys
+
+
+@pytest.mark.asyncio
+async def test_spread_over_endpoints(mocker):
+    router, server, keys = _router(mocker, failing=set())
+    router.coalesce_requests = False
+    for i in range(6):
+        await router.aask(f"hi {i}")
+    # as the quota of one endpoint is used, the other one has more headroom
+    assert set(server.received) == set(keys)
+
+
+@pytest.mark.asyncio
+async def test_cooldown_on_429(mocker):
+    router, server, keys = _router(mocker, failing={0})
+    router.health[0].latency = 0.001  # the failing endpoint is the preferred one
+    assert await router.aask("hi") == f"hello from {keys[1]}"
+    assert router.health[0].cooling_down
+    assert router.stats()[0]["failures"] == 1
+
+    server.received.clear()
+    assert await router.acompletion_text([{"role": "user", "content": "hello"}]) == f"hello from {keys[1]}"
+    assert server.received == [keys[1]]
+
+
+@pytest.mark.asyncio
+async def test_stream_fail_over(mocker):
+    router, server, keys = _router(mocker, failing={0})
+    router.health[0].latency = 0.001
+    deltas = [i async for i in router.aask_stream("hi")]
+    assert deltas == ["hello ", "from ", keys[1]]
+
+
+@pytest.mark.asyncio
+async def test_all_failing(mocker):
+    router, _, _ = _router(mocker, failing={0, 1})
+    with pytest.raises(openai.error.RateLimitError):
+        await router.aask("hi")
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/provider/stream_sink.py
+
+import pytest
+
+from metagpt.provider.stream_sink import (
+    CallbackSink,
+    NullSink,
+    StdoutSink,
+    get_stream_sink,
+)
+
+
+def test_get_stream_sink():
+    assert isinstance(get_stream_sink("none"), NullSink)
+    assert isinstance(get_stream_sink("stdout"), StdoutSink)
+    assert isinstance(get_stream_sink(print), CallbackSink)
+    with pytest.raises(ValueError):
+        get_stream_sink("unknown")
+
+
+def test_stdout_sink(capfd):
+    sink = StdoutSink()
+    for delta in ["hel", "lo"]:
+        sink.on_delta(delta)
+    sink.on_end()
+    assert capfd.readouterr().out == "hello\n"
+
+
+def test_callback_sink():
+    deltas = []
+    sink = get_stream_sink(deltas.append)
+    sink.on_delta("hel")
+    sink.on_delta("lo")
+    sink.on_end()
+    assert deltas == ["hel", "lo"]
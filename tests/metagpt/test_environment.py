@@ -6,12 +6,15 @@
 @File    : test_environment.py
 """
 
+import asyncio
+
 import pytest
 
-from metagpt.actions import BossRequirement
+from metagpt.actions import Action, BossRequirement, WriteDesign, WritePRD, WriteTasks
 from metagpt.environment import Environment
 from metagpt.logs import logger
 from metagpt.manager import Manager
+from metagpt.provider.openai_api import CostManager
 from metagpt.roles import Architect, ProductManager, Role
 from metagpt.schema import Message
 
@@ -54,3 +57,143 @@ async def test_publish_and_process_message(env: Environment):
     await env.run(k=2)
     logger.info(f"{env.history=}")
     assert len(env.history) > 10
+
+
+@pytest.mark.asyncio
+async def test_observe_from_cursor(env: Environment):
+    architect = Architect("Bob", "Architect")
+    env.add_role(architect)
+    idea = Message(role="BOSS", content="Write a cli snake game", cause_by=BossRequirement)
+    env.publish_message(idea)
+    env.publish_message(idea)  # published once only
+    assert len(env.log) == 1
+    # the architect does not watch BossRequirement, but keeps it in its history
+    assert await architect._observe() == 0
+    assert architect._rc.memory.get() == [idea]
+
+    prd = Message(role="Product Manager", content="PRD", cause_by=WritePRD)
+    env.publish_message(prd)
+    assert await architect._observe() == 1
+    assert architect._rc.news == [prd]
+    assert architect._rc.cursor == env.log.end
+    # nothing new since
+    assert await architect._observe() == 0
+
+
+def test_roles_share_the_log(env: Environment):
+    role1 = Role("Alice", "product manager")
+    role2 = Role("Bob", "engineer")
+    env.add_roles([role1, role2])
+    idea = Message(role="BOSS", content="Write a cli snake game", cause_by=BossRequirement)
+    env.publish_message(idea)
+    for role in (role1, role2):
+        role.recv(idea)
+        assert role._rc.memory.get() == [idea]
+        assert role._rc.memory.log is env.log
+    assert env.memory.get() == [idea]
+    assert env.history == f"\n{idea}"
+
+
+class _Sleep(Action):
+    """Answers after a while, without the LLM"""
+
+    running = 0  # the runs in flight, of all the _Sleep actions
+    max_running = 0
+
+    async def run(self, *args, **kwargs):
+        _Sleep.running += 1
+        _Sleep.max_running = max(_Sleep.max_running, _Sleep.running)
+        try:
+            await asyncio.sleep(0.1)
+        finally:
+            _Sleep.running -= 1
+        CostManager().update_cost(10, 5, "gpt-3.5-turbo")
+        return f"{type(self).__name__} done"
+
+
+class _PRD(_Sleep, WritePRD):
+    pass
+
+
+class _Design(_Sleep, WriteDesign):
+    pass
+
+
+class _Tasks(_Sleep, WriteTasks):
+    pass
+
+
+class _Stage(Role):
+    def __init__(self, profile, action, watch):
+        super().__init__(profile, profile)
+        self._init_actions([action])
+        self._watch(watch)
+        self.runs = 0
+
+    async def _react(self) -> Message:
+        self.runs += 1
+        return await super()._react()
+
+
+def _pipeline(env: Environment) -> list[_Stage]:
+    roles = [
+        _Stage("PM", _PRD, [BossRequirement]),
+        _Stage("Reviewer", _Tasks, [BossRequirement]),  # independent of the PM, runs along
+        _Stage("Architect", _Design, [_PRD]),
+        _Stage("Idle", _Tasks, [WriteTasks]),  # subscribed to nothing published
+    ]
+    env.add_roles(roles)
+    env.publish_message(Message(role="BOSS", content="Write a cli snake game", cause_by=BossRequirement))
+    return roles
+
+
+@pytest.mark.asyncio
+async def test_run_events(env: Environment):
+    pm, reviewer, architect, idle = _pipeline(env)
+    checks = []
+    _Sleep.max_running = 0
+    await env.run_events(before_run=lambda: checks.append(1))
+    # the PM and the reviewer concurrently, no run for the idle role
+    assert _Sleep.max_running == 2
+    assert [i.runs for i in (pm, reviewer, architect, idle)] == [1, 1, 1, 0]
+    assert len(checks) == 3
+    assert [i.cause_by for i in env.log.messages[1:]] == [_PRD, _Tasks, _Design]
+    assert env._ready is None
+    assert [(i.round, i.runs, sorted(i.active_roles), i.messages, i.prompt_tokens) for i in env.stats] == [
+        (1, 2, ["PM", "Reviewer"], 2, 20),
+        (2, 1, ["Architect"], 1, 10),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_run_events_n_round(env: Environment):
+    pm, reviewer, architect, _ = _pipeline(env)
+    await env.run_events(n_round=1)
+    assert [i.runs for i in (pm, reviewer, architect)] == [1, 1, 0]
+
+    # the compatible rounds, every role woken each round
+    await env.run(k=1)
+    assert architect.runs == 1
+    assert [(i.round, i.runs, i.active_roles, i.messages) for i in env.stats[1:]] == [(2, 4, ["Architect"], 1)]
+
+
+@pytest.mark.asyncio
+async def test_run_events_deadline(env: Environment):
+    pm, reviewer, architect, _ = _pipeline(env)
+    assert await env.run_events(deadline=0.15) is False
+    # cancelled before its 0.1s are over
+    assert [i.runs for i in (pm, reviewer, architect)] == [1, 1, 1]
+    assert len(env.log) == 3
+
+
+@pytest.mark.asyncio
+async def test_run_events_stops_on_error(env: Environment):
+    pm, reviewer, *_ = _pipeline(env)
+
+    def before_run():
+        if pm.runs:
+            raise RuntimeError("out of budget")
+
+    with pytest.raises(RuntimeError):
+        await env.run_events(before_run=before_run)
+    assert env._ready is None
@@ -5,6 +5,8 @@
 @Author  : alexanderwu
 @File    : test_message.py
 """
+import pickle
+
 import pytest
 
 from metagpt.schema import AIMessage, Message, RawMessage, SystemMessage, UserMessage
@@ -34,3 +36,18 @@ def test_raw_message():
     assert msg['content'] == 'raw'
     with pytest.raises(KeyError):
         assert msg['1'] == 1, "KeyError: '1'"
+
+
+def test_message_id():
+    msg = Message(role='User', content='WTF', cause_by=str)
+    assert msg.id == Message(role='User', content='WTF', cause_by=str).id
+    assert msg.id != Message(role='User', content='WTF?', cause_by=str).id
+    assert msg.id != Message(role='User', content='WTF', send_to='QA').id
+
+    # messages pickled before `id` existed get one when loaded
+    state = dict(msg.__dict__)
+    del state['id']
+    legacy = Message.__new__(Message)
+    legacy.__setstate__(state)
+    assert legacy.id == msg.id
+    assert pickle.loads(pickle.dumps(msg)).id == msg.id
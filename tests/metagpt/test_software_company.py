@@ -7,8 +7,10 @@
 """
 import pytest
 
+from metagpt.config import CONFIG
 from metagpt.logs import logger
 from metagpt.software_company import SoftwareCompany
+from tests.metagpt.test_environment import _pipeline
 
 
 @pytest.mark.asyncio
@@ -17,3 +19,19 @@ async def test_software_company():
     company.start_project("做一个基础搜索引擎，可以支持知识库")
     history = await company.run(n_round=5)
     logger.info(history)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("scheduler", ["event", "round"])
+async def test_run_until_idle(mocker, scheduler):
+    mocker.patch.object(CONFIG, "env_scheduler", scheduler)
+    company = SoftwareCompany()
+    roles = _pipeline(company.environment)
+    history = await company.run_until_idle()
+    assert [i.runs for i in roles] == [1, 1, 1, 0]
+    assert str(history).count("done") == 3
+    # the stats of the active rounds, the round mode stops after the first one that no role reacted in
+    stats = company.environment.stats
+    assert [len(i.active_roles) for i in stats] == ([2, 1] if scheduler == "event" else [2, 1, 0])
+    assert sum(i.messages for i in stats) == 3
+    assert [i.runs for i in stats] == ([2, 1] if scheduler == "event" else [4, 4, 4])
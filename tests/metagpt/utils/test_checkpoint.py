@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/utils/checkpoint.py
+
+import json
+
+import pytest
+
+from metagpt.actions import BossRequirement, WriteDesign
+from metagpt.provider.openai_api import CostManager
+from metagpt.software_company import SoftwareCompany
+from metagpt.utils.checkpoint import Checkpointer
+from tests.metagpt.test_environment import _PRD, _Design, _Sleep, _Stage, _Tasks
+
+
+class _Crash(_Sleep, WriteDesign):
+    async def run(self, *args, **kwargs):
+        raise RuntimeError("the API is down")
+
+
+def _stages(design=_Design) -> list[_Stage]:
+    return [
+        _Stage("PM", _PRD, [BossRequirement]),
+        _Stage("Reviewer", _Tasks, [BossRequirement]),
+        _Stage("Architect", design, [_PRD]),
+    ]
+
+
+def _company(tmp_path, design=_Design) -> SoftwareCompany:
+    company = SoftwareCompany()
+    company.hire(_stages(design))
+    company.checkpointer = Checkpointer(tmp_path / "checkpoint", meta={"team": "stages"}, workspace=tmp_path / "ws")
+    return company
+
+
+@pytest.mark.asyncio
+async def test_resume_after_crash(tmp_path):
+    (tmp_path / "ws").mkdir()
+    (tmp_path / "ws" / "main.py").write_text("print('snake')")
+    company = _company(tmp_path, design=_Crash)
+    company.invest(3.0)
+    company.start_project("Write a cli snake game")
+    with pytest.raises(RuntimeError):
+        await company.run(n_round=5)
+    total_cost = CostManager().total_cost
+
+    state = json.loads((tmp_path / "checkpoint" / "state.json").read_text())
+    assert state["messages"] == 3 and state["meta"] == {"team": "stages"}
+    assert list(state["workspace"]) == ["main.py"]
+    # the architect crashed in the middle of its run, it is saved as it was before
+    assert state["roles"]["Architect"]["cursor"] == 0
+    assert state["roles"]["PM"]["cursor"] == 1
+
+    CostManager().total_cost = 0
+    (tmp_path / "ws" / "main.py").write_text("print('changed')")
+    resumed = _company(tmp_path)
+    assert resumed.restore(tmp_path / "checkpoint") == ["main.py"]
+    assert resumed.idea == "Write a cli snake game"
+    assert CostManager().total_cost == total_cost
+    assert len(resumed.environment.log) == 3
+    pm, reviewer, architect = resumed.environment.roles.values()
+    assert [i.content for i in pm._rc.memory.get()] == [i.content for i in company.environment.log.messages[:2]]
+
+    await resumed.run(n_round=5)
+    # only the architect runs again, the PRD is not written twice
+    assert [i.runs for i in (pm, reviewer, architect)] == [0, 0, 1]
+    assert [i.cause_by for i in resumed.environment.log.messages] == [BossRequirement, _PRD, _Tasks, _Design]
+
+    state = Checkpointer.load(tmp_path / "checkpoint")
+    assert [i.cause_by for i in state["messages"]] == [BossRequirement, _PRD, _Tasks, _Design]
+    assert state["roles"]["Architect"]["cursor"] == 3
+
+
+@pytest.mark.asyncio
+async def test_torn_messages(tmp_path):
+    company = _company(tmp_path)
+    company.start_project("Write a cli snake game")
+    await company.run(n_round=1)
+    with open(tmp_path / "checkpoint" / "messages.jsonl", "a") as f:
+        f.write('{"message": {"v": 1, "cont')
+
+    resumed = _company(tmp_path)
+    resumed.restore(tmp_path / "checkpoint")
+    assert len(resumed.environment.log) == 3
+    await resumed.run(n_round=5)
+    assert len(Checkpointer.load(tmp_path / "checkpoint")["messages"]) == 4
+
+
+@pytest.mark.asyncio
+async def test_resume_without_rounds_left(mocker, tmp_path):
+    import startup
+
+    company = _company(tmp_path)
+    company.checkpointer.meta = {"team": {}, "run": {"n_round": 2, "until_idle": False, "deadline": 0}}
+    company.start_project("Write a cli snake game")
+    await company.run(n_round=2)
+    assert len(Checkpointer.load(tmp_path / "checkpoint")["stats"]) == 2
+
+    mocker.patch.object(startup, "hire_team", lambda resumed, **team: resumed.hire(_stages()))
+    run_company = mocker.patch.object(startup, "run_company")
+    await startup.resume(str(tmp_path / "checkpoint"))
+    # n_round=0 would run it with no bound
+    run_company.assert_not_called()
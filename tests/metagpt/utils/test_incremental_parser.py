@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/utils/incremental_parser.py
+
+import pytest
+
+from metagpt.actions.design_api import OUTPUT_MAPPING, templates
+from metagpt.utils.incremental_parser import (
+    IncrementalOutputParser,
+    StreamParseError,
+    parse_output,
+)
+
+JSON_REPLY = "Here is the design:\n" + templates["json"]["FORMAT_EXAMPLE"]
+MARKDOWN_REPLY = templates["markdown"]["FORMAT_EXAMPLE"].lstrip("\n-")
+
+
+def _feed(parser: IncrementalOutputParser, reply: str, size: int) -> list[tuple[int, str]]:
+    """Feed the reply `size` chars at a time, return when each field was completed"""
+    completed = []
+    for pos in range(0, len(reply), size):
+        completed.extend((pos + size, name) for name in parser.feed(reply[pos : pos + size]))
+    return completed
+
+
+@pytest.mark.parametrize("format,reply", [("json", JSON_REPLY), ("markdown", MARKDOWN_REPLY)])
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_same_as_whole_reply(format, reply, size):
+    parser = IncrementalOutputParser(OUTPUT_MAPPING, format)
+    completed = _feed(parser, reply, size)
+    assert parser.close() == parse_output(reply, OUTPUT_MAPPING, format)
+    _, parsed_data = parse_output(reply, OUTPUT_MAPPING, format)
+    assert parser.fields.items() <= parsed_data.items()
+    # the fields come out as they are completed, not at the end of the reply
+    assert [name for _, name in completed][:3] == list(OUTPUT_MAPPING)[:3]
+    assert completed[0][0] < len(reply) / 2
+
+
+def test_json_field_values():
+    parser = IncrementalOutputParser(OUTPUT_MAPPING, "json")
+    _feed(parser, JSON_REPLY, 5)
+    assert parser.fields["File list"] == ["main.py"]
+    assert parser.fields["Python package name"] == "snake_game"
+    assert "classDiagram" in parser.fields["Data structures and interface definitions"]
+
+
+def test_json_triple_quote_split():
+    parser = IncrementalOutputParser({"Code": (str, ...)}, "json")
+    reply = '[CONTENT]\n{"Code": """a = "b"\nc = \'d\'""", "Other": 1}\n[/CONTENT]'
+    _feed(parser, reply, 1)
+    assert parser.fields == {"Code": "a = \"b\"\nc = 'd'"}
+
+
+def test_json_malformed_early():
+    parser = IncrementalOutputParser(OUTPUT_MAPPING, "json")
+    parser.feed('[CONTENT]\n{"Implementation approach": "We will ...",\n"File list": "main.py"')
+    with pytest.raises(StreamParseError):
+        parser.feed(',\n"Program call flow": "')
+
+    parser = IncrementalOutputParser(OUTPUT_MAPPING, "json")
+    with pytest.raises(StreamParseError):
+        parser.feed('[CONTENT]\n{"Implementation approach": We will ..., ')
+
+
+def test_markdown_malformed_early():
+    parser = IncrementalOutputParser(OUTPUT_MAPPING, "markdown")
+    parser.feed("## Implementation approach\nWe will ...\n## File list\n```python\n[main.py]\n```\n")
+    with pytest.raises(StreamParseError):
+        parser.feed("## Program call flow\n")
+
+
+def test_json_without_content_tag():
+    parser = IncrementalOutputParser(OUTPUT_MAPPING, "json")
+    assert _feed(parser, '{"Python package name": "snake_game"}', 4) == []
+    assert parser.close()[1] == {"Python package name": "snake_game"}
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/utils/project_context.py
+
+import asyncio
+
+import pytest
+
+from metagpt.config import CONFIG
+from metagpt.provider.openai_api import CostManager, OpenAIGPTAPI
+from metagpt.software_company import SoftwareCompany
+from metagpt.utils.common import NoMoneyException
+from metagpt.utils.project_context import ProjectContext, get_project
+from metagpt.utils.single_flight import SingleFlight
+from tests.metagpt.provider.test_base_gpt_api import MockGPTAPI
+from tests.metagpt.test_environment import _pipeline
+
+
+def test_project_config(tmp_path):
+    budget, cost, model = CONFIG.max_budget, CONFIG.total_cost, CONFIG.project_setting("openai_api_model")
+    llm = OpenAIGPTAPI()
+    project = ProjectContext(name="snake", workspace_root=tmp_path, config={"openai_api_model": "gpt-3.5-turbo-16k"})
+    with project.activate():
+        assert get_project() is project
+        assert CONFIG.workspace_root == tmp_path
+        # read when the request is made, not when the LLM is
+        assert CONFIG.project_setting("openai_api_model") == llm.model == "gpt-3.5-turbo-16k"
+        assert CONFIG.max_budget == budget  # MAX_BUDGET unless set
+        CONFIG.max_budget = 1.0
+        CostManager().update_cost(1000, 1000, "gpt-3.5-turbo")
+        assert CONFIG.total_cost == project.total_cost == CostManager().total_cost > 0
+    assert (CONFIG.max_budget, CONFIG.total_cost, CONFIG.project_setting("openai_api_model")) == (budget, cost, model)
+    assert llm.model == model
+    assert project.max_budget == 1.0 and project.total_prompt_tokens == 1000
+
+
+@pytest.mark.asyncio
+async def test_concurrent_companies(tmp_path):
+    cost = CONFIG.total_cost
+    companies = []
+    for name in ("snake", "2048", "broke"):
+        company = SoftwareCompany(project=ProjectContext(name=name, workspace_root=tmp_path / name))
+        company.invest(0.0 if name == "broke" else 3.0)
+        roles = _pipeline(company.environment)
+        companies.append((company, roles))
+
+    results = await asyncio.gather(*(i.run_until_idle() for i, _ in companies), return_exceptions=True)
+    assert isinstance(results[2], NoMoneyException)
+    for (company, roles), result in zip(companies[:2], results):
+        assert str(result).count("done") == 3
+        # each one paid for its own 3 runs only
+        assert (company.project.total_prompt_tokens, company.project.total_completion_tokens) == (30, 15)
+        assert company.project.max_budget == 3.0
+    # the broke one stopped once its first runs were over, the others went on
+    broke = companies[2][0].project
+    assert 0 < broke.total_prompt_tokens < 30 and broke.max_budget == 0.0
+    assert CONFIG.total_cost == cost
+
+
+@pytest.mark.asyncio
+async def test_coalesce_within_project():
+    llm = MockGPTAPI()
+    llm.single_flight = SingleFlight()
+
+    async def aask(project: ProjectContext) -> str:
+        with project.activate():
+            return await llm.aask("0.05 0")
+
+    snake, game = ProjectContext(name="snake"), ProjectContext(name="2048")
+    await asyncio.gather(aask(snake), aask(snake), aask(game))
+    # each project sends, and pays for, its own request
+    assert llm.attempts == {"0.05 0": 2}
+    assert llm.single_flight.saved == 1
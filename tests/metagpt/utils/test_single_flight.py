@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Desc   : the unittests of metagpt/utils/single_flight.py
+
+import asyncio
+
+import pytest
+
+from metagpt.utils.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesce():
+    single_flight = SingleFlight()
+    executed = []
+
+    async def request(content):
+        executed.append(content)
+        await asyncio.sleep(0.05)
+        return f"rsp of {content}"
+
+    rsps = await asyncio.gather(
+        *[single_flight.do(content, lambda content=content: request(content)) for content in ["a", "a", "b", "a"]]
+    )
+    assert rsps == ["rsp of a", "rsp of a", "rsp of b", "rsp of a"]
+    assert executed == ["a", "b"]
+    assert single_flight.stats() == {"calls": 2, "saved": 2, "inflight": 0}
+
+    # finished calls are not reused
+    await single_flight.do("a", lambda: request("a"))
+    assert single_flight.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_single_flight_exception():
+    single_flight = SingleFlight()
+
+    async def request():
+        await asyncio.sleep(0.05)
+        raise ValueError("bad request")
+
+    rsps = await asyncio.gather(*[single_flight.do("a", request) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(i, ValueError) for i in rsps)
+    assert single_flight.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_single_flight_leader_cancelled():
+    single_flight = SingleFlight()
+
+    async def request():
+        await asyncio.sleep(0.05)
+        return "rsp"
+
+    leader = asyncio.create_task(single_flight.do("a", request))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(single_flight.do("a", request))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await follower == "rsp"
+    assert single_flight.calls == 2
@@ -7,7 +7,13 @@
 """
 import pytest
 
-from metagpt.utils.token_counter import count_message_tokens, count_string_tokens
+from metagpt.utils.token_counter import (
+    TokenCounter,
+    count_message_tokens,
+    count_string_tokens,
+    count_string_tokens_many,
+    get_max_completion_tokens,
+)
 
 
 def test_count_message_tokens():
@@ -67,3 +73,53 @@ def test_count_string_tokens_gpt_4():
 
     string = "Hello, world!"
     assert count_string_tokens(string, model_name="gpt-4-0314") == 4
+
+
+class _StubEncoding:
+    """Offline, a token per word"""
+
+    name = "stub"
+
+    def encode(self, text: str) -> list[str]:
+        return text.split()
+
+    def encode_batch(self, texts: list[str]) -> list[list[str]]:
+        return [self.encode(i) for i in texts]
+
+
+@pytest.fixture
+def stub_encoding(mocker):
+    return mocker.patch("metagpt.utils.token_counter.get_encoding", return_value=_StubEncoding())
+
+
+def test_count_string_tokens_many(stub_encoding):
+    strings = ["Hello, world!", "", "Hello, world!", "你好 世界"]
+    counts = count_string_tokens_many(strings, model_name="gpt-4-0314")
+    assert counts == [2, 0, 2, 2]
+    assert counts == [count_string_tokens(i, model_name="gpt-4-0314") for i in strings]
+
+
+def test_token_counter_memo(stub_encoding):
+    counter = TokenCounter(maxsize=2)
+    assert counter.count("Hello, world!", "gpt-4") == 2
+    assert counter.count("Hello, world!", "gpt-4") == 2
+    assert counter.hits == 1
+    # the memo keeps a digest of the text, not the text itself
+    assert all(len(digest) == 16 for _, digest in counter._memo)
+    counter.count_many(["a", "b"], "gpt-4")
+    counter.count("Hello, world!", "gpt-4")  # evicted by the least recently used policy
+    assert counter.misses == 4
+
+
+def test_max_completion_tokens_without_encoding():
+    """The models other than OpenAI's are estimated instead of raising"""
+    messages = [{"role": "user", "content": "Hello, world!"}]
+    assert get_max_completion_tokens(messages, "claude-2", default=100) == 100000 - (3 + 1 + 4 + 3) - 1
+    assert get_max_completion_tokens(messages, "fake", default=100) < 100000
+    assert get_max_completion_tokens(messages, "unknown", default=100) == 100
+
+
+def test_token_counter_approx_count():
+    assert TokenCounter.approx_count("") == 0
+    assert TokenCounter.approx_count("Hello, world!") == 4
+    assert TokenCounter.approx_count("你好") == 2